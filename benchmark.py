@@ -0,0 +1,280 @@
+"""
+    This file is the benchmark suite of both models: the configuration files
+    (taylor_config.py and flux_config.py by default) are run headless for a
+    few time steps for every number of cells, diffusivity model, time step
+    and linear solver, and the time per step and where it goes are measured:
+
+      step_time      Wall time of a step (of the time loop of run_model()).
+      sweeps         Sweeps (or Newton iterations) per step.
+      coefficients   Time per step in the updates of the Diffusivity and the
+                     coefficients (calculate_coeffs()).
+      solve          Time per step in the sweeps, and of that in the linear
+                     solves (linear_solve).
+      io             Time per step writing the output (the time series of
+                     save_output, into a temporary directory).
+      peak_memory    The largest resident memory of the run [MB].
+
+    Every case runs in a process of its own, so that the peak memory is its
+    own and no case warms up the next. The results are written as JSON with
+    the versions of the packages, and can be compared with a baseline (the
+    JSON of an earlier benchmark, e.g. before upgrading FiPy or NumPy): a
+    case that got slower or larger than the tolerance allows is reported as
+    a regression, and the exit status is then 1.
+
+    Use: python benchmark.py [--configs taylor_config.py flux_config.py]
+         [--nx 100 1000 10000] [--diffusivities D_Zohm D_Staps ...]
+         [--dt 1.0] [--solvers lu banded] [--steps 5]
+         [--output benchmark.json] [--baseline BASELINE.json]
+         [--tolerance 0.25]
+"""
+
+import sys
+import os
+import io
+import argparse
+import itertools
+import json
+import platform
+import tempfile
+import time
+from contextlib import redirect_stdout, redirect_stderr
+from multiprocessing import Pool
+
+
+# The diffusivity models benchmarked by default, one name each
+diffusivity_choices = ["D_Zohm", "D_Staps", "D_Flow_Shear", "D_Weymiens_L"]
+
+# The measurements of a case compared with the baseline, and whether an
+# increase is a regression; the sweeps change with the numerics, not the
+# speed, so they are only reported
+compared_metrics = [('step_time', True), ('coefficients', True),
+                    ('solve', True), ('io', True), ('peak_memory', True),
+                    ('sweeps', False)]
+
+# The inputs of a case, which identify it in the baseline
+case_keys = ['config', 'nx', 'D_choice', 'dt_factor', 'solver']
+
+
+def peak_memory():
+    """ The largest resident memory of this process so far [MB]. """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # In bytes on macOS, in kB elsewhere
+    if sys.platform == 'darwin':
+        return peak / 1.0e6
+    return peak / 1.0e3
+
+
+def versions():
+    """ The versions of the software, which the timings depend on. """
+    import numpy
+    import scipy
+    import fipy
+    return {'python': platform.python_version(), 'numpy': numpy.__version__,
+            'scipy': scipy.__version__, 'fipy': fipy.__version__,
+            'platform': platform.platform(), 'processor': platform.machine()}
+
+
+def run_case(case, steps):
+    """
+        Runs one case headless for 'steps' time steps with run_model(), with
+        the profiler on, and returns its measurements. It is called in a
+        process of its own.
+    """
+    from src.input_handling import load_config
+    from src.model import build_model
+    from src.solving_loop import run_model
+
+    result = dict(case)
+    log = io.StringIO()
+    with tempfile.TemporaryDirectory() as directory, \
+            redirect_stdout(log), redirect_stderr(log):
+        config = load_config(case['config'])
+        config.batch_mode = True
+        config.nx = case['nx']
+        config.D_choice = case['D_choice']
+        config.timeStep = case['dt_factor'] * config.timeStep
+        if case['solver'] is not None:
+            config.solver = case['solver']
+        config.total_timeSteps = steps
+        config.total_time = None
+        config.steady_state = False
+        config.stop_change_rate, config.stop_Z_edge = 0.0, None
+        config.stop_wall_time = 0.0
+
+        # No plots or checkpoints; the time series is the output measured
+        config.generate_plots = False
+        config.save_plots, config.save_TSVs = False, False
+        config.checkpoint_every, config.checkpoint_wall = 0, 0.0
+        config.save_output, config.output_every = True, 1
+        config.save_directory = directory
+        config.summary_file = os.path.join(directory, "summary.json")
+        config.profile = True
+        config.profile_file = os.path.join(directory, "profile.json")
+
+        try:
+            build_start = time.time()
+            model = build_model(config)
+            build_time = time.time() - build_start
+            run_model(model)
+
+            with open(config.summary_file) as summary_file:
+                summary = json.load(summary_file)
+            with open(config.profile_file) as profile_file:
+                profile = json.load(profile_file)
+        except (Exception, SystemExit) as error:
+            result.update({'converged': False, 'error': repr(error),
+                           'log': log.getvalue()[-2000:]})
+            return result
+
+    steps_taken = max(summary['steps'], 1)
+
+    def per_step(*names):
+        return sum(profile['phases'].get(name, {}).get('total', 0.0)
+                   for name in names) / steps_taken
+
+    result.update({
+        'converged': summary['converged'],
+        'steps': summary['steps'],
+        'build_time': build_time,
+        'step_time': summary['wall_time'] / steps_taken,
+        'sweeps': profile['counts']['sweeps']['total'] / steps_taken,
+        'coefficients': per_step('diffusivity', 'coefficients'),
+        'solve': per_step('solve'),
+        'linear_solve': per_step('linear solve'),
+        'io': per_step('output', 'plotting', 'checkpoint'),
+        'peak_memory': peak_memory()
+    })
+    return result
+
+
+def case_name(case):
+    return "{} nx={} {} dt*{:g} {}".format(
+        os.path.basename(case['config']), case['nx'], case['D_choice'],
+        case['dt_factor'], case['solver'] or "(config)")
+
+
+def compare(results, baseline, tolerance):
+    """
+        Compares the results with the baseline, case by case, and returns
+        the regressions: the measurements that grew by more than the
+        tolerance (a fraction), as (case, metric, baseline, new value).
+    """
+    baseline_cases = dict((tuple(case[key] for key in case_keys), case)
+                          for case in baseline['cases'])
+    regressions = []
+    print("\nChange against the baseline:")
+    print("{:<48s}".format("Case") + "".join(
+        "{:>14s}".format(metric) for metric, regression in compared_metrics))
+    for result in results:
+        old = baseline_cases.get(tuple(result[key] for key in case_keys))
+        if old is None:
+            print("{:<48s}  not in the baseline".format(case_name(result)))
+            continue
+
+        changes = []
+        for metric, regression in compared_metrics:
+            new_value, old_value = result.get(metric), old.get(metric)
+            if new_value is None or old_value is None or old_value <= 0.0:
+                changes.append("{:>14s}".format("-"))
+                continue
+            change = new_value / old_value - 1.0
+            flag = ""
+            if regression is True and change > tolerance:
+                regressions.append((result, metric, old_value, new_value))
+                flag = " !"
+            changes.append("{:>14s}".format(
+                "{:+.1f}%".format(1.0e2 * change) + flag))
+        if result['converged'] is not True and old.get('converged') is True:
+            regressions.append((result, 'converged', True, False))
+            changes.append("  now fails")
+        print("{:<48s}".format(case_name(result)) + "".join(changes))
+
+    for key in ['numpy', 'scipy', 'fipy', 'python']:
+        if baseline.get('versions', {}).get(key) != versions()[key]:
+            print("The baseline was run with " + key + " "
+                  + str(baseline.get('versions', {}).get(key)) + ", this with "
+                  + versions()[key] + ".")
+    return regressions
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description="Benchmarks the models over the number of cells, the "
+                    "diffusivity models, time steps and linear solvers.")
+    argument_parser.add_argument('--configs', nargs='+',
+                                 default=['taylor_config.py',
+                                          'flux_config.py'],
+                                 help="The configuration files to run")
+    argument_parser.add_argument('--nx', type=int, nargs='+',
+                                 default=[100, 1000, 10000],
+                                 help="The numbers of cells")
+    argument_parser.add_argument('--diffusivities', nargs='+',
+                                 default=diffusivity_choices,
+                                 help="The diffusivity models (D_choice)")
+    argument_parser.add_argument('--dt', type=float, nargs='+',
+                                 default=[1.0],
+                                 help="Factors of the timeStep of the "
+                                 "configuration files")
+    argument_parser.add_argument('--solvers', nargs='+', default=[None],
+                                 help="The linear solvers; by default the one "
+                                 "of each configuration file")
+    argument_parser.add_argument('--steps', type=int, default=5,
+                                 help="Time steps per case")
+    argument_parser.add_argument('--output', default="benchmark.json",
+                                 help="JSON file of the results")
+    argument_parser.add_argument('--baseline', default=None,
+                                 help="JSON file of an earlier benchmark to "
+                                 "compare with")
+    argument_parser.add_argument('--tolerance', type=float, default=0.25,
+                                 help="Relative increase of a measurement "
+                                 "over the baseline that is a regression")
+    arguments = argument_parser.parse_args()
+
+    cases = [{'config': config_file, 'nx': nx,
+              'D_choice': D_choice, 'dt_factor': dt_factor, 'solver': solver}
+             for config_file, nx, D_choice, dt_factor, solver in
+             itertools.product(arguments.configs, arguments.nx,
+                               arguments.diffusivities, arguments.dt,
+                               arguments.solvers)]
+
+    results = []
+    print("{:<48s}{:>10s}{:>12s}{:>8s}{:>12s}{:>12s}{:>10s}{:>10s}".format(
+        "Case", "converged", "step [s]", "sweeps", "coeffs [s]",
+        "solve [s]", "io [s]", "mem [MB]"))
+    for case in cases:
+        # A fresh process per case
+        with Pool(processes=1) as pool:
+            result = pool.apply(run_case, (case, arguments.steps))
+        results.append(result)
+        if 'error' in result:
+            print("{:<48s}  failed: {}".format(case_name(result),
+                                               result['error']))
+            continue
+        print("{:<48s}{!s:>10s}{:>12.4e}{:>8.2f}{:>12.4e}{:>12.4e}{:>10.2e}"
+              "{:>10.1f}".format(case_name(result), result['converged'],
+                                 result['step_time'], result['sweeps'],
+                                 result['coefficients'], result['solve'],
+                                 result['io'], result['peak_memory'] or 0.0))
+
+    report = {'versions': versions(), 'steps': arguments.steps,
+              'date': time.strftime("%Y-%m-%d %H:%M:%S"), 'cases': results}
+    with open(arguments.output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+        report_file.write("\n")
+    print("Written to " + arguments.output)
+
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, arguments.tolerance)
+        for result, metric, old_value, new_value in regressions:
+            print("Regression: " + case_name(result) + ", " + metric + " "
+                  + str(old_value) + " -> " + str(new_value))
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No regressions beyond {:.0f}%.".format(
+            1.0e2 * arguments.tolerance))
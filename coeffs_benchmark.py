@@ -0,0 +1,112 @@
+"""
+    This file measures the time of one call of the coefficient kernels of the
+    flux model, calculate_coeffs() (FiPy expressions) and
+    calculate_coeffs_fused() (numpy), for a growing number of cells. Every
+    kernel is timed with its constant factors (see coefficient_constants())
+    built once, as in a run, and rebuilt at every call, as all of them were
+    evaluated before, so the difference is the work the one-time setup takes
+    out of every call. The time of every group of coefficients is reported
+    as well, for the calls with the constants built once.
+
+    Use: python coeffs_benchmark.py CONFIG_FILE.py [--nx 100 1000 10000]
+         [--calls 50] [--repeats 5] [--output coeffs_benchmark.tsv]
+"""
+
+import io
+import argparse
+import time
+from contextlib import redirect_stdout
+
+from src.input_handling import load_config
+from src.model import build_model
+from src.profiling import Profiler
+from src.calculate_coeffs import calculate_coeffs, calculate_coeffs_fused
+
+
+kernels = [('fipy', calculate_coeffs), ('fused', calculate_coeffs_fused)]
+
+
+def time_calls(model, kernel, calls, rebuild):
+    """ The mean time of one call of the kernel, over 'calls' calls. """
+    start = time.perf_counter()
+    for call in range(calls):
+        if rebuild is True:
+            model.coefficient_constants = None
+        kernel(model)
+    return (time.perf_counter() - start) / calls
+
+
+def benchmark(config_file, nx, kernel, calls, repeats):
+    """
+        Returns the best per-call times (over the repeats) of the kernel with
+        the constants rebuilt and built once, and the mean time of every
+        group of coefficients, on the initial state of the configuration
+        with nx cells.
+    """
+    config = load_config(config_file)
+    config.batch_mode = True
+    config.nx = nx
+    # The variables of the coefficients the kernel needs
+    config.fused_coeffs = kernel is calculate_coeffs_fused
+
+    with redirect_stdout(io.StringIO()):
+        model = build_model(config)
+    kernel(model)
+
+    # Interleaved, so that both see the same load of the machine
+    rebuilt, once = [], []
+    for repeat in range(repeats):
+        rebuilt.append(time_calls(model, kernel, calls, True))
+        once.append(time_calls(model, kernel, calls, False))
+
+    model.profiler = Profiler()
+    for call in range(calls):
+        kernel(model)
+        model.profiler.end_step()
+    groups = dict((name, stats['mean']) for name, stats in
+                  model.profiler.summary()['phases'].items())
+
+    return min(rebuilt), min(once), groups
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Times the coefficient kernels with their constant "
+                    "factors built once and at every call.")
+    parser.add_argument('config_file')
+    parser.add_argument('--nx', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('--calls', type=int, default=50,
+                        help="Calls per measurement")
+    parser.add_argument('--repeats', type=int, default=5,
+                        help="Measurements of which the fastest is kept")
+    parser.add_argument('--output', default=None,
+                        help="Also write the results to this TSV file")
+    arguments = parser.parse_args()
+
+    rows = []
+    print("{:>7s}{:>8s}{:>15s}{:>15s}{:>12s}".format(
+        "nx", "kernel", "rebuilt [ms]", "once [ms]", "reduction"))
+    for nx in arguments.nx:
+        for name, kernel in kernels:
+            rebuilt, once, groups = benchmark(arguments.config_file, nx,
+                                              kernel, arguments.calls,
+                                              arguments.repeats)
+            reduction = 1.0 - once / rebuilt
+            rows.append((nx, name, rebuilt, once, reduction, groups))
+            print("{:>7d}{:>8s}{:>15.4f}{:>15.4f}{:>11.1f}%".format(
+                nx, name, 1.0e3 * rebuilt, 1.0e3 * once, 1.0e2 * reduction))
+
+    print("\nMean time of the groups of coefficients per call [ms]:")
+    for nx, name, rebuilt, once, reduction, groups in rows:
+        print("nx = " + str(nx) + ", " + name + ": " + ", ".join(
+            "{} {:.4f}".format(group.replace("coefficients: ", ""),
+                               1.0e3 * seconds)
+            for group, seconds in groups.items()))
+
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as table_file:
+            table_file.write("nx\tkernel\trebuilt\tonce\treduction\n")
+            for nx, name, rebuilt, once, reduction, groups in rows:
+                table_file.write("{}\t{}\t{:.6e}\t{:.6e}\t{:.4f}\n".format(
+                    nx, name, rebuilt, once, reduction))
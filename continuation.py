@@ -0,0 +1,122 @@
+"""
+    This file maps the steady states of a configuration file over one of the
+    core fluxes (Gamma_c or q_c): the S-curve of Z at the edge against the
+    flux, with its turning points, i.e. the hysteresis loop of the L--H
+    transition. Instead of independent runs from the initial conditions at
+    every value, the steady state is followed from one value to the next
+    (see src/continuation.py). The curve is written as a table and a plot.
+
+    Use: python continuation.py CONTINUATION_CONFIG_FILE.py
+    Read through the example configuration file 'continuation_config.py'.
+"""
+
+import sys
+import os
+import time
+import io
+from contextlib import redirect_stdout
+
+from src.input_handling import load_config
+from src.model import build_model
+from src.continuation import Continuation
+
+
+# Columns of the table of the curve, after the parameter
+curve_columns = ['Z_edge', 'pedestal_density', 'pedestal_temperature',
+                 'iterations', 'kind', 'branch']
+
+
+def write_curve(filename, parameter, points):
+    with open(filename, 'w') as table_file:
+        table_file.write("\t".join(['point', parameter] + curve_columns)
+                         + "\n")
+        for point in points:
+            table_file.write("\t".join(str(point[column]) for column in
+                                       ['point', parameter] + curve_columns)
+                             + "\n")
+
+
+def plot_curve(filename, parameter, points, turning_points):
+    """ Saves the plot of the S-curve, with the turning points marked. """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots()
+    axes.plot([point[parameter] for point in points],
+              [point['Z_edge'] for point in points], '.-')
+    axes.plot([point[parameter] for point in turning_points],
+              [point['Z_edge'] for point in turning_points], 'rx',
+              label="Turning points")
+    axes.set_xlabel(parameter)
+    axes.set_ylabel(r"$Z$ at the edge")
+    axes.legend()
+    figure.savefig(filename)
+    plt.close(figure)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Use: python continuation.py CONTINUATION_CONFIG_FILE.py",
+              file=sys.stderr)
+        sys.exit(2)
+
+    settings = load_config(sys.argv[1])
+    derived = getattr(settings, 'derived', None) or {}
+    for name, function in derived.items():
+        if not callable(function):
+            print("Invalid configuration in " + sys.argv[1] + ": derived "
+                  + name + " is not a function of " + settings.parameter,
+                  file=sys.stderr)
+            sys.exit(2)
+    directory = getattr(settings, 'continuation_directory', "Continuation")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # The steady states are solved with Newton's method, without output
+    config = load_config(settings.base_config)
+    config.batch_mode = True
+    config.generate_plots = False
+    config.save_plots = False
+    config.save_TSVs = False
+    config.save_output = False
+    config.nonlinear_solver = "newton"
+
+    with redirect_stdout(io.StringIO()):
+        model = build_model(config)
+
+    continuation = Continuation(
+        model, settings.parameter, derived,
+        getattr(settings, 'method', 'arclength'),
+        getattr(settings, 'min_step', None),
+        getattr(settings, 'max_step', None),
+        getattr(settings, 'max_points', 500))
+
+    wall_start = time.time()
+    failure = None
+    # Line-buffered, to follow the progress of the points
+    with open(os.path.join(directory, "continuation.log"), 'w',
+              buffering=1) as log_file, redirect_stdout(log_file):
+        try:
+            continuation.run(settings.start, settings.stop, settings.step)
+        except RuntimeError as error:
+            failure = str(error)
+            print(failure)
+
+    write_curve(os.path.join(directory, "curve.tsv"), settings.parameter,
+                continuation.points)
+    if len(continuation.points) > 0:
+        plot_curve(os.path.join(directory, "s_curve.png"), settings.parameter,
+                   continuation.points, continuation.turning_points)
+
+    print(str(len(continuation.points)) + " points, "
+          + str(continuation.iterations) + " Newton iterations, "
+          + "{:.1f} s".format(time.time() - wall_start))
+    for turning_point in continuation.turning_points:
+        print("Turning point: " + settings.parameter + " = {:.6e}, "
+              "Z_edge = {:.6e}".format(turning_point[settings.parameter],
+                                       turning_point['Z_edge']))
+
+    if failure is not None:
+        print(failure, file=sys.stderr)
+        sys.exit(1)
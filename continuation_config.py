@@ -0,0 +1,37 @@
+"""
+    This is an example configuration file of a continuation, run with
+    'python continuation.py continuation_config.py'. The steady state of the
+    base configuration file is followed from Gamma_c = start to stop, and the
+    S-curve of Z at the edge against Gamma_c is written.
+"""
+
+# The configuration file of the model; its Gamma_c and q_c are replaced
+base_config = "taylor_config.py"
+
+# Directory of the table (curve.tsv), plot (s_curve.png) and log
+continuation_directory = "Continuation"
+
+# The core flux that is changed: 'Gamma_c' or 'q_c'
+parameter = 'Gamma_c'
+
+# Inputs that depend on it, as functions of the parameter
+derived = {
+    'q_c': lambda Gamma_c: 5.0 * Gamma_c
+}
+
+# The range, and the first step along the curve
+start = -1.5
+stop = -0.1
+step = 0.05
+
+# 'natural' steps the parameter, and jumps between the stable branches at
+# the turning points; 'arclength' (pseudo-arclength) follows the curve around
+# the turning points, including its unstable branch
+method = 'arclength'
+
+# Bounds of the step along the curve; default to 1e-3 and 10 times step
+# min_step = 1.0e-4
+# max_step = 0.2
+
+# The continuation stops after this many points
+max_points = 500
@@ -7,6 +7,14 @@ taylor_model = False
 
 res_tol = 1.0e14
 
+# The fused numpy kernel of the coefficients gives the same results as the
+# FiPy expressions (see tests/test_calculate_coeffs.py), much faster
+fused_coeffs = True
+
+# The stiff sources of the Z-equation stall the Picard sweeps; Newton's method
+# treats them implicitly
+nonlinear_solver = "newton"
+
 # Total time steps; should be ~ L^2 / D
 total_timeSteps = 2000
 
@@ -0,0 +1,300 @@
+"""
+    This file runs a parameter sweep: a base configuration file is run for
+    every point of a grid of parameter values, in parallel. The runs are
+    spread over a pool of worker processes, in which every run builds its own
+    model with build_model(), in batch mode, and writes to its own directory.
+    A worker imports FiPy only once for all of its runs. At the end, a summary
+    table of all runs is written. All runs may also continue from the
+    checkpoint of one earlier run ('restart_from'), to branch off one state.
+
+    With an ensemble size K > 1, the points that only differ in the member
+    parameters of src/ensemble.py (e.g. Gamma_c and shear_a1) are run K at a
+    time as one ensemble, which costs about as much as one run with K times
+    the cells. Every member still gets its own directory, summary and log,
+    and the points of an ensemble that cannot be built are run one by one.
+
+    Use: python parameter_sweep.py SWEEP_CONFIG_FILE.py [--workers N]
+         [--ensemble K]
+    Read through the example sweep configuration file 'sweep_config.py'.
+"""
+
+import sys
+import os
+import io
+import argparse
+import importlib.util
+import itertools
+import json
+import shutil
+import time
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Columns of the summary table, after the swept parameters
+summary_columns = ['converged', 'stop_reason', 'pedestal_density',
+                   'pedestal_temperature', 'Z_edge', 'steps', 'time',
+                   'wall_time', 'exit_status']
+
+
+def load_module(filename):
+    """ Imports a (configuration) file given as a path. """
+    spec = importlib.util.spec_from_file_location(
+        os.path.splitext(os.path.basename(filename))[0], filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parameter_grid(parameters):
+    """
+        The Cartesian product of the parameter values, as a list of
+        dictionaries (one per run).
+    """
+    names = sorted(parameters.keys())
+    return [dict(zip(names, values)) for values in
+            itertools.product(*[parameters[name] for name in names])]
+
+
+def write_run_config(base_config, point, derived, run_directory):
+    """
+        Writes the configuration file of one run: the base configuration
+        file, followed by the values of this point of the grid and the
+        derived values (as Python expressions). Plotting is turned off, and
+        the output and the summary are written into the run directory, by
+        absolute paths, as the workers do not change their directory.
+    """
+    with open(base_config) as base_file:
+        lines = [base_file.read(), "\n\n# ----- Parameter sweep -----\n"]
+
+    for name in sorted(point.keys()):
+        lines.append(name + " = " + repr(point[name]) + "\n")
+    for name in sorted(derived.keys()):
+        lines.append(name + " = " + derived[name] + "\n")
+
+    lines.append("generate_plots = False\n")
+    run_directory = os.path.abspath(run_directory)
+    lines.append("save_directory = "
+                 + repr(os.path.join(run_directory, "output")) + "\n")
+    lines.append("summary_file = "
+                 + repr(os.path.join(run_directory, "summary.json")) + "\n")
+
+    run_config = os.path.join(run_directory, "config.py")
+    with open(run_config, 'w') as config_file:
+        config_file.writelines(lines)
+    return run_config
+
+
+def clear_run_directory(run_directory, restart=None):
+    """
+        Removes the results of an earlier sweep from run_directory: its
+        summary, final profiles and output, so that a run that fails now
+        cannot report them as its own. An output directory holding the
+        checkpoint 'restart' is kept.
+    """
+    for name in ["summary.json", "final_profiles.tsv"]:
+        if os.path.isfile(os.path.join(run_directory, name)):
+            os.remove(os.path.join(run_directory, name))
+
+    output = os.path.abspath(os.path.join(run_directory, "output"))
+    if os.path.isdir(output) and (restart is None or not os.path.abspath(
+            restart).startswith(output + os.sep)):
+        shutil.rmtree(output)
+
+
+def run_point(run_directory, restart=None):
+    """
+        Builds and runs the model of the configuration in run_directory, in
+        batch mode, and returns the summary of the run. If 'restart' is a
+        checkpoint, the run continues from it. It is called in the worker
+        processes.
+    """
+    # Imported here, so that the workers set up numpy with one thread each
+    from src.input_handling import load_config
+    from src.model import build_model
+    from src.solving_loop import run_model
+
+    clear_run_directory(run_directory, restart)
+    summary_file = os.path.join(run_directory, "summary.json")
+    wall_start = time.time()
+    with open(os.path.join(run_directory, "output.log"), 'w') as log_file, \
+            redirect_stdout(log_file), redirect_stderr(log_file):
+        try:
+            config = load_config(os.path.join(run_directory, "config.py"))
+            config.batch_mode = True
+            exit_status = run_model(build_model(config), restart)
+        except SystemExit as error:
+            exit_status = error.code if type(error.code) == int else 2
+            print(error.code)
+        except Exception:
+            exit_status = 1
+            traceback.print_exc()
+
+    summary = {'converged': False, 'wall_time': time.time() - wall_start}
+    if os.path.isfile(summary_file):
+        with open(summary_file) as summary_json:
+            summary.update(json.load(summary_json))
+    summary['exit_status'] = exit_status
+
+    return summary
+
+
+def run_ensemble_points(run_directories, restart=None):
+    """
+        Runs the configurations in run_directories as the members of one
+        ensemble, and returns the summary of every run. The log of the
+        ensemble is written to all of the run directories. If the ensemble
+        cannot be built (e.g. the points differ in more than the member
+        parameters), they are run one by one with run_point().
+    """
+    from src.input_handling import load_config
+    from src.ensemble import build_ensemble, run_ensemble, write_profiles
+    from src.run_summary import write_summary
+
+    for run_directory in run_directories:
+        clear_run_directory(run_directory, restart)
+
+    wall_start = time.time()
+    log = io.StringIO()
+    summaries = None
+    with redirect_stdout(log), redirect_stderr(log):
+        try:
+            configs = []
+            for run_directory in run_directories:
+                config = load_config(os.path.join(run_directory, "config.py"))
+                config.batch_mode = True
+                configs.append(config)
+            ensemble = build_ensemble(configs)
+        except (Exception, SystemExit):
+            return [run_point(run_directory, restart)
+                    for run_directory in run_directories]
+
+        try:
+            summaries = run_ensemble(ensemble, restart)
+        except Exception:
+            traceback.print_exc()
+
+    results = []
+    for member, run_directory in enumerate(run_directories):
+        with open(os.path.join(run_directory, "output.log"), 'w') as log_file:
+            log_file.write("Member " + str(member) + " of the ensemble of "
+                           + ", ".join(run_directories) + "\n\n")
+            log_file.write(log.getvalue())
+
+        summary = {'converged': False, 'wall_time': time.time() - wall_start}
+        if summaries is not None:
+            summary = summaries[member]
+            write_summary(os.path.join(run_directory, "summary.json"),
+                          summary)
+            write_profiles(ensemble, member, os.path.join(
+                run_directory, "final_profiles.tsv"))
+        summary['exit_status'] = 0 if summary['converged'] is True else 1
+        results.append(summary)
+
+    return results
+
+
+def ensemble_groups(points, size, member_parameters):
+    """
+        The numbers of the points, in groups of up to 'size' points that
+        only differ in the member parameters.
+    """
+    groups = {}
+    for number, point in enumerate(points):
+        shared = tuple((name, repr(point[name])) for name in sorted(point)
+                       if name not in member_parameters)
+        groups.setdefault(shared, []).append(number)
+    return [numbers[start:start + size] for numbers in groups.values()
+            for start in range(0, len(numbers), size)]
+
+
+def write_summary_table(filename, names, points, summaries):
+    with open(filename, 'w') as table_file:
+        table_file.write("\t".join(['run'] + names + summary_columns) + "\n")
+        for number, (point, summary) in enumerate(zip(points, summaries)):
+            table_file.write("\t".join(
+                [str(number)] + [str(point[name]) for name in names]
+                + [str(summary.get(column)) for column in summary_columns])
+                + "\n")
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description="Runs a configuration file over a grid of parameters.")
+    argument_parser.add_argument('sweep_config',
+                                 help="The sweep configuration file")
+    argument_parser.add_argument('--workers', type=int, default=None,
+                                 help="Number of parallel runs; defaults to "
+                                 "the number of cores")
+    argument_parser.add_argument('--ensemble', type=int, default=None,
+                                 help="Number of points run together as one "
+                                 "ensemble; defaults to 1")
+    arguments = argument_parser.parse_args()
+
+    sweep = load_module(arguments.sweep_config)
+    base_config = os.path.abspath(sweep.base_config)
+    parameters = getattr(sweep, 'parameters', {})
+    derived = getattr(sweep, 'derived', {})
+    sweep_directory = os.path.abspath(getattr(sweep, 'sweep_directory',
+                                              "Sweep"))
+
+    restart = getattr(sweep, 'restart_from', None)
+    if restart is not None:
+        restart = os.path.abspath(restart)
+
+    workers = arguments.workers or getattr(sweep, 'workers', None) \
+        or os.cpu_count()
+    ensemble_size = arguments.ensemble or getattr(sweep, 'ensemble_size', 1)
+
+    # One thread per run; the parallelism is over the runs
+    for variable in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                     'MKL_NUM_THREADS']:
+        os.environ[variable] = '1'
+
+    # One directory and configuration file per run
+    points = parameter_grid(parameters)
+    run_directories = []
+    for number, point in enumerate(points):
+        run_directory = os.path.join(sweep_directory,
+                                     "run_" + str(number).zfill(4))
+        if not os.path.exists(run_directory):
+            os.makedirs(run_directory)
+        write_run_config(base_config, point, derived, run_directory)
+        run_directories.append(run_directory)
+
+    print("Running " + str(len(points)) + " points with " + str(workers)
+          + " workers in " + sweep_directory)
+
+    if ensemble_size > 1:
+        # Imported only now, with the number of threads set
+        from src.ensemble import member_parameters
+
+        groups = ensemble_groups(points, ensemble_size, member_parameters)
+        print("as " + str(len(groups)) + " ensembles of up to "
+              + str(ensemble_size) + " points")
+        summaries = [None] * len(points)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for numbers, results in zip(groups, pool.map(
+                    run_ensemble_points,
+                    [[run_directories[number] for number in numbers]
+                     for numbers in groups], [restart] * len(groups))):
+                for number, summary in zip(numbers, results):
+                    summaries[number] = summary
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(run_point, run_directories,
+                                      [restart] * len(run_directories)))
+
+    names = sorted(parameters.keys())
+    write_summary_table(os.path.join(sweep_directory, "summary.tsv"), names,
+                        points, summaries)
+
+    for number, (point, summary) in enumerate(zip(points, summaries)):
+        print(str(number).zfill(4) + "  " + ", ".join(
+            name + " = " + str(point[name]) for name in names)
+            + "  ->  converged: " + str(summary['converged'])
+            + ", wall time: {:.1f} s".format(summary['wall_time']))
+
+    if not all(summary['converged'] for summary in summaries):
+        sys.exit(1)
@@ -0,0 +1,112 @@
+"""
+    This file compares the linear solvers on a configuration file, for a
+    growing number of cells: every solver (and preconditioner) is run for a
+    few time steps at every nx, and the time of the linear solves, the time
+    of the steps, and the sweeps are reported, with the fastest solver of
+    every nx.
+
+    Use: python solver_benchmark.py CONFIG_FILE.py [--nx 50 100 200 400]
+         [--steps 3] [--output benchmark.tsv]
+"""
+
+import io
+import argparse
+import time
+from contextlib import redirect_stdout, redirect_stderr
+
+from src.input_handling import load_config
+from src.model import build_model
+from src.profiling import Profiler
+from src.time_stepping import TimeStepper, TimeStepError, solve_time_step
+
+
+# The solvers compared, as (solver, preconditioner)
+solver_choices = [('gmres', None), ('gmres', 'ilu'), ('gmres', 'jacobi'),
+                  ('gmres', 'block_jacobi'), ('bicgstab', 'ilu'),
+                  ('lu', None), ('banded', None)]
+
+
+def benchmark(config_file, nx, solver, preconditioner, steps):
+    """
+        Runs the configuration with nx cells and the given solver for
+        'steps' time steps, and returns the timings and sweeps.
+    """
+    config = load_config(config_file)
+    config.batch_mode = True
+    config.nx = nx
+    config.solver = solver
+    config.preconditioner = preconditioner
+
+    with redirect_stdout(io.StringIO()):
+        model = build_model(config)
+    model.profiler = Profiler()
+    model.profiler.instrument_solver(model.solver)
+
+    stepper = TimeStepper(config)
+    sweeps, converged = 0, True
+    wall_start = time.time()
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        for step in range(steps):
+            model.update_old()
+            model.update_diffusivity()
+            model.update_coeffs()
+            try:
+                sweeps += solve_time_step(
+                    model.full_equation, model.state_variables(), stepper,
+                    model.solver, config)['sweeps']
+            except TimeStepError:
+                converged = False
+                break
+            model.profiler.end_step()
+    wall_time = time.time() - wall_start
+
+    phases = model.profiler.summary()['phases']
+    return {'nx': nx, 'solver': solver,
+            'preconditioner': str(preconditioner), 'converged': converged,
+            'sweeps': sweeps, 'step_time': wall_time / max(stepper.step, 1),
+            'linear_solve': phases.get('linear solve', {}).get('total', 0.0)
+            / max(sweeps, 1)}
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description="Compares the linear solvers on a configuration file.")
+    argument_parser.add_argument('config_file',
+                                 help="The configuration file to run")
+    argument_parser.add_argument('--nx', type=int, nargs='+',
+                                 default=[50, 100, 200, 400],
+                                 help="The numbers of cells")
+    argument_parser.add_argument('--steps', type=int, default=3,
+                                 help="Time steps per run")
+    argument_parser.add_argument('--output', default=None,
+                                 help="TSV file of the results")
+    arguments = argument_parser.parse_args()
+
+    columns = ['nx', 'solver', 'preconditioner', 'converged', 'sweeps',
+               'step_time', 'linear_solve']
+    results = []
+    print("{:>6s}  {:<10s}{:<14s}{:>10s}{:>8s}{:>14s}{:>16s}".format(
+        "nx", "solver", "precon", "converged", "sweeps", "step [s]",
+        "solve/sweep [s]"))
+    for nx in arguments.nx:
+        for solver, preconditioner in solver_choices:
+            result = benchmark(arguments.config_file, nx, solver,
+                               preconditioner, arguments.steps)
+            results.append(result)
+            print("{nx:>6d}  {solver:<10s}{preconditioner:<14s}"
+                  "{converged!s:>10s}{sweeps:>8d}{step_time:>14.4e}"
+                  "{linear_solve:>16.4e}".format(**result))
+
+        fastest = min((result for result in results
+                       if result['nx'] == nx and result['converged']),
+                      key=lambda result: result['step_time'], default=None)
+        if fastest is not None:
+            print("Fastest at nx = " + str(nx) + ": " + fastest['solver']
+                  + " (" + fastest['preconditioner'] + ")")
+
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write("\t".join(columns) + "\n")
+            for result in results:
+                output_file.write("\t".join(str(result[column])
+                                            for column in columns) + "\n")
@@ -0,0 +1,56 @@
+"""
+    This file keeps the model from recomputing what only depends on its
+    state, when the state did not change. FiPy itself already caches its
+    expressions: Z.grad, Z.faceValue, Diffusivity.faceValue and the
+    coefficients of the DiffusionTerms are evaluated once, and only again
+    after a variable they depend on changed. But the Diffusivity and the
+    coefficients of the flux model are set with setValue(), which marks
+    everything built on them as changed, also when they get the same values.
+    That happens whenever they are updated for a state they were already
+    computed for: at the start of a step after a Newton solve, in the
+    steady-state residual, and when the Newton preconditioner is refactorized
+    at the state of the last residual.
+
+    A StateCache remembers the values of the variables (and parameters, such
+    as Gamma_c) an update was last computed from, so the update can be
+    skipped for the same values. The values are copied and compared, which
+    costs O(nx), much less than the expressions it skips. It counts the
+    updates computed and skipped, which the profiler reports per step and
+    per sweep (or Newton iteration).
+"""
+
+import numpy
+
+
+class StateCache(object):
+    def __init__(self):
+        self.keys = {}          # Update -> the values it was computed from
+        self.computed = {}      # Update -> number of times computed
+        self.reused = {}        # Update -> number of times skipped
+
+    def clear(self):
+        """ Forgets all states, e.g. after the variables were set directly. """
+        self.keys = {}
+
+    def reuse(self, name, variables, parameters=()):
+        """
+            Can the update 'name' be skipped? True if the values of the
+            variables and the parameters are the same as at the last call
+            with this name. Otherwise, they are remembered for the next call.
+        """
+        # The parameters may be arrays, e.g. one value per member of an
+        # ensemble
+        parameters = tuple(numpy.array(parameter) for parameter in parameters)
+        previous = self.keys.get(name)
+        if (previous is not None and
+                all(numpy.array_equal(parameter, value) for parameter, value
+                    in zip(parameters, previous[0])) and
+                all(numpy.array_equal(variable.value, value)
+                    for variable, value in zip(variables, previous[1]))):
+            self.reused[name] = self.reused.get(name, 0) + 1
+            return True
+
+        self.keys[name] = (parameters, [numpy.array(variable.value)
+                                        for variable in variables])
+        self.computed[name] = self.computed.get(name, 0) + 1
+        return False
@@ -1,93 +1,536 @@
 """
     This file contains the $g$ coefficients and plasma parameters for use in
     the full flux model $Z$ equation. It has been written as a function as to
-    be called within the solving loop.
+    be called within the solving loop, with the model whose variables it sets.
 """
 
-from src.variable_decl import *
+from fipy.tools import numerix
+from src.parameters import *
 
 import scipy.special        # For the Faddeeva (plasma dispersion) function
 import numpy
 
+from src.profiling import lap_timer
+from src.plasma_dispersion import dispersion_table
+
+
+# The coefficients set by calculate_coeffs(), in order
+coefficient_names = ['v_Ti', 'v_Te', 'n_0', 'rho_pi', 'rho_pe', 'omega_t',
+                     'omega_bi', 'omega_be', 'w_bi', 'nu_ei', 'nu_ii',
+                     'nu_ai', 'nu_ae', 'D_an', 'g_n_an', 'g_T_an', 'g_Z_an',
+                     'Gamma_an', 'ionization_rate', 'cx_rate', 'g_n_cx',
+                     'g_T_cx', 'g_Z_cx', 'Gamma_cx', 'plasma_disp', 'D_bulk',
+                     'Gamma_bulk', 'g_ol', 'Gamma_ol']
+
+# The coefficients every coefficient is calculated from in
+# calculate_coeffs(), besides the state variables
+coefficient_dependencies = {
+    'v_Ti': [], 'v_Te': [], 'n_0': ['v_Ti'],
+    'rho_pi': ['v_Ti'], 'rho_pe': ['v_Te'], 'omega_t': ['v_Ti'],
+    'omega_bi': ['omega_t'], 'omega_be': ['v_Te'], 'w_bi': ['rho_pi'],
+    'nu_ei': [], 'nu_ii': ['nu_ei'], 'nu_ai': ['nu_ii', 'omega_bi'],
+    'nu_ae': ['nu_ei', 'omega_be'],
+    'D_an': ['rho_pe'], 'g_n_an': ['D_an'], 'g_T_an': ['g_n_an'],
+    'g_Z_an': ['g_n_an', 'rho_pi'], 'Gamma_an': ['g_n_an', 'g_T_an',
+                                                 'g_Z_an'],
+    'ionization_rate': [], 'cx_rate': [], 'g_n_cx': ['n_0', 'cx_rate'],
+    'g_T_cx': ['g_n_cx'], 'g_Z_cx': ['g_n_cx', 'rho_pi'],
+    'Gamma_cx': ['g_n_cx', 'g_T_cx', 'g_Z_cx'],
+    'plasma_disp': ['nu_ii', 'omega_t'], 'D_bulk': ['rho_pi'],
+    'Gamma_bulk': ['D_bulk', 'rho_pi', 'plasma_disp'],
+    'g_ol': ['nu_ii', 'nu_ai', 'rho_pi'], 'Gamma_ol': ['g_ol', 'nu_ai',
+                                                       'w_bi']
+}
+
+# The coefficients the equations of each model use (see equations.py). The
+# Z-equation of the Taylor-expanded model only depends on the state, in AU,
+# on which the SI formulas of the coefficients make no sense: it has none
+# (None), and none are calculated, plotted or saved in it at all.
+model_coefficients = {
+    'taylor': None,
+    'flux': ['rho_pi', 'Gamma_an', 'Gamma_cx', 'Gamma_bulk', 'Gamma_ol']
+}
+
+# The coefficients in the TSV files of the flux model (see solving_loop.py)
+tsv_coefficients = ['D_an', 'Gamma_an', 'n_0', 'cx_rate', 'Gamma_cx',
+                    'D_bulk', 'Gamma_bulk', 'Gamma_ol']
+
+
+# ----------------- Required Coefficients -----------------
+# Only the coefficients a run uses are calculated, and stored as variables
+# of the model: the ones of the Z-equation, and the ones that are plotted or
+# saved. The diagnostics nobody asked for (e.g. nu_ae or omega_be) are
+# skipped, and so are the variables of the intermediate coefficients with
+# the fused kernel, which keeps them in its buffers.
+def model_name(config):
+    return 'taylor' if config.taylor_model is True else 'flux'
+
+
+def requested_coefficients(config):
+    """
+        The coefficients the run uses, in the order of coefficient_names;
+        all of them with all_coefficients, and none in the Taylor model.
+    """
+    equations = model_coefficients[model_name(config)]
+    if equations is None:
+        return []
+    if config.all_coefficients is True:
+        return list(coefficient_names)
+
+    requested = set(equations)
+    if config.save_TSVs is True:
+        requested.update(tsv_coefficients)
+    if config.aux_plots is True:
+        requested.update(config.aux_vars)
+    if config.save_output is True:
+        requested.update(config.output_vars)
+    return [name for name in coefficient_names if name in requested]
+
+
+def coefficient_closure(names):
+    """
+        The coefficients, with all of the coefficients they are calculated
+        from, in the order of coefficient_names.
+    """
+    needed = set()
+    pending = list(names)
+    while len(pending) > 0:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(coefficient_dependencies[name])
+    return [name for name in coefficient_names if name in needed]
+
+
+def declared_coefficients(config):
+    """
+        The coefficients that are variables of the model: the ones
+        calculate_coeffs() calculates, or with the fused kernel only the
+        requested ones.
+    """
+    requested = requested_coefficients(config)
+    if config.fused_coeffs is True:
+        return requested
+    return coefficient_closure(requested)
+
+
+# ----------------- Constant Factors ----------------------
+# The parts of the coefficients that do not depend on the state: the
+# combinations of the machine parameters of src/parameters.py (ASDEX-U or
+# ITER), and the profiles that only depend on the cell positions. They are
+# built once, so that calculate_coeffs() and calculate_coeffs_fused() only
+# evaluate what changes from one call to the next.
+def coefficient_constants(model):
+    """
+        Returns the constant factors of the coefficients of the model, as a
+        dictionary of scalars and arrays on the mesh. They are computed at the
+        first call, and again only if the mesh of the model was replaced.
+    """
+    constants = model.coefficient_constants
+    if constants is not None and constants['mesh'] is model.mesh:
+        return constants
+
+    x = numpy.array(model.x.value)
+    with numpy.errstate(over='ignore'):
+        # Far from the wall (or in the Taylor model) the exponential
+        # overflows, and the neutrals vanish
+        neutral_profile = 1.0 / (1.0 + numpy.exp(1.0e3 * (x - 0.02)))
+    constants = {
+        'mesh': model.mesh,
+        'x': x,                                                  # [m]
+        # Thermal velocities over sqrt(T)
+        'v_i': numpy.sqrt(2.0 * charge / m_i),
+        'v_e': numpy.sqrt(2.0 * charge / m_e),
+        # Gyro-radii over the thermal velocities
+        'rho_i': m_i / (charge * B_theta),
+        'rho_e': m_e / (charge * B_theta),
+        'transit': 1.0 / (q * R),
+        'sqrt_aspect': numpy.sqrt(aspect),
+        'sqrt_aspect_3': numpy.sqrt(aspect**3),
+        'nu_ii': 1.2 * numpy.sqrt(m_e / m_i),
+        # D_an over rho_pe * T
+        'anomalous': aspect**2 * numpy.sqrt(pi) / (2 * a_m * B * charge),
+        # g_n_cx over n_0 * cx_rate * density * T
+        'charge_exchange': (-(m_i / charge) / (B_theta**2)
+                            * ((B_theta**2 / (aspect * B_phi)**2) + 2.0)),
+        # Shape of the neutrals density, n_0 * v_Ti / (-0.1 * Gamma_c)
+        'neutral_profile': neutral_profile,
+        # D_bulk over rho_pi * T
+        'bulk': aspect**2 / ((x - a_m) * B * numpy.sqrt(pi)),
+    }
+    model.coefficient_constants = constants
+    return constants
+
 
 # ASSUMES density is in m^-3 and temperature is in eV
-def calculate_coeffs():
+def calculate_coeffs(model):
+    config = model.config
+    density, temperature, Z = model.density, model.temperature, model.Z
+    # The coefficients that are not calculated are not variables of the model
+    (v_Ti, v_Te, n_0, rho_pi, rho_pe, omega_t, omega_bi, omega_be, w_bi,
+     nu_ei, nu_ii, nu_ai, nu_ae, D_an, g_n_an, g_T_an, g_Z_an, Gamma_an,
+     ionization_rate, cx_rate, g_n_cx, g_T_cx, g_Z_cx, Gamma_cx, plasma_disp,
+     D_bulk, Gamma_bulk, g_ol, Gamma_ol) \
+        = [model.variable_dictionary.get(name) for name in coefficient_names]
+    computed = model.computed_coefficients
+    lap = lap_timer(model)
+    constants = coefficient_constants(model)
+    x = constants['x']
+    lap("coefficients: constants")
+
     # Thermal velocities (most probable)
-    v_Ti.setValue(numerix.sqrt(2.0 * charge * temperature / m_i))  # [m/s]
-    v_Te.setValue(numerix.sqrt(2.0 * charge * temperature / m_e))  # [m/s]
+    sqrt_T = numerix.sqrt(temperature)
+    if 'v_Ti' in computed:
+        v_Ti.setValue(constants['v_i'] * sqrt_T)                 # [m/s]
+    if 'v_Te' in computed:
+        v_Te.setValue(constants['v_e'] * sqrt_T)                 # [m/s]
+    lap("coefficients: velocities")
 
     # NEED dynamic definition!
-    n_0.setValue((-0.1 * config.Gamma_c / v_Ti) / (1.0 +
-                 numerix.exp(1.0e3 * (x - 0.02))))               # [m^-3]
+    if 'n_0' in computed:
+        n_0.setValue((-0.1 * config.Gamma_c / v_Ti)
+                     * constants['neutral_profile'])             # [m^-3]
+    lap("coefficients: neutrals")
 
     # Poloidal gyro-(Larmor) radii
-    rho_pi.setValue(m_i * v_Ti / (charge * B_theta))             # [m]
-    rho_pe.setValue(m_e * v_Te / (charge * B_theta))             # [m]
+    if 'rho_pi' in computed:
+        rho_pi.setValue(constants['rho_i'] * v_Ti)               # [m]
+    if 'rho_pe' in computed:
+        rho_pe.setValue(constants['rho_e'] * v_Te)               # [m]
 
     # Transition frequency
-    omega_t.setValue(v_Ti / (q * R))
+    if 'omega_t' in computed:
+        omega_t.setValue(constants['transit'] * v_Ti)
 
     # Banana orbit bounce frequencies
-    omega_bi.setValue(numerix.sqrt(aspect**3) * omega_t)         # [s^-1]
-    omega_be.setValue(numerix.sqrt(aspect**3) * v_Te / (q * R))  # [s^-1]
+    if 'omega_bi' in computed:
+        omega_bi.setValue(constants['sqrt_aspect_3'] * omega_t)  # [s^-1]
+    if 'omega_be' in computed:
+        omega_be.setValue(constants['sqrt_aspect_3'] * constants['transit']
+                          * v_Te)                                # [s^-1]
 
     # Banana width
-    w_bi.setValue(numerix.sqrt(aspect) * rho_pi)                 # [m]
+    if 'w_bi' in computed:
+        w_bi.setValue(constants['sqrt_aspect'] * rho_pi)         # [m]
+    lap("coefficients: orbits")
 
     # Collision frequencies within electrons and ions
-    nu_ei.setValue(4.2058e-11 * (density)
-                   / numerix.sqrt(temperature**3.0))             # [s^-1]
-    nu_ii.setValue(1.2 * numerix.sqrt(m_e / m_i) * nu_ei)        # [s^-1]
+    if 'nu_ei' in computed:
+        nu_ei.setValue(4.2058e-11 * (density)
+                       / numerix.sqrt(temperature**3.0))         # [s^-1]
+    if 'nu_ii' in computed:
+        nu_ii.setValue(constants['nu_ii'] * nu_ei)               # [s^-1]
 
     # Effective collision frequencies
-    nu_ai.setValue(nu_ii / omega_bi)    # nu_*i
-    nu_ae.setValue(nu_ei / omega_be)    # nu_*e (not used as of now)
+    if 'nu_ai' in computed:
+        nu_ai.setValue(nu_ii / omega_bi)    # nu_*i
+    if 'nu_ae' in computed:
+        nu_ae.setValue(nu_ei / omega_be)    # nu_*e (not used as of now)
+    lap("coefficients: collisions")
 
     # Electron Anomalous Diffusion
-    D_an.setValue(aspect**2 * numerix.sqrt(pi) * rho_pe
-                  * (temperature / charge) / (2 * a_m * B))
-    g_n_an.setValue(charge * density * D_an)                     # [A m^-2]
-    g_T_an.setValue(g_n_an * alpha_an)                           # [A m^-2]
-    g_Z_an.setValue(g_n_an / rho_pi)                             # [A m^-1]
+    if 'D_an' in computed:
+        D_an.setValue(constants['anomalous'] * rho_pe * temperature)
+    if 'g_n_an' in computed:
+        g_n_an.setValue(charge * density * D_an)                 # [A m^-2]
+    if 'g_T_an' in computed:
+        g_T_an.setValue(g_n_an * alpha_an)                       # [A m^-2]
+    if 'g_Z_an' in computed:
+        g_Z_an.setValue(g_n_an / rho_pi)                         # [A m^-1]
 
-    Gamma_an.setValue(g_n_an * density.grad[0]
-                      / density + g_T_an * temperature.grad[0] / temperature
-                      + g_Z_an * Z)                              # [m^-2 s^-1]
+    if 'Gamma_an' in computed:
+        Gamma_an.setValue(g_n_an * density.grad[0] / density
+                          + g_T_an * temperature.grad[0] / temperature
+                          + g_Z_an * Z)                          # [m^-2 s^-1]
+    lap("coefficients: anomalous")
 
     # Charge Exchange Friction, Itoh 1989
-    ionization_rate.setValue(5.0e-14 * (100.0 * temperature)
-                             ** (-1.0 / 4.0))                     # [m^3 s^-1]
+    if 'ionization_rate' in computed:
+        ionization_rate.setValue(5.0e-14 * (100.0 * temperature)
+                                 ** (-1.0 / 4.0))                 # [m^3 s^-1]
 
     # Rozhansky cx rate
 #    cx_rate.setValue(1.985e-14 * numerix.sqrt(temperature))      # [m^3 s^-1]
 
     # Itoh 1989
-    cx_rate.setValue(1.0e-14 * (100 * temperature)**(1.0 / 3))   # [m^3 s^-1]
+    if 'cx_rate' in computed:
+        cx_rate.setValue(1.0e-14 * (100 * temperature)
+                         ** (1.0 / 3))                           # [m^3 s^-1]
 
-    g_n_cx.setValue((-(m_i * n_0 * cx_rate * density
-                    * (temperature / charge)) / (B_theta**2))
-                    * ((B_theta**2 / (aspect * B_phi)**2)
-                       + 2.0))                                   # [A m^-2]
-    g_T_cx.setValue(alpha_cx * g_n_cx)                           # [A m^-2]
-    g_Z_cx.setValue(g_n_cx / rho_pi)                             # [A m^-1]
+    if 'g_n_cx' in computed:
+        g_n_cx.setValue(constants['charge_exchange'] * n_0 * cx_rate
+                        * density * temperature)                 # [A m^-2]
+    if 'g_T_cx' in computed:
+        g_T_cx.setValue(alpha_cx * g_n_cx)                       # [A m^-2]
+    if 'g_Z_cx' in computed:
+        g_Z_cx.setValue(g_n_cx / rho_pi)                         # [A m^-1]
 
-    Gamma_cx.setValue(g_n_cx * density.grad[0] / density
-                      + g_T_cx * temperature.grad[0] / temperature
-                      + g_Z_cx * Z)                              # [m^-2 s^-1]
+    if 'Gamma_cx' in computed:
+        Gamma_cx.setValue(g_n_cx * density.grad[0] / density
+                          + g_T_cx * temperature.grad[0] / temperature
+                          + g_Z_cx * Z)                          # [m^-2 s^-1]
+    lap("coefficients: charge exchange")
 
     # Ion Bulk (Parallel) Viscosity
-    plasma_disp.setValue(numpy.imag(1j * numerix.sqrt(pi)
-                         * scipy.special.wofz(Z + 1j * nu_ii / omega_t)))
+    if 'plasma_disp' in computed:
+        if config.plasma_disp == "table":
+            plasma_disp.setValue(dispersion_table(model).evaluate(
+                Z.value, (nu_ii / omega_t).value))
+        else:
+            plasma_disp.setValue(numpy.imag(
+                1j * numerix.sqrt(pi)
+                * scipy.special.wofz(Z + 1j * nu_ii / omega_t)))
 #    plasma_disp.setValue(numerix.sqrt(pi) * numerix.exp(-Z**2))
-    D_bulk.setValue(aspect**2 * rho_pi * temperature
-                    / ((x - a_m) * B * numerix.sqrt(pi)))        # [m^2 s^-1]
+    if 'D_bulk' in computed:
+        D_bulk.setValue(constants['bulk'] * rho_pi
+                        * temperature)                           # [m^2 s^-1]
 
-    Gamma_bulk.setValue(density * D_bulk * (density.grad[0] / density
-                        + Z / rho_pi) * plasma_disp)             # [m^-2 s^-1]
+    if 'Gamma_bulk' in computed:
+        Gamma_bulk.setValue(density * D_bulk * (density.grad[0] / density
+                            + Z / rho_pi) * plasma_disp)         # [m^-2 s^-1]
+    lap("coefficients: bulk viscosity")
 
     # Ion Orbit Loss
-    g_ol.setValue(-charge * density * nu_ii * nu_ai * rho_pi)    # [A m^-2]
-    radical_ol = numerix.sqrt(nu_ai + (Z)**4 + ((x) / w_bi)**4)
+    if 'g_ol' in computed:
+        g_ol.setValue(-charge * density * nu_ii * nu_ai
+                      * rho_pi)                                  # [A m^-2]
+    if 'Gamma_ol' in computed:
+        radical_ol = numerix.sqrt(nu_ai + (Z)**4 + (x / w_bi)**4)
+        Gamma_ol.setValue(g_ol * numerix.exp(-radical_ol)
+                          / (charge * radical_ol))               # [m^-2 s^-1]
+    lap("coefficients: orbit loss")
+
+
+# ----------------- Fused Coefficient Kernel --------------
+# The same coefficients as calculate_coeffs(), but computed in one pass over
+# the raw numpy arrays of the state variables. Every result is written into
+# a preallocated buffer, and the common subexpressions (sqrt(T), T**1.5, the
+# logarithmic gradients) are only evaluated once per call.
+def fused_buffer(model, name, shape, dtype=float):
+    """
+        Returns the preallocated buffer for 'name' of the model, (re)allocating
+        it only if it does not exist yet or the size of the mesh has changed.
+    """
+    buffer = model.fused_buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = numpy.empty(shape, dtype=dtype)
+        model.fused_buffers[name] = buffer
+    return buffer
+
+
+# ASSUMES density is in m^-3 and temperature is in eV
+def calculate_coeffs_fused(model):
+    config = model.config
+    density, temperature = model.density, model.temperature
+    n = numpy.asarray(density.value)
+    T = numpy.asarray(temperature.value)
+    Z_val = numpy.asarray(model.Z.value)
+    shape = n.shape
+    computed = model.computed_coefficients
+
+    def buf(name, dtype=float):
+        return fused_buffer(model, name, shape, dtype)
+    lap = lap_timer(model)
+    constants = coefficient_constants(model)
+    x_val = constants['x']
+    lap("coefficients: constants")
+
+    # Shared subexpressions, of the coefficients that are calculated
+    def needed(*names):
+        return any(name in computed for name in names)
+
+    if needed('v_Ti', 'v_Te', 'nu_ei'):
+        sqrt_T = numpy.sqrt(T, out=buf('sqrt_T'))
+    if needed('nu_ei'):
+        T_3_2 = numpy.multiply(T, sqrt_T, out=buf('T_3_2'))      # T**1.5
+    if needed('Gamma_an', 'Gamma_cx', 'Gamma_bulk'):
+        dlog_n = numpy.divide(density.grad.value[0], n,
+                              out=buf('dlog_n'))
+    if needed('Gamma_an', 'Gamma_cx'):
+        dlog_T = numpy.divide(temperature.grad.value[0], T,
+                              out=buf('dlog_T'))
+    work = buf('work')
+    lap("coefficients: shared")
+
+    # Thermal velocities (most probable)
+    if 'v_Ti' in computed:
+        v_i = numpy.multiply(sqrt_T, constants['v_i'],
+                             out=buf('v_Ti'))                    # [m/s]
+    if 'v_Te' in computed:
+        v_e = numpy.multiply(sqrt_T, constants['v_e'],
+                             out=buf('v_Te'))                    # [m/s]
+    lap("coefficients: velocities")
+
+    # Neutrals density
+    if 'n_0' in computed:
+        neutrals = numpy.divide(constants['neutral_profile'], v_i,
+                                out=buf('n_0'))
+        neutrals *= -0.1 * config.Gamma_c                        # [m^-3]
+    lap("coefficients: neutrals")
+
+    # Poloidal gyro-(Larmor) radii
+    if 'rho_pi' in computed:
+        r_i = numpy.multiply(v_i, constants['rho_i'],
+                             out=buf('rho_pi'))                  # [m]
+    if 'rho_pe' in computed:
+        r_e = numpy.multiply(v_e, constants['rho_e'],
+                             out=buf('rho_pe'))                  # [m]
+
+    # Transition and banana orbit bounce frequencies
+    if 'omega_t' in computed:
+        o_t = numpy.multiply(v_i, constants['transit'],
+                             out=buf('omega_t'))
+    if 'omega_bi' in computed:
+        o_bi = numpy.multiply(o_t, constants['sqrt_aspect_3'],
+                              out=buf('omega_bi'))               # [s^-1]
+    if 'omega_be' in computed:
+        o_be = numpy.multiply(v_e, constants['sqrt_aspect_3']
+                              * constants['transit'],
+                              out=buf('omega_be'))               # [s^-1]
+
+    # Banana width
+    if 'w_bi' in computed:
+        w_i = numpy.multiply(r_i, constants['sqrt_aspect'],
+                             out=buf('w_bi'))                    # [m]
+    lap("coefficients: orbits")
+
+    # Collision frequencies and collisionalities
+    if 'nu_ei' in computed:
+        n_ei = numpy.divide(n, T_3_2, out=buf('nu_ei'))
+        n_ei *= 4.2058e-11                                       # [s^-1]
+    if 'nu_ii' in computed:
+        n_ii = numpy.multiply(n_ei, constants['nu_ii'],
+                              out=buf('nu_ii'))                  # [s^-1]
+    if 'nu_ai' in computed:
+        n_ai = numpy.divide(n_ii, o_bi, out=buf('nu_ai'))
+    if 'nu_ae' in computed:
+        numpy.divide(n_ei, o_be, out=buf('nu_ae'))
+    lap("coefficients: collisions")
+
+    # Electron Anomalous Diffusion
+    if 'D_an' in computed:
+        d_an = numpy.multiply(r_e, T, out=buf('D_an'))
+        d_an *= constants['anomalous']
+    if 'g_n_an' in computed:
+        gn_an = numpy.multiply(n, d_an, out=buf('g_n_an'))
+        gn_an *= charge                                          # [A m^-2]
+    if 'g_T_an' in computed:
+        numpy.multiply(gn_an, alpha_an, out=buf('g_T_an'))       # [A m^-2]
+    if 'g_Z_an' in computed:
+        gZ_an = numpy.divide(gn_an, r_i, out=buf('g_Z_an'))      # [A m^-1]
+
+    if 'Gamma_an' in computed:
+        G_an = numpy.multiply(dlog_T, alpha_an, out=buf('Gamma_an'))
+        G_an += dlog_n
+        G_an *= gn_an
+        G_an += numpy.multiply(gZ_an, Z_val, out=work)           # [m^-2 s^-1]
+    lap("coefficients: anomalous")
+
+    # Charge Exchange Friction, Itoh 1989
+    if needed('ionization_rate', 'cx_rate'):
+        T_100 = numpy.multiply(T, 100.0, out=buf('T_100'))
+    if 'ionization_rate' in computed:
+        rate_ion = numpy.power(T_100, -1.0 / 4.0,
+                               out=buf('ionization_rate'))
+        rate_ion *= 5.0e-14                                      # [m^3 s^-1]
+    if 'cx_rate' in computed:
+        rate_cx = numpy.cbrt(T_100, out=buf('cx_rate'))
+        rate_cx *= 1.0e-14                                       # [m^3 s^-1]
+
+    if 'g_n_cx' in computed:
+        gn_cx = numpy.multiply(neutrals, rate_cx, out=buf('g_n_cx'))
+        gn_cx *= n
+        gn_cx *= T
+        gn_cx *= constants['charge_exchange']                    # [A m^-2]
+    if 'g_T_cx' in computed:
+        numpy.multiply(gn_cx, alpha_cx, out=buf('g_T_cx'))       # [A m^-2]
+    if 'g_Z_cx' in computed:
+        gZ_cx = numpy.divide(gn_cx, r_i, out=buf('g_Z_cx'))      # [A m^-1]
+
+    if 'Gamma_cx' in computed:
+        G_cx = numpy.multiply(dlog_T, alpha_cx, out=buf('Gamma_cx'))
+        G_cx += dlog_n
+        G_cx *= gn_cx
+        G_cx += numpy.multiply(gZ_cx, Z_val, out=work)           # [m^-2 s^-1]
+    lap("coefficients: charge exchange")
+
+    # Ion Bulk (Parallel) Viscosity
+    if 'plasma_disp' in computed:
+        if config.plasma_disp == "table":
+            X_disp = dispersion_table(model).evaluate(
+                Z_val, numpy.divide(n_ii, o_t, out=buf('zeta_imag')),
+                out=buf('plasma_disp'))
+        else:
+            zeta_arg = buf('zeta_arg', complex)
+            zeta_arg.real = Z_val
+            numpy.divide(n_ii, o_t, out=zeta_arg.imag)
+            faddeeva = scipy.special.wofz(zeta_arg,
+                                          out=buf('wofz', complex))
+            X_disp = numpy.multiply(faddeeva.real, numpy.sqrt(pi),
+                                    out=buf('plasma_disp'))
+    if 'D_bulk' in computed:
+        d_bulk = numpy.multiply(constants['bulk'], r_i, out=buf('D_bulk'))
+        d_bulk *= T                                              # [m^2 s^-1]
+
+    if 'Gamma_bulk' in computed:
+        G_bulk = numpy.divide(Z_val, r_i, out=buf('Gamma_bulk'))
+        G_bulk += dlog_n
+        G_bulk *= n
+        G_bulk *= d_bulk
+        G_bulk *= X_disp                                         # [m^-2 s^-1]
+    lap("coefficients: bulk viscosity")
+
+    # Ion Orbit Loss
+    if 'g_ol' in computed:
+        g_orbit = numpy.multiply(n, n_ii, out=buf('g_ol'))
+        g_orbit *= n_ai
+        g_orbit *= r_i
+        g_orbit *= -charge                                       # [A m^-2]
+    if 'Gamma_ol' in computed:
+        radical_ol = numpy.divide(x_val, w_i, out=buf('radical_ol'))
+        radical_ol **= 4
+        radical_ol += numpy.power(Z_val, 4, out=work)
+        radical_ol += n_ai
+        numpy.sqrt(radical_ol, out=radical_ol)
+
+        G_ol = numpy.negative(radical_ol, out=buf('Gamma_ol'))
+        numpy.exp(G_ol, out=G_ol)
+        G_ol *= g_orbit
+        G_ol /= charge * radical_ol                              # [m^-2 s^-1]
+    lap("coefficients: orbit loss")
+
+    # Write the results back into the variables of the model; the
+    # intermediate coefficients only stay in their buffers
+    for name in coefficient_names:
+        if name in model.variable_dictionary:
+            model.variable_dictionary[name].setValue(
+                model.fused_buffers[name])
+    lap("coefficients: write back")
+
+
+def compare_coeffs(model):
+    """
+        Evaluates the coefficients with both calculate_coeffs() and
+        calculate_coeffs_fused() on the current state, and returns the
+        largest relative difference of each coefficient as a dictionary.
+        Both need the variables of the coefficients calculate_coeffs()
+        calculates (see declared_coefficients()). It is the check of the
+        fused kernel in tests/test_calculate_coeffs.py.
+    """
+    names = [name for name in coefficient_names
+             if name in model.variable_dictionary]
+    calculate_coeffs(model)
+    reference = dict((name,
+                      numpy.array(model.variable_dictionary[name].value))
+                     for name in names)
+
+    calculate_coeffs_fused(model)
+    differences = {}
+    for name in names:
+        scale = max(numpy.max(numpy.abs(reference[name])),
+                    numpy.finfo(float).tiny)
+        differences[name] = numpy.max(numpy.abs(
+            numpy.asarray(model.variable_dictionary[name].value)
+            - reference[name])) / scale
 
-    Gamma_ol.setValue(g_ol * numerix.exp(-radical_ol)
-                      / (charge * radical_ol))                   # [m^-2 s^-1]
+    return differences
@@ -0,0 +1,135 @@
+"""
+    This file writes and reads the checkpoints of a run, with fipy.tools.dump.
+    A checkpoint holds the values (and old values) of density, temperature,
+    Z and Diffusivity, the step counter, the time, the time step, the core
+    fluxes of the boundary conditions, the convergence records of the steps
+    so far, and the inputs of the configuration.
+
+    A run restarted from a checkpoint continues exactly where it was written,
+    as every step recomputes the Diffusivity and coefficients from the state
+    variables. Its configuration file may differ from the one of the
+    checkpoint, e.g. to branch runs with other parameters off one state (the
+    core fluxes are then those of the configuration, with a note), but the
+    mesh has to be the same, unless the mesh is adapted during the run
+    (remesh_every), in which case the model is remeshed to the checkpoint's.
+    In a parallel run, the checkpoint holds the values on the whole mesh,
+    written by process 0, and is read back by every process for its cells.
+"""
+
+import os
+import time
+import numpy
+from fipy.tools import dump
+
+from src.remeshing import remesh, cell_faces, faces_from_centers
+from src.parallel import processes, is_root, root_decision, local_values
+
+
+# The variables saved in a checkpoint
+checkpoint_variables = ['density', 'temperature', 'Z', 'Diffusivity']
+
+
+def config_inputs(config):
+    """ The inputs of the configuration, without modules and functions. """
+    inputs = {}
+    for name in dir(config):
+        value = getattr(config, name)
+        if (not name.startswith('_') and
+                type(value) in [bool, int, float, str, list, dict,
+                                type(None)]):
+            inputs[name] = value
+    return inputs
+
+
+def write_checkpoint(model, stepper, filename, history=()):
+    """
+        Writes the checkpoint of the model and the time stepping, with the
+        convergence records of the steps so far ('history'). It is written
+        to a temporary file first, so a run killed while writing still
+        leaves the previous checkpoint.
+    """
+    data = {
+        'step': stepper.step,
+        'elapsed': stepper.elapsed,
+        'dt': stepper.dt,
+        'Gamma_c': model.config.Gamma_c,
+        'q_c': model.config.q_c,
+        'x': numpy.array(model.x.globalValue),
+        # Only of use with remeshing, which runs in serial
+        'faces': cell_faces(model.mesh) if processes() == 1 else None,
+        'values': dict((name, numpy.array(
+            model.variable_dictionary[name].globalValue))
+            for name in checkpoint_variables),
+        'old_values': dict((name, numpy.array(
+            model.variable_dictionary[name].old.globalValue))
+            for name in checkpoint_variables),
+        'history': list(history),
+        'config': config_inputs(model.config)
+    }
+
+    dump.write(data, filename + ".tmp")
+    if is_root() and os.path.isfile(filename + ".tmp"):
+        os.replace(filename + ".tmp", filename)
+
+
+def read_checkpoint(filename):
+    return dump.read(filename)
+
+
+def restore_checkpoint(model, stepper, data):
+    """
+        Sets the model and the time stepping to the state of a checkpoint,
+        and returns the convergence records of its steps.
+    """
+    if numpy.shape(data['x']) != numpy.shape(model.x.globalValue) or \
+            not numpy.allclose(data['x'], model.x.globalValue):
+        if model.config.remesh_every == 0:
+            raise ValueError("The mesh of the checkpoint does not match the "
+                             "mesh of the configuration.")
+        faces = data.get('faces')
+        if faces is None:
+            faces = faces_from_centers(data['x'])
+        remesh(model, numpy.diff(faces))
+
+    for name in checkpoint_variables:
+        variable = model.variable_dictionary[name]
+        variable.setValue(local_values(model.mesh, data['values'][name]))
+        variable.old.setValue(local_values(model.mesh,
+                                           data['old_values'][name]))
+    model.cache.clear()
+
+    stepper.restore(data['step'], data['elapsed'], data['dt'])
+
+    # The boundary conditions are those of the configuration
+    for name in ['Gamma_c', 'q_c']:
+        if name in data and not numpy.allclose(data[name],
+                                               getattr(model.config, name)):
+            print("NOTE! The checkpoint was written with " + name + " = "
+                  + str(data[name]) + "; continuing with the "
+                  + "configuration's " + str(getattr(model.config, name))
+                  + ".")
+
+    # Checkpoints of older runs have no records
+    return list(data.get('history', []))
+
+
+class CheckpointSchedule(object):
+    """
+        Decides when to write a checkpoint: every 'every' steps, and/or every
+        'wall_time' seconds of wall-clock time. Zero turns either one off.
+    """
+    def __init__(self, every, wall_time):
+        self.every = every
+        self.wall_time = wall_time
+        self.last_time = time.time()
+
+    def due(self, step):
+        if self.every > 0 and step % self.every == 0:
+            return True
+        if (self.wall_time > 0.0 and root_decision(
+                time.time() - self.last_time >= self.wall_time)):
+            return True
+        return False
+
+    def written(self):
+        self.last_time = time.time()
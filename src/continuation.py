@@ -0,0 +1,371 @@
+"""
+    This file follows the steady states of a model while one of the core
+    fluxes (Gamma_c or q_c) changes, to map the bifurcation of Z and the
+    hysteresis of the L--H transition. Every point is solved for starting
+    from the steady state of the previous one, instead of from the initial
+    conditions, so it takes a few Newton iterations instead of a whole run.
+    Two methods:
+
+      'natural'    Natural-parameter continuation: the flux is stepped, and
+                   the steady state at the new value is solved for directly
+                   (Newton's method without the transient terms, see
+                   src/steady_state.py). The step is cut when the solve
+                   fails; below min_step, the branch has ended at a turning
+                   point, and the model jumps to the other branch with a
+                   full steady-state run (pseudo-transient continuation,
+                   then real time stepping). Only the stable branches are
+                   found.
+      'arclength'  Pseudo-arclength continuation: the flux is an unknown as
+                   well, and every point lies a distance ds along the curve
+                   from the last one, in the direction of the secant of the
+                   last two points. This goes around the turning points, and
+                   follows the unstable middle branch of the S-curve too.
+
+    The distances along the curve are measured in units of the parameter,
+    with the profiles scaled by their size (the root mean square of the
+    relative changes), and the step grows after an easy solve.
+
+    A turning point is where the parameter passes through an extremum along
+    the curve. In natural-parameter continuation it is the last point before
+    the jump; in pseudo-arclength continuation it is where the parameter
+    component of the secant changes sign, and its position is estimated from
+    a parabola through the three points around it.
+"""
+
+import math
+import numpy
+import scipy.optimize
+from scipy.sparse.linalg import LinearOperator
+
+from src.newton import NewtonIteration, NewtonDiverged, PicardPreconditioner
+from src.steady_state import SteadyStepper, steady_dt
+from src.time_stepping import solve_time_step, restore_old
+
+
+# Factors the continuation step grows and is cut by
+step_grow = 1.5
+step_shrink = 0.5
+
+# A point is easy if it took at most this many Newton iterations
+easy_iterations = 4
+
+# The failures of scipy's newton_krylov
+newton_failures = (NewtonDiverged, ValueError, ArithmeticError,
+                   numpy.linalg.LinAlgError, RuntimeError,
+                   scipy.optimize.NoConvergence)
+
+
+def set_parameter(model, name, value, derived=None):
+    """
+        Sets the core flux 'name' (Gamma_c or q_c) of the model to value,
+        with the inputs derived from it (e.g. {'q_c': lambda Gamma_c: 5.0 *
+        Gamma_c}, as functions of the parameter), and the boundary
+        conditions.
+    """
+    config = model.config
+    setattr(config, name, value)
+    for derived_name, function in (derived or {}).items():
+        setattr(config, derived_name, function(value))
+    model.set_boundary_values(config.Gamma_c, config.q_c)
+
+
+def steady_solve(model, iterate):
+    """
+        Runs the model to its steady state with a SteadyStepper (a direct
+        solve, then pseudo-transient continuation, then real time stepping).
+        Returns the stepper, and the iterations of all of its steps. A failed
+        step raises a TimeStepError.
+    """
+    stepper = SteadyStepper(model.config, model)
+    iterations = 0
+    while stepper.running():
+        model.update_old()
+        model.update_diffusivity()
+        model.update_coeffs()
+        iterations += solve_time_step(
+            model.full_equation, model.state_variables(), stepper,
+            model.solver, model.config, iterate)['sweeps']
+    return stepper, iterations
+
+
+class BorderedPreconditioner(LinearOperator):
+    """
+        Preconditions the extended system of pseudo-arclength continuation:
+        the Picard preconditioner for the profiles, and the identity for the
+        parameter.
+    """
+    def __init__(self, continuation):
+        self.continuation = continuation
+        self.picard = PicardPreconditioner(continuation.newton)
+        super(BorderedPreconditioner, self).__init__(
+            float, (continuation.newton.size + 1,
+                    continuation.newton.size + 1))
+
+    def setup(self, x, f, func):
+        self.update(x, f)
+
+    def update(self, x, f):
+        self.continuation.set_value(x[-1] * self.continuation.parameter_scale)
+        self.picard.update(x[:-1], f[:-1])
+
+    def _matvec(self, vector):
+        vector = numpy.ravel(vector)
+        return numpy.append(self.picard._matvec(vector[:-1]), vector[-1])
+
+
+class Continuation(object):
+    """
+        Follows the steady states of the model from start towards stop (the
+        values of the core flux 'parameter'), with the method 'natural' or
+        'arclength'. The points of the curve are in 'points', and the
+        turning points in 'turning_points'.
+    """
+    def __init__(self, model, parameter, derived=None, method='arclength',
+                 min_step=None, max_step=None, max_points=500):
+        self.model = model
+        self.config = model.config
+        self.parameter = parameter
+        self.derived = derived
+        self.method = method
+        self.min_step = min_step
+        self.max_step = max_step
+        self.max_points = max_points
+
+        self.newton = NewtonIteration(model)
+        self.newton.dt, self.newton.solver = steady_dt, model.solver
+        self.parameter_scale = 1.0
+        self.points = []
+        self.turning_points = []
+        self.states = []            # The profiles of every point
+        self.iterations = 0         # Newton iterations of all points
+
+    def value(self):
+        return getattr(self.config, self.parameter)
+
+    def set_value(self, value):
+        set_parameter(self.model, self.parameter, value, self.derived)
+
+    def record(self, iterations, kind):
+        """ Adds the current steady state to the curve. """
+        model = self.model
+        self.iterations += iterations
+        self.states.append(self.newton.state())
+        self.points.append({
+            'point': len(self.points),
+            self.parameter: float(self.value()),
+            'Z_edge': float(model.Z.value[0]),
+            'pedestal_density': float(model.density.value[-1]),
+            'pedestal_temperature': float(model.temperature.value[-1]),
+            'iterations': iterations,
+            'kind': kind,
+            'branch': len(self.turning_points)
+        })
+        print("Point {point}: {name} = {value:.6e}, Z_edge = {Z_edge:.6e}, "
+              "iterations = {iterations} ({kind})".format(
+                  name=self.parameter, value=self.points[-1][self.parameter],
+                  **self.points[-1]))
+
+    def in_range(self, value, start, stop):
+        return min(start, stop) <= value <= max(start, stop)
+
+    def run(self, start, stop, step):
+        """
+            Solves for the steady state at start (from the initial
+            conditions), and follows it towards stop in steps of 'step'.
+        """
+        self.parameter_scale = max(abs(start), abs(stop))
+        if self.min_step is None:
+            self.min_step = 1.0e-3 * abs(step)
+        if self.max_step is None:
+            self.max_step = 10.0 * abs(step)
+
+        self.set_value(start)
+        stepper, iterations = steady_solve(self.model, self.newton)
+        if not stepper.steady():
+            raise RuntimeError("No steady state was found at the start, "
+                               + self.parameter + " = " + str(start))
+        self.record(iterations, 'start')
+
+        if self.method == 'natural':
+            self.run_natural(start, stop, step)
+        else:
+            self.run_arclength(start, stop, step)
+
+    # ----------------- Natural-parameter continuation ------------------
+    def correct_natural(self, value):
+        """
+            Solves for the steady state at value, starting from the secant
+            through the last two points of the branch (or the current point).
+            Goes back to the current point if that fails.
+        """
+        model, previous = self.model, self.value()
+        model.update_old()
+        self.set_value(value)
+        if (len(self.points) > 1 and
+                self.points[-2]['branch'] == self.points[-1]['branch']):
+            self.newton.set_state(
+                self.states[-1] + (self.states[-1] - self.states[-2])
+                * (value - previous) / (previous
+                                        - self.points[-2][self.parameter]))
+        status, iterations, _ = self.newton(
+            model.full_equation, steady_dt, model.solver, self.config)
+
+        if status != 'converged':
+            restore_old(*model.state_variables())
+            self.set_value(previous)
+        return status == 'converged', iterations
+
+    def run_natural(self, start, stop, step):
+        direction = math.copysign(1.0, stop - start)
+        ds = abs(step)
+        while (len(self.points) < self.max_points and
+               (stop - self.value()) * direction > 1.0e-12 * abs(stop)):
+            value = self.value() + direction * ds
+            if not self.in_range(value, start, stop):
+                value = stop
+
+            converged, iterations = self.correct_natural(value)
+            if converged:
+                self.record(iterations, 'step')
+                if iterations <= easy_iterations:
+                    ds = min(ds * step_grow, self.max_step)
+                continue
+
+            ds *= step_shrink
+            print("No steady state found at " + self.parameter + " = "
+                  + str(value) + "; the step is cut to " + str(ds))
+            if ds >= self.min_step:
+                continue
+
+            # The branch ends here: jump to the other one
+            self.turning_points.append({
+                'point': self.points[-1]['point'],
+                self.parameter: self.points[-1][self.parameter],
+                'Z_edge': self.points[-1]['Z_edge']})
+            print("Turning point at " + self.parameter + " = "
+                  + str(self.value()) + "; jumping to the other branch")
+            value = self.value() + direction * abs(step)
+            if not self.in_range(value, start, stop):
+                value = stop
+            self.set_value(value)
+            stepper, iterations = steady_solve(self.model, self.newton)
+            if not stepper.steady():
+                raise RuntimeError("No steady state was found after the "
+                                   "turning point, at " + self.parameter
+                                   + " = " + str(value))
+            self.record(iterations, 'jump')
+            ds = abs(step)
+
+    # ----------------- Pseudo-arclength continuation -------------------
+    def scaled_point(self, number):
+        """ Point 'number' as scaled unknowns of the extended system. """
+        return numpy.append(self.states[number] / self.newton.scale,
+                            self.points[number][self.parameter]
+                            / self.parameter_scale)
+
+    def inner(self, a, b):
+        """ The inner product of the distances along the curve. """
+        return numpy.dot(a[:-1], b[:-1]) / (len(a) - 1) + a[-1] * b[-1]
+
+    def secant(self, first, second):
+        """ The unit direction from point first to point second. """
+        direction = self.scaled_point(second) - self.scaled_point(first)
+        return direction / math.sqrt(self.inner(direction, direction))
+
+    def extended_residual(self, w):
+        """
+            The residual of the steady state at the scaled profiles and
+            parameter w, with the distance from the last point along the
+            tangent.
+        """
+        self.set_value(w[-1] * self.parameter_scale)
+        residual = self.newton.scaled_residual(w[:-1])
+        return numpy.append(residual, self.inner(
+            self.tangent, w - self.last_point) - self.ds)
+
+    def correct_arclength(self, tangent, ds):
+        """
+            Solves for the point at the distance ds along the tangent from
+            the last point. Goes back to the last point if that fails.
+        """
+        newton, config = self.newton, self.config
+        self.set_value(self.points[-1][self.parameter])
+        newton.set_scales(self.states[-1])
+        self.tangent, self.ds = tangent, ds
+        self.last_point = self.scaled_point(-1)
+
+        iterations = []
+        try:
+            w = scipy.optimize.newton_krylov(
+                self.extended_residual, self.last_point + ds * tangent,
+                method='lgmres', inner_M=BorderedPreconditioner(self),
+                f_tol=config.newton_tol, maxiter=config.max_sweeps,
+                line_search='armijo',
+                callback=lambda x, f: iterations.append(x))
+        except newton_failures:
+            self.set_value(self.points[-1][self.parameter])
+            newton.set_state(self.states[-1])
+            return False, len(iterations)
+
+        # Leave the variables and coefficients at the solution
+        self.extended_residual(w)
+        return True, max(len(iterations), 1)
+
+    def locate_turning_point(self):
+        """
+            Estimates the turning point between the last three points from a
+            parabola of the parameter (and Z_edge) along the curve.
+        """
+        points = self.points[-3:]
+        lengths = numpy.cumsum([0.0] + [
+            math.sqrt(self.inner(*(2 * [self.scaled_point(number)
+                                        - self.scaled_point(number - 1)])))
+            for number in [-2, -1]])
+        parameter = numpy.polyfit(lengths, [point[self.parameter]
+                                            for point in points], 2)
+        Z_edge = numpy.polyfit(lengths, [point['Z_edge']
+                                         for point in points], 2)
+
+        length = lengths[1]
+        if parameter[0] != 0.0:
+            length = min(max(-parameter[1] / (2.0 * parameter[0]),
+                             lengths[0]), lengths[-1])
+        self.turning_points.append({
+            'point': points[1]['point'],
+            self.parameter: float(numpy.polyval(parameter, length)),
+            'Z_edge': float(numpy.polyval(Z_edge, length))})
+        print("Turning point at " + self.parameter + " = "
+              + str(self.turning_points[-1][self.parameter]))
+
+    def run_arclength(self, start, stop, step):
+        ds = abs(step) / self.parameter_scale
+        min_step = self.min_step / self.parameter_scale
+        max_step = self.max_step / self.parameter_scale
+
+        # The first step only changes the parameter
+        tangent = numpy.zeros(self.newton.size + 1)
+        tangent[-1] = math.copysign(1.0, stop - start)
+
+        while (len(self.points) < self.max_points and
+               self.in_range(self.value(), start, stop)):
+            converged, iterations = self.correct_arclength(tangent, ds)
+            if not converged:
+                ds *= step_shrink
+                print("The step along the curve is cut to "
+                      + str(ds * self.parameter_scale))
+                if ds < min_step:
+                    raise RuntimeError(
+                        "The continuation failed after " + self.parameter
+                        + " = " + str(self.value()))
+                continue
+
+            self.record(iterations, 'step')
+            previous_tangent = tangent
+            tangent = self.secant(-2, -1)
+            if (len(self.points) > 2 and
+                    tangent[-1] * previous_tangent[-1] < 0.0):
+                self.locate_turning_point()
+                self.points[-1]['branch'] = len(self.turning_points)
+
+            if iterations <= easy_iterations:
+                ds = min(ds * step_grow, max_step)
@@ -0,0 +1,531 @@
+"""
+    This file runs an ensemble: K copies of one model, its members, which
+    only differ in the parameters of member_parameters (e.g. the points of a
+    scan over Gamma_c or shear_a1), solved together as one system. Every
+    member is a row of a 2D mesh of nx by K cells, whose diffusion terms
+    only act through the faces along x (see set_equations()), so the rows do
+    not interact: the matrix of the coupled system is block-diagonal, and
+    every member evolves as its own run would. The coefficients, the
+    assembly of the equations and the linear solve are done once per sweep
+    for all of the members, so the Python overhead of a run is only paid
+    once, and K runs cost about as much as one run with K * nx cells.
+
+      parameters   The member parameters are arrays over the cells in the
+                   configuration of the model, with the value of every member
+                   on its row (and over the faces, in the boundary
+                   conditions). All other inputs are shared, and have to be
+                   the same in the configurations of all members.
+      time steps   Every member has its own TimeStepper: the transient terms
+                   are divided by the time step of each member (inverse_dt),
+                   and the system is swept with dt = 1. A member whose step
+                   fails is rolled back and retried with a smaller time step,
+                   while the others keep their result, and a member that
+                   fails with the smallest time step is frozen as failed, so
+                   one member does not hold up or change the others.
+      sweeps       Every Picard sweep gives the residual of every member. A
+                   member whose residual is below res_tol (or that diverged
+                   or stalled) is kept at its values for the rest of the step:
+                   its rows are still solved, but the result is discarded, so
+                   it takes as many sweeps as in its own run. With
+                   nonlinear_solver = "newton", the Newton iteration solves
+                   all of the members at once, with the unknowns scaled per
+                   member.
+      stopping     A member that completed its time steps, or meets one of
+                   the stopping criteria of stopping.py, is frozen as well,
+                   and the run ends when no member is left.
+
+    The steady-state mode and the remeshing are not supported, as they would
+    change the equations or the mesh of every member on its own. Nothing is
+    plotted or saved during the run: run_ensemble() returns the summary of
+    every member, and write_profiles() writes its final profiles. E.g.
+
+        configs = [load_config("flux_config.py") for Gamma_c in scan]
+        for config, Gamma_c in zip(configs, scan):
+            config.Gamma_c, config.q_c = Gamma_c, 5.0e2 * Gamma_c
+        summaries = run_ensemble(build_ensemble(configs))
+
+    parameter_sweep.py runs its points as ensembles with --ensemble K.
+"""
+
+import time
+import types
+import numpy
+from numpy.linalg import LinAlgError
+from fipy import Grid2D, CellVariable, FaceVariable
+
+from src.input_handling import check_config
+from src.model import Model
+from src.variable_decl import declare_variables, graded_spacing
+from src.boundary_init_cond import set_initial_conditions
+from src.equations import set_equations
+from src.solvers import make_solver
+from src.newton import NewtonIteration
+from src.time_stepping import TimeStepper, TimeStepError
+from src.checkpoint import checkpoint_variables, read_checkpoint
+from src.parallel import processes
+
+
+# The inputs in which the members may differ: the boundary fluxes and the
+# parameters of the diffusivity models
+member_parameters = ['Gamma_c', 'q_c', 'alpha_sup', 'beta', 'shear_a1',
+                     'shear_a2', 'shear_a3']
+
+
+def shared_inputs(config):
+    """ The inputs of a configuration (module) that all members share. """
+    return dict((name, value) for name, value in vars(config).items()
+                if not name.startswith('_') and name not in member_parameters
+                and not isinstance(value, types.ModuleType)
+                and not callable(value))
+
+
+def differ(value, other):
+    try:
+        return not bool(numpy.all(value == other))
+    except ValueError:
+        return True
+
+
+class Ensemble(object):
+    """
+        The members of an ensemble, as the rows of one model (self.model),
+        with the time stepping of every member, whether it still runs
+        (active), and otherwise why it stopped.
+    """
+    def __init__(self, configs):
+        if processes() > 1:
+            raise ValueError("An ensemble only runs in serial; run the "
+                             "points of a parallel sweep one at a time.")
+        for config in configs:
+            check_config(config)
+        shared = shared_inputs(configs[0])
+        for number, config in enumerate(configs[1:], 1):
+            inputs = shared_inputs(config)
+            for name in sorted(set(shared) | set(inputs)):
+                if differ(shared.get(name), inputs.get(name)):
+                    raise ValueError(
+                        "The members of an ensemble may only differ in "
+                        + ", ".join(member_parameters) + "; member "
+                        + str(number) + " has another " + name + ".")
+
+        config = types.SimpleNamespace(**shared)
+        if config.steady_state is True or config.remesh_every > 0:
+            raise ValueError("An ensemble cannot be run in the steady-state "
+                             "mode, nor with remeshing.")
+
+        self.members = len(configs)
+        self.nx = config.nx
+        self.values = dict((name, numpy.array(
+            [getattr(member, name) for member in configs], dtype=float))
+            for name in member_parameters)
+        for name in member_parameters:
+            setattr(config, name, self.cell_values(self.values[name]))
+
+        self.steppers = [TimeStepper(config) for member in configs]
+        self.active = numpy.ones(self.members, dtype=bool)
+        self.stop_reasons = [None] * self.members
+        self.failures = [None] * self.members
+
+        self.model = model = Model(config)
+        model.ensemble = self
+        declare_variables(model, self.mesh(model))
+        self.x_faces = FaceVariable(mesh=model.mesh, value=(numpy.abs(
+            numpy.array(model.mesh.faceNormals[0])) > 0.5).astype(float))
+        self.inverse_dt = CellVariable(mesh=model.mesh, value=1.0)
+
+        set_initial_conditions(model)
+        model.set_boundary_values(self.face_values('Gamma_c'),
+                                  self.face_values('q_c'))
+        model.update_coeffs()
+        model.full_equation = set_equations(model)
+        model.solver = make_solver(config, len(model.state_variables()))
+
+    def mesh(self, model):
+        """ The mesh of nx cells along x (as of one member) by K rows. """
+        config = model.config
+        if config.mesh_grading == "tanh":
+            center, width = config.pedestal_location, config.pedestal_width
+            if center is None:
+                center = model.pedestal_location
+            if width is None:
+                width = model.pedestal_width
+            return Grid2D(dx=graded_spacing(
+                config.nx, model.L, center, width, config.mesh_ratio,
+                config.refine_edge), dy=1.0, ny=self.members)
+        return Grid2D(nx=config.nx, ny=self.members, dx=model.L / config.nx,
+                      dy=1.0)
+
+    def cell_values(self, values):
+        """ The values of the members on the cells of their rows. """
+        return numpy.repeat(values, self.nx)
+
+    def face_values(self, name):
+        """
+            The values of the member parameter on the faces of the rows; the
+            faces between two rows (where nothing diffuses) get either one.
+        """
+        rows = numpy.clip(numpy.floor(numpy.array(
+            self.model.mesh.faceCenters[1])).astype(int), 0,
+            self.members - 1)
+        return self.values[name][rows]
+
+    def rows(self, variable):
+        """ The values of a variable as an array of K rows of nx cells. """
+        return numpy.array(variable.value).reshape(self.members, self.nx)
+
+    def state(self):
+        """ The values of the state variables, by variable and member. """
+        return numpy.array([self.rows(variable)
+                            for variable in self.model.state_variables()])
+
+    def pin(self, members, state):
+        """ Sets the state variables of the members to the given state. """
+        if not numpy.any(members):
+            return
+        cells = self.cell_values(members)
+        for variable, values in zip(self.model.state_variables(), state):
+            variable.setValue(numpy.where(cells, values.ravel(),
+                                          numpy.array(variable.value)))
+
+    def stop(self, members, reason, failure=None):
+        """ Freezes the active ones of the members, stopped for 'reason'. """
+        for member in numpy.flatnonzero(members & self.active):
+            self.active[member] = False
+            self.stop_reasons[member] = reason
+            self.failures[member] = failure
+
+    def restore(self, data):
+        """ Starts all members from the state of a checkpoint of one run. """
+        x = self.rows(self.model.x)[0]
+        if numpy.shape(data['x']) != numpy.shape(x) or \
+                not numpy.allclose(data['x'], x):
+            raise ValueError("The mesh of the checkpoint does not match the "
+                             "mesh of the members.")
+
+        for name in checkpoint_variables:
+            variable = self.model.variable_dictionary[name]
+            variable.setValue(numpy.tile(data['values'][name], self.members))
+            variable.old.setValue(numpy.tile(data['old_values'][name],
+                                             self.members))
+        self.model.cache.clear()
+
+        for stepper in self.steppers:
+            stepper.restore(data['step'], data['elapsed'], data['dt'])
+
+
+def build_ensemble(configs):
+    """
+        Builds the ensemble of the configurations, one member each, which may
+        only differ in member_parameters.
+    """
+    return Ensemble(configs)
+
+
+# ----------------- Nonlinear Iterations ------------------
+# Both are called with the members that take a step ('pending'), at the
+# time steps in ensemble.inverse_dt, and return the status of every member
+# ('converged', the reason it failed, or 'pending' if it has to take the
+# same step again), its number of sweeps and its final residual. The
+# members that did not converge are left at the start of the step.
+class EnsembleSweeps(object):
+    """
+        The Picard sweeps of sweep_to_tolerance(), with its criteria applied
+        to the residual of every member.
+    """
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        self.fields = len(ensemble.model.state_variables())
+
+    def member_residuals(self, var, matrix, RHSvector):
+        """ The L2 norms of the residual vector of every member. """
+        residual = matrix * numpy.array(var).flatten() - RHSvector
+        return numpy.sqrt(numpy.sum(residual.reshape(
+            self.fields, self.ensemble.members, -1)**2, axis=(0, 2)))
+
+    def __call__(self, equation, pending, solver, config):
+        ensemble = self.ensemble
+        members = ensemble.members
+        converged = numpy.zeros(members, dtype=bool)
+        status = numpy.array(['pending'] * members, dtype=object)
+        sweeps = numpy.zeros(members, dtype=int)
+        residual = numpy.zeros(members)
+
+        done = ~pending
+        pinned = ensemble.state()
+        residuals = []
+        while not numpy.all(done):
+            running = ~done
+            if len(residuals) >= config.max_sweeps:
+                status[running] = 'max_sweeps'
+                break
+
+            # E.g. an ILU preconditioner of a (nearly) singular matrix
+            try:
+                residuals.append(equation.sweep(
+                    dt=1.0, solver=solver, residualFn=self.member_residuals))
+            except (RuntimeError, ArithmeticError, LinAlgError):
+                status[running] = 'solver_failed'
+                sweeps[running] += 1
+                residual[running] = numpy.inf
+                break
+            history = numpy.array(residuals)
+            current = history[-1]
+            sweeps[running] += 1
+            residual[running] = current[running]
+
+            if config.verbose_sweeps is True:
+                print("Sweep {}: largest residual = {:.6e}".format(
+                    len(residuals), numpy.max(current[running])))
+
+            # Divergence: a residual that is not finite, or has grown too much
+            diverged = running & (~numpy.isfinite(current) | (
+                current > config.divergence_factor * numpy.min(history,
+                                                               axis=0)))
+            status[diverged] = 'diverged'
+
+            # Stagnation: the last sweeps did not reduce the residual enough
+            stalled = numpy.zeros(members, dtype=bool)
+            if len(residuals) > config.stall_sweeps:
+                stalled = running & ~diverged & (current > config.res_tol) & (
+                    numpy.min(history[-config.stall_sweeps:], axis=0)
+                    > config.stall_factor
+                    * numpy.min(history[:-config.stall_sweeps], axis=0))
+            status[stalled] = 'stalled'
+
+            # The members that converged keep the values of this sweep, the
+            # ones that failed the values they started with
+            reached = running & ~diverged & ~stalled \
+                & (current <= config.res_tol)
+            pinned[:, reached] = ensemble.state()[:, reached]
+            status[reached] = 'converged'
+            converged |= reached
+            done |= reached | diverged | stalled
+            ensemble.pin(done, pinned)
+
+        ensemble.pin(pending & ~converged, pinned)
+        return status, sweeps, residual
+
+
+class EnsembleNewton(NewtonIteration):
+    """
+        The Newton iteration of all pending members at once, with the
+        unknowns scaled by the size of each field in every member. The other
+        members are kept at their values, with a zero residual. If it fails,
+        all of them start again, and the ones whose residual is still
+        above newton_tol failed.
+    """
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        super(EnsembleNewton, self).__init__(ensemble.model)
+
+    def members(self, vector):
+        """ The vector as an array by field, member and cell. """
+        return vector.reshape(len(self.variables), self.ensemble.members, -1)
+
+    def unknowns(self, members):
+        """ The mask of the unknowns of the members. """
+        return numpy.repeat(numpy.tile(members, len(self.variables)),
+                            self.ensemble.nx)
+
+    def set_state(self, u):
+        super(EnsembleNewton, self).set_state(
+            numpy.where(self.frozen, self.start, u))
+
+    def residual(self, u):
+        residual = super(EnsembleNewton, self).residual(u)
+        residual[self.frozen] = 0.0
+        return residual
+
+    def scaled_residual(self, v):
+        self.last_residual = super(EnsembleNewton, self).scaled_residual(v)
+        return self.last_residual
+
+    def set_scales(self, u):
+        scale = numpy.maximum(numpy.max(numpy.abs(self.members(u)), axis=2),
+                              1.0)
+        self.scale = numpy.repeat(scale.ravel(), self.ensemble.nx)
+        self.row_scale = numpy.ones(self.size)
+        self.residual(u)
+        diagonal = numpy.abs(self.matrix().diagonal()) * self.scale
+        diagonal[diagonal == 0.0] = 1.0
+        self.row_scale = 1.0 / diagonal
+
+    def __call__(self, equation, pending, solver, config):
+        members = self.ensemble.members
+        self.frozen = self.unknowns(~pending)
+        self.start = self.state()
+        self.last_residual = None
+
+        result, iterations, largest = super(EnsembleNewton, self).__call__(
+            equation, 1.0, solver, config)
+
+        status = numpy.array(['pending'] * members, dtype=object)
+        status[pending] = 'converged'
+        residual = numpy.zeros(members)
+        if self.last_residual is not None:
+            with numpy.errstate(invalid='ignore'):
+                residual = numpy.max(numpy.abs(self.members(
+                    self.last_residual)), axis=(0, 2))
+
+        if result != 'converged':
+            # The last residual may be of a finite difference, not of an
+            # iterate; the members for which it is too large (or all, if
+            # none) fail, the others take the same step again
+            failed = pending & ~(residual <= config.newton_tol)
+            if not numpy.any(failed):
+                failed = pending
+            status[pending] = 'pending'
+            status[failed] = result
+            self.set_state(self.start)
+
+        return status, numpy.full(members, iterations), residual
+
+
+# ----------------- Time Loop -----------------------------
+def solve_ensemble_step(ensemble, iterate):
+    """
+        Takes the next time step of every active member, with its own time
+        step. The members that fail are rolled back and retried with a
+        smaller time step, while the others keep their result, until every
+        member took its step, or failed with the smallest time step.
+        Returns the time steps taken and the largest number of sweeps.
+    """
+    model = ensemble.model
+    config = model.config
+    pending = ensemble.active.copy()
+    dts = numpy.ones(ensemble.members)
+    most_sweeps = 0
+
+    while numpy.any(pending):
+        for member in numpy.flatnonzero(pending):
+            dts[member] = ensemble.steppers[member].next_dt()
+        ensemble.inverse_dt.setValue(ensemble.cell_values(1.0 / dts))
+
+        status, sweeps, residual = iterate(model.full_equation, pending,
+                                           model.solver, config)
+        most_sweeps = max(most_sweeps, int(numpy.max(sweeps[pending])))
+
+        for member in numpy.flatnonzero(pending):
+            stepper = ensemble.steppers[member]
+            if status[member] == 'converged':
+                stepper.accept(dts[member], sweeps[member])
+                continue
+            if status[member] == 'pending':
+                continue
+
+            print("Member " + str(member) + ": step " + str(stepper.step)
+                  + " " + status[member] + " after " + str(sweeps[member])
+                  + " sweeps with dt = " + str(dts[member]) + "; retrying.")
+            try:
+                stepper.reject()
+            except TimeStepError as error:
+                ensemble.stop(numpy.arange(ensemble.members) == member,
+                              'failed', str(error))
+                print("Member " + str(member) + " failed: " + str(error))
+
+        pending &= (status != 'converged') & ensemble.active
+
+    return dts, most_sweeps
+
+
+def relative_changes(ensemble, dts):
+    """
+        The largest relative change per unit time of the state variables of
+        every member over its last step, of size dts, as in
+        StoppingCriteria.
+    """
+    changes = numpy.zeros(ensemble.members)
+    for variable in ensemble.model.state_variables():
+        value = ensemble.rows(variable)
+        scale = numpy.maximum(numpy.max(numpy.abs(value), axis=1), 1.0e-300)
+        changes = numpy.maximum(changes, numpy.max(numpy.abs(
+            value - ensemble.rows(variable.old)), axis=1) / (scale * dts))
+    return changes
+
+
+def run_ensemble(ensemble, restart=None):
+    """
+        Runs the time loop of all members of the ensemble, until they
+        completed, stopped or failed. If 'restart' is the file name of a
+        checkpoint (of a run of one member), all members continue from its
+        state. Returns the summaries of the members, with the keys of
+        run_summary().
+    """
+    model = ensemble.model
+    config = model.config
+    if restart is not None:
+        ensemble.restore(read_checkpoint(restart))
+        print("Restarted from " + str(restart) + " at step "
+              + str(ensemble.steppers[0].step) + ", time "
+              + str(ensemble.steppers[0].elapsed))
+
+    if config.nonlinear_solver == "newton":
+        iterate = EnsembleNewton(ensemble)
+    else:
+        iterate = EnsembleSweeps(ensemble)
+
+    # The side of stop_Z_edge the edge value of Z of every member starts on
+    Z_side = None
+    if config.stop_Z_edge is not None:
+        Z_side = numpy.sign(ensemble.rows(model.Z)[:, 0] - config.stop_Z_edge)
+
+    # ----------------- Time Loop -------------------------
+    wall_start = time.time()
+    while True:
+        ensemble.stop(numpy.array([not stepper.running() for stepper in
+                                   ensemble.steppers]), 'completed')
+        if not numpy.any(ensemble.active):
+            break
+
+        model.update_old()
+        model.update_diffusivity()
+        model.update_coeffs()
+
+        stepping = ensemble.active.copy()
+        dts, sweeps = solve_ensemble_step(ensemble, iterate)
+        print("Step {}: {} members, dt = {:.3e} to {:.3e}, sweeps = {}"
+              .format(max(ensemble.steppers[member].step for member in
+                          numpy.flatnonzero(stepping)) - 1,
+                      numpy.count_nonzero(stepping), numpy.min(dts[stepping]),
+                      numpy.max(dts[stepping]), sweeps))
+
+        # Stop the members early, e.g. once their profiles stopped changing
+        if config.stop_change_rate > 0.0:
+            ensemble.stop(relative_changes(ensemble, dts)
+                          < config.stop_change_rate, 'steady')
+        if Z_side is not None:
+            ensemble.stop((Z_side != 0.0) & (numpy.sign(
+                ensemble.rows(model.Z)[:, 0] - config.stop_Z_edge)
+                != Z_side), 'Z_threshold')
+        if config.stop_wall_time > 0.0 and \
+                time.time() - wall_start >= config.stop_wall_time:
+            ensemble.stop(ensemble.active.copy(), 'wall_time')
+
+    wall_time = time.time() - wall_start
+    density, temperature, Z = [ensemble.rows(variable) for variable in
+                               model.state_variables()]
+    return [{
+        'converged': ensemble.failures[member] is None,
+        'failure': ensemble.failures[member],
+        'stop_reason': ensemble.stop_reasons[member],
+        'steps': ensemble.steppers[member].step,
+        'time': ensemble.steppers[member].elapsed,
+        'wall_time': wall_time,
+        'pedestal_density': float(density[member, -1]),
+        'pedestal_temperature': float(temperature[member, -1]),
+        'Z_edge': float(Z[member, 0]),
+        'steady_norm': None
+    } for member in range(ensemble.members)]
+
+
+def write_profiles(ensemble, member, filename):
+    """ Writes the final profiles of a member as a TSV file. """
+    model = ensemble.model
+    names = ['x', 'density', 'temperature', 'Z', 'Diffusivity']
+    columns = [ensemble.rows(model.variable_dictionary[name])[member]
+               for name in names]
+    with open(filename, 'w') as profiles_file:
+        profiles_file.write("\t".join(names) + "\n")
+        for row in zip(*columns):
+            profiles_file.write("\t".join(repr(float(value))
+                                          for value in row) + "\n")
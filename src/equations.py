@@ -0,0 +1,68 @@
+"""
+    This file sets the equation system of both models: the density and energy
+    equations, and the Z-equation of either the Taylor-expanded model or the
+    full flux model. The equations are coupled into one system.
+"""
+
+from fipy import TransientTerm, DiffusionTerm, CellVariable
+from src.parameters import mu, zeta, epsilon
+
+
+def set_equations(model):
+    """
+        Declares the equations of the model on its variables, and returns the
+        fully-coupled equation.
+    """
+    density, temperature, Z, Diffusivity = (
+        model.density, model.temperature, model.Z, model.Diffusivity)
+
+    # The members of an ensemble (see ensemble.py) are the rows of a 2D
+    # mesh, which only diffuse along x, and take time steps of their own
+    ensemble = model.ensemble
+
+    def along_x(coeff):
+        if ensemble is None:
+            return coeff
+        if isinstance(coeff, CellVariable):
+            coeff = coeff.arithmeticFaceValue
+        return coeff * ensemble.x_faces
+
+    def per_time_step(coeff):
+        if ensemble is None:
+            return coeff
+        return coeff * ensemble.inverse_dt
+
+    # ----------------- PDE Declarations ----------------------
+    # Density Equation
+    density.equation = TransientTerm(coeff=per_time_step(1.0), var=density)\
+        == DiffusionTerm(coeff=along_x(Diffusivity), var=density)
+
+    # Energy Equation
+    temperature.equation = TransientTerm(coeff=per_time_step(density),
+                                         var=temperature)\
+        == DiffusionTerm(coeff=along_x(Diffusivity * density / zeta),
+                         var=temperature)\
+        + DiffusionTerm(coeff=along_x(Diffusivity * temperature),
+                        var=density)
+
+    # Z Equation, Taylor-expanded model
+    if model.config.taylor_model is True:
+        G = model.a + model.b * (Z - model.Z_S) + model.c * (Z - model.Z_S)**3
+        S_Z = ((model.c_n * temperature) / density**2) * density.grad[0]\
+            + (model.c_T / density) * temperature.grad[0] + G
+        Z.equation = TransientTerm(coeff=per_time_step(epsilon), var=Z)\
+            == DiffusionTerm(coeff=along_x(mu), var=Z) + S_Z
+
+    # Z Equation, Flux model
+    else:
+        Z.equation = TransientTerm(coeff=per_time_step(density), var=Z) ==\
+            DiffusionTerm(coeff=along_x(mu * density), var=Z)\
+            + (2.0 / model.rho_pi) * (
+            + model.Gamma_an
+            - model.Gamma_bulk
+            - model.Gamma_cx
+            - model.Gamma_ol
+        )
+
+    # Fully-Coupled Equation
+    return density.equation & temperature.equation & Z.equation
@@ -3,9 +3,62 @@
     of inputs are the following:
 
     nx:                int    The number of grid points
+    mesh_grading:      str    'uniform', or 'tanh' for cells clustered at the
+                              pedestal
+    pedestal_location: float  Where the graded cells are smallest; None is
+                              the pedestal of the initial H--mode
+    pedestal_width:    float  Width of the refined region of the graded mesh
+    mesh_ratio:        float  Largest over smallest cell of the graded mesh
+    refine_edge:       bool   Also cluster the graded cells at the edge?
+    remesh_every:      int    Adapt the mesh to the gradients of Z and n
+                              every this many steps; 0 is off
+    remesh_threshold:  float  ... if a cell changes its width by more than
+                              this fraction
     total_timeSteps:   int    The total number of time steps
     timeStep:          float  The overall dt in solving
     res_tol:           float  The tolerance of the residual
+    fused_coeffs:      bool   Use the fused numpy kernel for the coefficients?
+    all_coefficients:  bool   Calculate all coefficients, and not only the
+                              ones the run uses?
+    plasma_disp:       str    'wofz', or 'table' for the faster tabulated
+                              plasma dispersion function
+    plasma_disp_tol:   float  Largest error of the tabulated plasma_disp
+    adaptive_timeStep: bool   Adapt dt to the number of sweeps per step?
+    total_time:        float  The physical end time in adaptive stepping
+    dt_min:            float  Smallest allowed dt in adaptive stepping
+    dt_max:            float  Largest allowed dt in adaptive stepping
+    dt_grow:           float  Factor dt grows by after an easy step
+    dt_shrink:         float  Factor dt is cut by after a failed step
+    steady_state:      bool   Solve for the steady state, instead of marching
+                              total_timeSteps? See src/steady_state.py
+    steady_tol:        float  The steady state is reached below this scaled
+                              residual of the time-independent equations
+    steady_max_steps:  int    Pseudo-transient steps before falling back to
+                              real time stepping
+    stop_change_rate:  float  Stop when the relative change per unit time of
+                              n, T and Z is below this; 0 is off
+    stop_Z_edge:       float  Stop when Z at the edge crosses this value
+                              (e.g. the L--H transition); None is off
+    stop_wall_time:    float  Stop after this many seconds; 0 is off
+    grow_sweeps:       int    A step is easy if it takes at most this many
+                              sweeps
+    max_sweeps:        int    A step fails if it takes more sweeps than this
+    divergence_factor: float  A step fails if the residual grows by more than
+                              this factor over the smallest residual
+    stall_sweeps:      int    Number of sweeps that must reduce the residual
+    stall_factor:      float  ... below this fraction of the smallest residual
+                              before them; otherwise the step fails
+    verbose_sweeps:    bool   Print the residual of every sweep?
+    nonlinear_solver:  str    'picard' sweeps, or 'newton' (JFNK) with the
+                              Diffusivity and coefficients fully implicit
+    newton_tol:        float  Tolerance of the scaled Newton residual
+    solver:            str    The linear solver: 'banded' (direct, 1D), 'lu',
+                              or the iterative 'gmres', 'pcg', 'bicgstab',
+                              'cgs'
+    preconditioner:    str    Of the iterative solvers: 'ilu' (default),
+                              'jacobi', 'block_jacobi' or None
+    solver_tolerance:  float  The tolerance of the linear solver
+    solver_iterations: int    The iteration cap of the iterative solvers
     Gamma_c:           float  The particle flux from the core
     q_c:               float  The heat flux from the core
     alpha_sup:         float  Suppression coeff in Stap's diffusivity
@@ -21,6 +74,8 @@
     generate_plots     bool   Should the plots be made?
     plot_title:        str    The title of the plot; can be formatted
     ploty_max:         float  The maximum y-value on the plot
+    plot_every:        int    Plot every this many steps; frames are dropped
+                              if the plotting falls behind the time loop
     aux_plots:         bool   Turns on specified auxiliary plots
     aux_vars:          list   List of strings for auxiliary plots
     aux_titles:        list   Title of the aux plots
@@ -30,8 +85,30 @@
                               directory being run.
     save_plots:        bool   Should the plots be saved?
     save_TSVs:         bool   Should TSV files be generated and saves?
-
-    Each possible input also has a default value, if nothing is set.
+    save_output:       bool   Should the binary time series be saved?
+    output_vars:       list   Names of the variables in the time series
+    output_every:      int    Save the time series every this many steps
+    checkpoint_every:  int    Write a checkpoint every this many steps
+    checkpoint_wall:   float  ... and/or every this many seconds; 0 is off
+    summary_file:      str    File to write the summary of the run to, as
+                              JSON; no summary if not set
+    profile:           bool   Time the phases of every step, and report them
+                              at the end of the run?
+    profile_file:      str    File to write the timings to, as JSON; none if
+                              not set
+    batch_mode:        bool   Run without pauses or prompts? Defaults to the
+                              --batch flag or FIPYPEF_BATCH=1
+
+    In a parallel run (mpirun, see src/parallel.py), which is experimental,
+    batch_mode is always on. --petsc or --trilinos must then be given.
+    Newton's method, steady_state and remeshing are then fatal, the 'banded'
+    and 'lu' solvers are replaced by 'gmres' and 'block_jacobi' by 'jacobi'
+    (with PETSc, 'ilu' is applied on the cells of every process), and no
+    plots are made.
+
+    Each possible input also has a default value, if nothing is set. The
+    inputs are checked, and the defaults set, by check_config(config) when a
+    model is built.
 
     NOTE that the auxiliary variables 'aux_vars' is only checked for variable
     type (list of strings) in this file. The validity of the contents is
@@ -39,330 +116,642 @@
 """
 
 import sys
+import os
+import argparse
+import importlib.util
 
+from src.parallel import processes, launched_processes
 
-# Import variables from job configuration file, as cmd line argument
-config = __import__(sys.argv[1].replace('.py', ''))
-config_file = sys.argv[1]
 
 parameter_sets = ["staps", "paquay", "g_grad", "gradient_model"]
 diffusivity_models = ["d_zohm", "zohm", "d_staps", "staps", "d_shear",
                       "d_flow_shear", "d_flow-shear", "flow_shear",
                       "flow-shear", "shear", "d_weymiens_l", "weymiens_l",
                       "weymiens"]
+linear_solvers = ["banded", "lu", "gmres", "pcg", "bicgstab", "cgs"]
+preconditioners = ["ilu", "jacobi", "block_jacobi"]
+
+
+# ----------------- Command Line Arguments ----------------
+def parse_arguments(argv=None):
+    """ Parses the command line of the solving files. """
+    argument_parser = argparse.ArgumentParser(
+        description="Solves the plasma edge model set up by a configuration "
+        "file.")
+    argument_parser.add_argument('config_file', help="The configuration file")
+    argument_parser.add_argument('--batch', action='store_true',
+                                 help="Run without any pauses or prompts; an "
+                                 "invalid configuration is fatal. Also set "
+                                 "by the environment variable "
+                                 "FIPYPEF_BATCH=1.")
+    argument_parser.add_argument('--restart', metavar='CHECKPOINT',
+                                 default=None,
+                                 help="Continue the run from a checkpoint "
+                                 "file")
+    # Read by FiPy itself, when it is imported; with mpirun, one of the
+    # parallel suites must be chosen
+    for suite in ['petsc', 'trilinos', 'scipy']:
+        argument_parser.add_argument('--' + suite, action='store_true',
+                                     help="Solve with the " + suite
+                                     + " solvers of FiPy"
+                                     + (" (parallel, experimental)"
+                                        if suite != 'scipy' else ""))
+    return argument_parser.parse_args(argv)
+
+
+def batch_from_environment():
+    """ Is batch (non-interactive) mode set in the environment? """
+    return os.environ.get('FIPYPEF_BATCH', '0').lower() \
+        not in ['', '0', 'false', 'no']
+
+
+def load_config(config_file):
+    """
+        Imports the job configuration file, given as a path in any directory.
+        The '.py' ending may be left out.
+    """
+    if not config_file.endswith('.py') and not os.path.isfile(config_file):
+        config_file = config_file + '.py'
+
+    config_spec = importlib.util.spec_from_file_location(
+        os.path.splitext(os.path.basename(config_file))[0], config_file)
+    config = importlib.util.module_from_spec(config_spec)
+    config_spec.loader.exec_module(config)
+    return config
+
+
+def pause(message, batch_mode=False):
+    """ Waits for the user to press enter, unless in batch mode. """
+    if batch_mode is False:
+        input(message)
+
+
+# ----------------- Checking of the Inputs ----------------
+def check_config(config):
+    """
+        Checks all of the inputs of the configuration (a module, or any other
+        object with the inputs as attributes), and sets the defaults of the
+        missing or invalid ones.
+    """
+    # Batch (non-interactive) mode
+    if type(getattr(config, 'batch_mode', None)) != bool:
+        config.batch_mode = batch_from_environment()
+    # Nobody can answer a prompt on the other processes of a parallel run
+    if processes() > 1 or launched_processes() > 1:
+        config.batch_mode = True
+
+    def query(message):
+        """
+            Asks for a replacement of an invalid configuration value. In batch
+            mode, the run exits with status 2 instead.
+        """
+        if config.batch_mode is True:
+            print("Invalid configuration in "
+                  + str(getattr(config, '__file__', config)) + ": " + message,
+                  file=sys.stderr)
+            sys.exit(2)
+        return input(message)
+
+    # Z-equation model choice
+    if type(getattr(config, 'taylor_model', None)) != bool:
+        config.taylor_model = True
+        print("Defaulted to using the Taylor-expanded numerical model for Z.")
+
+    # Initial starting mode
+    if type(getattr(config, 'initial_H_mode', None)) != bool:
+        config.initial_H_mode = False
+        print("Defaulted to starting in L--mode.")
+
+    # What initial condition should be used?
+    if type(getattr(config, 'paquay_init_conds', None)) != bool:
+        config.paquay_init_conds = True
+        print("The initial conditions are set to Paquay's form.")
+        pause("BREAK!", config.batch_mode)
+
+    # -------------- Numerical Choices ------------------------
+    # Particle and heat fluxes from the core
+    if (type(getattr(config, 'Gamma_c', None)) != float and
+            type(getattr(config, 'Gamma_c', None)) != int):
+        try:
+            config.Gamma_c = float(query("The particle flux from the core "
+                                         "Gamma_c is not chosen properly. "
+                                         "Choose a floating-point value: "))
+        except (EOFError, NameError, SyntaxError, ValueError) as e:
+            config.Gamma_c = -4.0 / 5.0
+            print("Gamma_c defaulted to -0.8")
+
+    if (type(getattr(config, 'q_c', None)) != float and
+            type(getattr(config, 'q_c', None)) != int):
+        try:
+            config.q_c = float(query("The heat flux from the core q_c is "
+                                     "not chosen properly. Choose a "
+                                     "floating-point value: "))
+        except (EOFError, NameError, SyntaxError, ValueError) as e:
+            config.q_c = config.Gamma_c * 5.0
+            print("q_c defaulted to 5.0 * Gamma_c")
+
+    # Check the choice for numerical parameters
+    if (getattr(config, 'numerical_choice', "").lower() not in
+            parameter_sets or
+            type(getattr(config, 'numerical_choice', None)) != str):
+        config.numerical_choice = "Staps"
+        print("Numerical choice defaulted to Staps' set.")
+
+    # ---------------- Diffusivity Options -------------------
+    # Choice of the diffusivity model
+    if (getattr(config, 'D_choice', "").lower() not in diffusivity_models or
+            type(getattr(config, 'D_choice', None)) != str):
+        try:
+            config.D_choice = query("The diffusivity model is not properly "
+                                    "chosen. Choose from the following: Zohm, "
+                                    "Weymiens_L, Staps, Flow-Shear -> ")
+
+            if str(config.D_choice).lower() not in diffusivity_models:
+                raise IndexError()
+
+        except (IndexError, EOFError):
+            config.D_choice = "d_staps"
+            print("Diffusivity model defaulted to Staps'.")
+
+    # Diffusivity parameters, i.e. coefficients
+    if config.D_choice.lower() == "d_staps":
+        if (type(getattr(config, 'alpha_sup', None)) != int and
+                type(getattr(config, 'alpha_sup', None)) != float):
+            try:
+                config.alpha_sup = float(query("The suppression coefficient "
+                                               "in the diffusivity is not "
+                                               "set. Enter an integer or "
+                                               "float: "))
+
+            except (NameError, SyntaxError, EOFError, ValueError):
+                config.alpha_sup = 0.5
+                print("The suppression coefficient in the diffusivity is "
+                      "defaulted to 0.5")
+
+        if (type(getattr(config, 'beta', None)) != int and
+                type(getattr(config, 'beta', None)) != float):
+            try:
+                config.beta = float(query("The exponent of the electric "
+                                          "field shear is improperly set. "
+                                          "Enter a floating-point number or "
+                                          "integer: "))
+
+            except (NameError, SyntaxError, EOFError, ValueError):
+                config.beta = 2.0
+                print("The exponent of the electric field shear in the "
+                      "diffusivity is defaulted to 2.0.")
+
+    if (config.D_choice.lower() == "d_shear" or
+            config.D_choice.lower() == "d_flow_shear" or
+            config.D_choice.lower() == "shear" or
+            config.D_choice.lower() == "flow_shear" or
+            config.D_choice.lower() == "flow-shear"):
+        if (type(getattr(config, 'shear_a1', None)) != int and
+                type(getattr(config, 'shear_a1', None)) != float and
+                type(getattr(config, 'shear_a2', None)) != int and
+                type(getattr(config, 'shear_a2', None)) != float and
+                type(getattr(config, 'shear_a3', None)) != int and
+                type(getattr(config, 'shear_a3', None)) != float):
+            try:
+                config.shear_a1, config.shear_a2, config.shear_a3 \
+                    = float(query("One of the parameters of the "
+                                  "flow-shear diffusivity model is "
+                                  "improperly set. Enter 3 floating-point "
+                                  "numbers, separated by commas: "
+                                  ).split(","))
+
+            except (NameError, SyntaxError, EOFError, ValueError):
+                config.shear_a1, config.shear_a2, config.shear_a3 \
+                    = 1.0, 0.0, 0.5
+                print("The parameters for the flow-shear diffusivity are "
+                      "defaulted to a1 = 1.0, a2 = 0.0, and a3 = 0.5.")
+
+    # ----------------- Solver-specific Choices ---------------
+    # Grid points
+    if ((type(getattr(config, 'nx', None)) != int and
+            type(getattr(config, 'nx', None)) != float) or
+            getattr(config, 'nx', None) <= 0):
+        try:
+            config.nx = int(query("nx (Grid number) not properly defined. "
+                                  "Enter a positive integer value: "))
+
+            if config.nx <= 0:
+                raise ValueError
+
+            print("nx set to " + str(config.nx))
+
+        except (EOFError, NameError, SyntaxError, ValueError) as e:
+            config.nx = 100
+            print("nx defaulted to 100.")
+
+    if type(config.nx) == float:
+        config.nx = int(config.nx)
+
+    # Graded mesh, with its smallest cells at the pedestal
+    if str(getattr(config, 'mesh_grading', None)).lower() not in ["uniform",
+                                                                  "tanh"]:
+        config.mesh_grading = "uniform"
+    config.mesh_grading = config.mesh_grading.lower()
+
+    # The location and width of the pedestal default to the ones of the
+    # model, see model_parameters()
+    for name in ['pedestal_location', 'pedestal_width']:
+        if ((type(getattr(config, name, None)) != float and
+                type(getattr(config, name, None)) != int) or
+                getattr(config, name, None) <= 0):
+            setattr(config, name, None)
+
+    if ((type(getattr(config, 'mesh_ratio', None)) != float and
+            type(getattr(config, 'mesh_ratio', None)) != int) or
+            getattr(config, 'mesh_ratio', None) < 1):
+        config.mesh_ratio = 10.0
+
+    if type(getattr(config, 'refine_edge', None)) != bool:
+        config.refine_edge = True
+
+    # Remeshing to the steep gradients during the run
+    if (type(getattr(config, 'remesh_every', None)) != int or
+            getattr(config, 'remesh_every', None) < 0):
+        config.remesh_every = 0
+
+    if ((type(getattr(config, 'remesh_threshold', None)) != float and
+            type(getattr(config, 'remesh_threshold', None)) != int) or
+            getattr(config, 'remesh_threshold', None) < 0):
+        config.remesh_threshold = 0.25
+
+    # Domain size        NOW DEPRICATED!
+    # if ((type(getattr(config, 'L', None)) != float and\
+    #         type(getattr(config, 'L', None)) != int) or\
+    #         getattr(config, 'L', None) <= 0.0):
+    #     try:
+    #         config.L = float(input(
+    #             "Length of domain not properly defined.
+    #             Enter floating-point value: "
+    #             ))
+    #
+    #         if config.L <= 0:
+    #             raise NameError
+    #
+    #         print "L set to " + str(config.L)
+    #
+    #     except (NameError, SyntaxError, EOFError, ValueError):
+    #         config.L = 4.0
+    #         print "L defaulted to 4.0"
+    #
+    # if type(config.L) == int:
+    #     config.L = float(config.L)
+
+    # Total number of time steps
+    if ((type(getattr(config, 'total_timeSteps', None)) != int and
+            type(getattr(config, 'total_timeSteps', None)) != float) or
+            getattr(config, 'total_timeSteps', None) <= 0.0):
+        try:
+            config.total_timeSteps = int(query("Total number of time steps "
+                                               "not properly defined. Enter "
+                                               "integer value: "))
 
+            if config.total_timeSteps <= 0:
+                raise ValueError
 
-# Z-equation model choice
-if type(getattr(config, 'taylor_model', None)) != bool:
-    config.taylor_Z_model = True
-    print("Defaulted to using the Taylor-expanded numerical model for Z.")
-
-
-# Initial starting mode
-if type(getattr(config, 'initial_H_mode', None)) != bool:
-    config.initial_H_mode = False
-    print("Defaulted to starting in L--mode.")
-
-
-# What initial condition should be used?
-if type(getattr(config, 'paquay_init_conds', None)) != bool:
-    config.paquay_init_conds = True
-    print("The initial conditions are set to Paquay's form.")
-    input("BREAK!")
-
-
-# -------------- Numerical Choices ------------------------
-# Particle and heat fluxes from the core
-if (type(getattr(config, 'Gamma_c', None)) != float and
-        type(getattr(config, 'Gamma_c', None)) != int):
-    try:
-        config.Gamma_c = int(input("The particle flux from the core Gamma_c "
-                                   "is not chosen properly. Choose a "
-                                   "floating-point value: "))
-    except (EOFError, NameError, SyntaxError) as e:
-        config.Gamma_c = -4.0 / 5.0
-        print("Gamma_c defaulted to -0.8")
-
-if (type(getattr(config, 'q_c', None)) != float and
-        type(getattr(config, 'Gamma_c', None)) != int):
-    try:
-        config.Gamma_c = int(input("The heat flux from the core q_c is not "
-                                   "chosen properly. Choose a floating-point "
-                                   "value: "))
-    except (EOFError, NameError, SyntaxError) as e:
-        config.q_c = config.Gamma_c * 5.0
-        print("q_c defaulted to 5.0 * Gamma_c")
-
-
-# Check the choice for numerical parameters
-if (getattr(config, 'numerical_choice', "").lower() not in parameter_sets or
-        type(getattr(config, 'numerical_choice', None)) != str):
-    config.numerical_choice = "Staps"
-    print("Numerical choice defaulted to Staps' set.")
-
-
-# ---------------- Diffusivity Options -------------------
-# Choice of the diffusivity model
-if (getattr(config, 'D_choice', "").lower() not in diffusivity_models or
-        type(getattr(config, 'D_choice', None)) != str):
-    try:
-        config.D_choice = input("The diffusivity model is not properly "
-                                "chosen. Choose from the following: Zohm, "
-                                "Weymiens_L, Staps, Flow-Shear -> ")
-
-        if str(config.D_choice).lower() not in diffusivity_models:
-            raise IndexError()
-
-    except (IndexError, EOFError):
-        config.D_choice = "d_staps"
-        print("Diffusivity model defaulted to Staps'.")
-
-
-# Diffusivity parameters, i.e. coefficients
-if config.D_choice.lower() == "d_staps":
-    if (type(getattr(config, 'alpha_sup', None)) != int and
-            type(getattr(config, 'alpha_sup', None)) != float):
-        try:
-            config.alpha_sup = float(input("The suppression coefficient in "
-                                           "the diffusivity is not set. Enter "
-                                           "an integer or float: "))
+            print("Total # of time steps set to "
+                  + str(config.total_timeSteps))
 
         except (NameError, SyntaxError, EOFError, ValueError):
-            config.alpha_sup = 0.5
-            print("The suppression coefficient in the diffusivity is "
-                  "defaulted to 0.5")
+            config.total_timeSteps = 100
+            print("Total time steps defaulted to 100.")
+
+    if type(config.total_timeSteps) == float:
+        config.total_timeSteps = int(config.total_timeSteps)
 
-    if (type(getattr(config, 'beta', None)) != int and
-            type(getattr(config, 'beta', None)) != float):
+    # Time step
+    if ((type(getattr(config, 'timeStep', None)) != float and
+            type(getattr(config, 'timeStep', None))) or
+            getattr(config, 'timeStep', None) <= 0.0):
         try:
-            config.beta = float(input("The exponent of the electric field "
-                                      "shear is improperly set. Enter a "
-                                      "floating-point number or integer: "))
+            config.timeStep = float(query("The time step size is not "
+                                          "properly defined. Enter "
+                                          "floating-point value: "))
+
+            if config.timeStep <= 0.0:
+                raise ValueError
+
+            print("The time step size is set to " + str(config.timeStep))
 
         except (NameError, SyntaxError, EOFError, ValueError):
-            config.beta = 2.0
-            print("The exponent of the electric field shear in the "
-                  "diffusivity is defaulted to 2.0.")
-
-
-if (config.D_choice.lower() == "d_shear" or
-        config.D_choice.lower() == "d_flow_shear" or
-        config.D_choice.lower() == "shear" or
-        config.D_choice.lower() == "flow_shear" or
-        config.D_choice.lower() == "flow-shear"):
-    if (type(getattr(config, 'shear_a1', None)) != int and
-            type(getattr(config, 'shear_a1', None)) != float and
-            type(getattr(config, 'shear_a2', None)) != int and
-            type(getattr(config, 'shear_a2', None)) != float and
-            type(getattr(config, 'shear_a3', None)) != int and
-            type(getattr(config, 'shear_a3', None)) != float):
+            if config.taylor_model is True:
+                config.timeStep = 1.0 / 375.0
+                print("The time step is defaulted to 1.0 / 375.0.")
+            elif config.taylor_model is False:
+                config.timeStep = 1.0e-8
+                print("The time step is defaulted to 1.0e-9.")
+
+    if type(config.timeStep) is int:
+        config.timeStep = float(config.timeStep)
+
+    # Residual tolerance
+    if ((type(getattr(config, 'res_tol', None)) != float and
+            type(getattr(config, 'res_tol', None)) != int) or
+            getattr(config, 'res_tol', None) <= 0.0):
         try:
-            config.shear_a1, config.shear_a2, config.shear_a3 \
-                = float(input("One of the parameters of the flow-shear "
-                              "diffusivity model is improperly set. Enter 3 "
-                              "floating-point numbers, separated by commas: "
-                              ).split(","))
+            config.res_tol = float(query("The residual tolerance is not "
+                                         "properly set. Enter a positive "
+                                         "floating-point value: "))
+
+            if config.res_tol <= 0.0:
+                raise ValueError
 
         except (NameError, SyntaxError, EOFError, ValueError):
-            config.shear_a1, config.shear_a2, config.shear_a3 = 1.0, 0.0, 0.5
-            print("The parameters for the flow-shear diffusivity are "
-                  "defaulted to a1 = 1.0, a2 = 0.0, and a3 = 0.5.")
-
-
-# ----------------- Solver-specific Choices ---------------
-# Grid points
-if ((type(getattr(config, 'nx', None)) != int and
-        type(getattr(config, 'nx', None)) != float) or
-        getattr(config, 'nx', None) <= 0):
-    try:
-        config.nx = int(input("nx (Grid number) not properly defined. Enter a "
-                              "positive integer value: "))
-
-        if config.nx <= 0:
-            raise ValueError
-
-        print("nx set to " + str(config.nx))
-
-    except (EOFError, NameError, SyntaxError, ValueError) as e:
-        config.nx = 100
-        print("nx defaulted to 100.")
-
-if type(config.nx) == float:
-    config.nx = int(config.nx)
-
-# Domain size        NOW DEPRICATED!
-# if ((type(getattr(config, 'L', None)) != float and\
-#         type(getattr(config, 'L', None)) != int) or\
-#         getattr(config, 'L', None) <= 0.0):
-#     try:
-#         config.L = float(input(
-#             "Length of domain not properly defined.
-#             Enter floating-point value: "
-#             ))
-#
-#         if config.L <= 0:
-#             raise NameError
-#
-#         print "L set to " + str(config.L)
-#
-#     except (NameError, SyntaxError, EOFError, ValueError):
-#         config.L = 4.0
-#         print "L defaulted to 4.0"
-#
-# if type(config.L) == int:
-#     config.L = float(config.L)
-
-
-# Total number of time steps
-if ((type(getattr(config, 'total_timeSteps', None)) != int and
-        type(getattr(config, 'total_timeSteps', None)) != float) or
-        getattr(config, 'total_timeSteps', None) <= 0.0):
-    try:
-        config.total_timeSteps = int(input("Total number of time steps not "
-                                           "properly defined. Enter integer "
-                                           "value: "))
-
-        if config.total_timeSteps <= 0:
-            raise ValueError
-
-        print("Total # of time steps set to " + str(config.total_timeSteps))
-
-    except (NameError, SyntaxError, EOFError, ValueError):
-        config.total_timeSteps = 100
-        print("Total time steps defaulted to 100.")
-
-if type(config.total_timeSteps) == float:
-    config.total_timeSteps = int(config.total_timeSteps)
-
-
-# Time step
-if ((type(getattr(config, 'timeStep', None)) != float and
-        type(getattr(config, 'timeStep', None))) or
-        getattr(config, 'timeStep', None) <= 0.0):
-    try:
-        config.timeStep = float(input("The time step size is not properly "
-                                      "defined. Enter floating-point value: "))
-
-        if config.timeStep <= 0.0:
-            raise ValueError
-
-        print("The time step size is set to " + str(config.timeStep))
-
-    except (NameError, SyntaxError, EOFError, ValueError):
-        if config.taylor_model is True:
-            config.timeStep = 1.0 / 375.0
-            print("The time step is defaulted to 1.0 / 375.0.")
-        elif config.taylor_model is False:
-            config.timeStep = 1.0e-8
-            print("The time step is defaulted to 1.0e-9.")
-
-if type(config.timeStep) is int:
-    config.timeStep = float(config.timeStep)
-
-
-# Residual tolerance
-if ((type(getattr(config, 'res_tol', None)) != float and
-        type(getattr(config, 'res_tol', None)) != int) or
-        getattr(config, 'res_tol', None) <= 0.0):
-    try:
-        config.res_tol = float(input("The residual tolerance is not properly "
-                                     "set. Enter a positive floating-point "
-                                     "value: "))
-
-        if config.res_tol <= 0.0:
-            raise ValueError
-
-    except (NameError, SyntaxError, EOFError, ValueError):
-        if config.taylor_model is True:
-            config.res_tol = 1.0e-6
-            print("The residual tolerance is defaulted to 1.0e-6.")
-        elif config.taylor_model is False:
-            config.res_tol = 1.0e14
-            print("The residual tolerance is defaulted to 1.0e14.")
-
-if type(config.res_tol) == int:
-    config.res_tol = float(config.res_tol)
-
-
-# ----------------- Plotting and Saving Options -----------
-# Generation of plots
-if type(getattr(config, 'generate_plots', None)) != bool:
-    config.generate_plots = False
-    print("NOTE! The plots are NOT going to be generated.")
-
-
-# Plot title
-if not hasattr(config, 'plot_title'):
-    config.plot_title = ""
-
-
-# Auxiliary plots
-# Check for type
-if (type(getattr(config, 'aux_plots', None)) != bool or
-        type(getattr(config, 'aux_vars', None)) != list):
-    config.aux_plots = False
-    config.aux_vars = []
-
-if config.aux_plots is True:
-    # Create aux_titles, _ymin, and _ymax lists if they don't exist
-    if not hasattr(config, 'aux_titles'):
-        config.aux_titles = []
-    if not hasattr(config, 'aux_ymin'):
-        config.aux_ymin = []
-    if not hasattr(config, 'aux_ymax'):
-        config.aux_ymax = []
-
-    # Forces all variable calls and titles to strings
-    if all(isinstance(i, str) for i in config.aux_vars) is False:
-        for i in range(len(config.aux_vars)):
-            config.aux_vars[i] = str(config.aux_vars[i])
-    if all(isinstance(i, str) for i in config.aux_titles) is False:
-        for i in range(len(config.aux_titles)):
-            config.aux_titles[i] = str(config.aux_titles[i])
-
-    # Make the aux_titles, _ymin, and _ymax lists long enough
-    while len(config.aux_vars) > len(config.aux_titles):
-        config.aux_titles.append(None)
-    while len(config.aux_vars) > len(config.aux_ymin):
-        config.aux_ymin.append(None)
-    while len(config.aux_vars) > len(config.aux_ymax):
-        config.aux_ymax.append(None)
-
-    for j in range(len(config.aux_vars)):
-        if type(config.aux_titles[j]) != str:
-            config.aux_titles[j] = None
-
-        # If the datamins/maxes for aux plots are bad, set them to None
-        if (type(config.aux_ymin[j]) != float and
-                type(config.aux_ymin[j]) != int):
-            config.aux_ymin[j] = None
-        if (type(config.aux_ymax[j]) != float and
-                type(config.aux_ymax[j]) != int):
-            config.aux_ymax[j] = None
-
-
-# Makes sure that the saved directory is a string
-if hasattr(config, 'save_directory'):
-    if config.save_directory != str:
-        config.save_directory = str(config.save_directory)
-
-
-# If saving data is enabled, but not a directory, exit the run.
-if (getattr(config, 'save_directory', None) is None and
-        (getattr(config, 'save_plots', False) is True or
-         getattr(config, 'save_TSVs', False) is True)):
-    sys.exit("No directory specified for saving specified files. Exiting...")
-
-
-# Assumes save_directory exists, but not written correctly as a string
-if hasattr(config, 'save_directory'):
-    if type(config.save_directory) != str:
-        config.save_directory = str(config.save_directory)
-
-# If save_plots and/or TSVs does not exist or not booleans, set to False
-if (not hasattr(config, 'save_plots') or
-        type(getattr(config, 'save_plots', None)) != bool):
-    config.save_plots = False
-if (not hasattr(config, 'save_TSVs') or
-        type(getattr(config, 'save_TSVs', None)) != bool):
-    config.save_TSVs = False
+            if config.taylor_model is True:
+                config.res_tol = 1.0e-6
+                print("The residual tolerance is defaulted to 1.0e-6.")
+            elif config.taylor_model is False:
+                config.res_tol = 1.0e14
+                print("The residual tolerance is defaulted to 1.0e14.")
+
+    if type(config.res_tol) == int:
+        config.res_tol = float(config.res_tol)
+
+    # Fused numpy kernel for the coefficients of the flux model
+    if type(getattr(config, 'fused_coeffs', None)) != bool:
+        config.fused_coeffs = False
+
+    # All of the coefficients, or only the ones the run uses
+    if type(getattr(config, 'all_coefficients', None)) != bool:
+        config.all_coefficients = False
+
+    # The plasma dispersion function of the bulk viscosity
+    if str(getattr(config, 'plasma_disp', None)).lower() not in ["wofz",
+                                                                 "table"]:
+        config.plasma_disp = "wofz"
+    config.plasma_disp = config.plasma_disp.lower()
+
+    if ((type(getattr(config, 'plasma_disp_tol', None)) != float and
+            type(getattr(config, 'plasma_disp_tol', None)) != int) or
+            getattr(config, 'plasma_disp_tol', None) <= 0):
+        config.plasma_disp_tol = 1.0e-10
+
+    # ----------------- Time Stepping -------------------------
+    if type(getattr(config, 'adaptive_timeStep', None)) != bool:
+        config.adaptive_timeStep = False
+
+    # The physical end time defaults to the one of the fixed-step run
+    if ((type(getattr(config, 'total_time', None)) != float and
+            type(getattr(config, 'total_time', None)) != int) or
+            getattr(config, 'total_time', None) <= 0.0):
+        config.total_time = config.total_timeSteps * config.timeStep
+
+    # Bounds of the time step
+    if ((type(getattr(config, 'dt_min', None)) != float and
+            type(getattr(config, 'dt_min', None)) != int) or
+            getattr(config, 'dt_min', None) <= 0.0):
+        config.dt_min = config.timeStep / 1.0e3
+
+    if ((type(getattr(config, 'dt_max', None)) != float and
+            type(getattr(config, 'dt_max', None)) != int) or
+            getattr(config, 'dt_max', None) < config.dt_min):
+        config.dt_max = max(1.0e2 * config.timeStep, config.dt_min)
+
+    # Growth and reduction factors of the time step
+    if ((type(getattr(config, 'dt_grow', None)) != float and
+            type(getattr(config, 'dt_grow', None)) != int) or
+            getattr(config, 'dt_grow', None) < 1.0):
+        config.dt_grow = 1.5
+
+    if ((type(getattr(config, 'dt_shrink', None)) != float and
+            type(getattr(config, 'dt_shrink', None)) != int) or
+            not 0.0 < getattr(config, 'dt_shrink', None) < 1.0):
+        config.dt_shrink = 0.5
+
+    # Steady-state mode
+    if type(getattr(config, 'steady_state', None)) != bool:
+        config.steady_state = False
+
+    if ((type(getattr(config, 'steady_tol', None)) != float and
+            type(getattr(config, 'steady_tol', None)) != int) or
+            getattr(config, 'steady_tol', None) <= 0):
+        config.steady_tol = 1.0e-6
+
+    if (type(getattr(config, 'steady_max_steps', None)) != int or
+            getattr(config, 'steady_max_steps', None) <= 0):
+        config.steady_max_steps = 200
+
+    # Early stopping of the time loop, see src/stopping.py
+    if ((type(getattr(config, 'stop_change_rate', None)) != float and
+            type(getattr(config, 'stop_change_rate', None)) != int) or
+            getattr(config, 'stop_change_rate', None) < 0):
+        config.stop_change_rate = 0.0
+
+    if (type(getattr(config, 'stop_Z_edge', None)) != float and
+            type(getattr(config, 'stop_Z_edge', None)) != int):
+        config.stop_Z_edge = None
+
+    if ((type(getattr(config, 'stop_wall_time', None)) != float and
+            type(getattr(config, 'stop_wall_time', None)) != int) or
+            getattr(config, 'stop_wall_time', None) < 0):
+        config.stop_wall_time = 0.0
+
+    # Sweep counts that decide whether dt grows, or the step is retried
+    if (type(getattr(config, 'max_sweeps', None)) != int or
+            getattr(config, 'max_sweeps', None) <= 0):
+        config.max_sweeps = 20
+
+    if (type(getattr(config, 'grow_sweeps', None)) != int or
+            getattr(config, 'grow_sweeps', None) <= 0):
+        config.grow_sweeps = min(3, config.max_sweeps)
+
+    # Divergence and stagnation of the sweeps
+    if ((type(getattr(config, 'divergence_factor', None)) != float and
+            type(getattr(config, 'divergence_factor', None)) != int) or
+            getattr(config, 'divergence_factor', None) <= 1.0):
+        config.divergence_factor = 1.0e3
+
+    if (type(getattr(config, 'stall_sweeps', None)) != int or
+            getattr(config, 'stall_sweeps', None) <= 0):
+        config.stall_sweeps = 5
+
+    if ((type(getattr(config, 'stall_factor', None)) != float and
+            type(getattr(config, 'stall_factor', None)) != int) or
+            not 0.0 < getattr(config, 'stall_factor', None) <= 1.0):
+        config.stall_factor = 0.9
+
+    if type(getattr(config, 'verbose_sweeps', None)) != bool:
+        config.verbose_sweeps = False
+
+    # ----------------- Nonlinear Solver ----------------------
+    if (str(getattr(config, 'nonlinear_solver', None)).lower()
+            not in ["picard", "newton"]):
+        config.nonlinear_solver = "picard"
+    config.nonlinear_solver = config.nonlinear_solver.lower()
+
+    if ((type(getattr(config, 'newton_tol', None)) != float and
+            type(getattr(config, 'newton_tol', None)) != int) or
+            getattr(config, 'newton_tol', None) <= 0):
+        config.newton_tol = 1.0e-8
+
+    # ----------------- Linear Solver -------------------------
+    if str(getattr(config, 'solver', None)).lower() not in linear_solvers:
+        config.solver = "gmres"
+    config.solver = config.solver.lower()
+
+    # Without a preconditioner, GMRES does not reach solver_tolerance on
+    # these equations within solver_iterations; None must be set explicitly
+    if not hasattr(config, 'preconditioner'):
+        config.preconditioner = "ilu"
+    elif (str(getattr(config, 'preconditioner', None)).lower()
+            not in preconditioners):
+        config.preconditioner = None
+    else:
+        config.preconditioner = config.preconditioner.lower()
+
+    if ((type(getattr(config, 'solver_tolerance', None)) != float and
+            type(getattr(config, 'solver_tolerance', None)) != int) or
+            getattr(config, 'solver_tolerance', None) <= 0):
+        config.solver_tolerance = 1.0e-10
+
+    if (type(getattr(config, 'solver_iterations', None)) != int or
+            getattr(config, 'solver_iterations', None) <= 0):
+        config.solver_iterations = 100
+
+    # ----------------- Plotting and Saving Options -----------
+    # Generation of plots
+    if type(getattr(config, 'generate_plots', None)) != bool:
+        config.generate_plots = False
+        print("NOTE! The plots are NOT going to be generated.")
+
+    # Plot title
+    if not hasattr(config, 'plot_title'):
+        config.plot_title = ""
+
+    # Plotting stride
+    if (type(getattr(config, 'plot_every', None)) != int or
+            config.plot_every < 1):
+        config.plot_every = 1
+
+    # Auxiliary plots
+    # Check for type
+    if (type(getattr(config, 'aux_plots', None)) != bool or
+            type(getattr(config, 'aux_vars', None)) != list):
+        config.aux_plots = False
+        config.aux_vars = []
+
+    if config.aux_plots is True:
+        # Create aux_titles, _ymin, and _ymax lists if they don't exist
+        if not hasattr(config, 'aux_titles'):
+            config.aux_titles = []
+        if not hasattr(config, 'aux_ymin'):
+            config.aux_ymin = []
+        if not hasattr(config, 'aux_ymax'):
+            config.aux_ymax = []
+
+        # Forces all variable calls and titles to strings
+        if all(isinstance(i, str) for i in config.aux_vars) is False:
+            for i in range(len(config.aux_vars)):
+                config.aux_vars[i] = str(config.aux_vars[i])
+        if all(isinstance(i, str) for i in config.aux_titles) is False:
+            for i in range(len(config.aux_titles)):
+                config.aux_titles[i] = str(config.aux_titles[i])
+
+        # Make the aux_titles, _ymin, and _ymax lists long enough
+        while len(config.aux_vars) > len(config.aux_titles):
+            config.aux_titles.append(None)
+        while len(config.aux_vars) > len(config.aux_ymin):
+            config.aux_ymin.append(None)
+        while len(config.aux_vars) > len(config.aux_ymax):
+            config.aux_ymax.append(None)
+
+        for j in range(len(config.aux_vars)):
+            if type(config.aux_titles[j]) != str:
+                config.aux_titles[j] = None
+
+            # If the datamins/maxes for aux plots are bad, set them to None
+            if (type(config.aux_ymin[j]) != float and
+                    type(config.aux_ymin[j]) != int):
+                config.aux_ymin[j] = None
+            if (type(config.aux_ymax[j]) != float and
+                    type(config.aux_ymax[j]) != int):
+                config.aux_ymax[j] = None
+
+    # Makes sure that the saved directory is a string
+    if hasattr(config, 'save_directory'):
+        if config.save_directory != str:
+            config.save_directory = str(config.save_directory)
+
+    # If saving data is enabled, but not a directory, exit the run.
+    if (getattr(config, 'save_directory', None) is None and
+            (getattr(config, 'save_plots', False) is True or
+             getattr(config, 'save_TSVs', False) is True or
+             getattr(config, 'save_output', False) is True or
+             getattr(config, 'checkpoint_every', 0) or
+             getattr(config, 'checkpoint_wall', 0))):
+        sys.exit("No directory specified for saving specified files. "
+                 "Exiting...")
+
+    # Assumes save_directory exists, but not written correctly as a string
+    if hasattr(config, 'save_directory'):
+        if type(config.save_directory) != str:
+            config.save_directory = str(config.save_directory)
+
+    # If save_plots and/or TSVs does not exist or not booleans, set to False
+    if (not hasattr(config, 'save_plots') or
+            type(getattr(config, 'save_plots', None)) != bool):
+        config.save_plots = False
+    if (not hasattr(config, 'save_TSVs') or
+            type(getattr(config, 'save_TSVs', None)) != bool):
+        config.save_TSVs = False
+
+    # Binary time series output. The validity of the variable names is
+    # checked when the model is built.
+    if type(getattr(config, 'save_output', None)) != bool:
+        config.save_output = False
+    if (type(getattr(config, 'output_vars', None)) != list or
+            not all(isinstance(i, str) for i in config.output_vars)):
+        config.output_vars = ['density', 'temperature', 'Z', 'Diffusivity']
+    if (type(getattr(config, 'output_every', None)) != int or
+            getattr(config, 'output_every', None) <= 0):
+        config.output_every = 1
+
+    # Checkpoints, written into the save directory
+    if (type(getattr(config, 'checkpoint_every', None)) != int or
+            getattr(config, 'checkpoint_every', None) < 0):
+        config.checkpoint_every = 0
+    if ((type(getattr(config, 'checkpoint_wall', None)) != float and
+            type(getattr(config, 'checkpoint_wall', None)) != int) or
+            getattr(config, 'checkpoint_wall', None) < 0):
+        config.checkpoint_wall = 0.0
+
+    # File for the summary of the run
+    if type(getattr(config, 'summary_file', None)) != str:
+        config.summary_file = None
+
+    # Profiling of the time loop
+    if type(getattr(config, 'profile', None)) != bool:
+        config.profile = False
+    if type(getattr(config, 'profile_file', None)) != str:
+        config.profile_file = None
+
+    # ----------------- Parallel Runs -------------------------
+    # Only what works on the partitioned mesh, see src/parallel.py
+    if processes() == 1 and launched_processes() > 1:
+        query("Started on " + str(launched_processes()) + " processes "
+              "without a parallel suite; add --petsc or --trilinos.")
+    if processes() > 1:
+        print("NOTE! Parallel runs are experimental; compare with a serial "
+              "run.")
+        if config.nonlinear_solver == "newton":
+            query("Newton's method only runs in serial; use 'picard'.")
+        if config.steady_state is True:
+            query("The steady-state mode only runs in serial.")
+        if config.remesh_every > 0:
+            query("Remeshing only runs in serial; set remesh_every = 0.")
+
+        if config.solver in ["banded", "lu"]:
+            print("The " + config.solver + " solver only runs in serial; "
+                  "solving with gmres.")
+            config.solver = "gmres"
+        if config.preconditioner == "block_jacobi":
+            print("The block_jacobi preconditioner only runs in serial; "
+                  "preconditioning with jacobi.")
+            config.preconditioner = "jacobi"
+        if config.generate_plots is True or config.save_plots is True:
+            print("NOTE! No plots are made in a parallel run.")
+            config.generate_plots, config.save_plots = False, False
@@ -0,0 +1,113 @@
+"""
+    This file builds one instance of the plasma edge model from a
+    configuration, without any global state, so that any number of models
+    can be built in one process:
+
+        from src.input_handling import load_config
+        from src.model import build_model
+
+        model = build_model(load_config("taylor_config.py"))
+
+    The model holds the configuration, the mesh, all of the variables, the
+    fully-coupled equation, the solver, and the coefficient updater. The
+    configuration may be a module or any other object with the inputs as
+    attributes; it is checked by check_config() first.
+"""
+
+from src.input_handling import check_config
+from src.parameters import model_parameters
+from src.variable_decl import declare_variables
+from src.boundary_init_cond import set_initial_conditions, \
+    set_boundary_values
+from src.calculate_coeffs import calculate_coeffs, calculate_coeffs_fused
+from src.equations import set_equations
+from src.solvers import make_solver
+from src.caching import StateCache
+
+
+class Model(object):
+    """
+        One plasma edge model. Its variables are attributes (model.density,
+        model.Z, model.Gamma_an, ...), and are also listed by name in
+        model.variable_dictionary.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.fused_buffers = {}
+        self.coefficient_constants = None  # See calculate_coeffs.py
+        self.dispersion_table = None       # See plasma_dispersion.py
+        self.ensemble = None               # The Ensemble it is a part of
+        self.profiler = None        # Set by run_model() if profiling
+        self.cache = StateCache()   # States of the last updates
+
+        # Domain size, decay lengths, and numerical parameters
+        for name, value in model_parameters(config).items():
+            setattr(self, name, value)
+
+    def update_coeffs(self):
+        """
+            Calculates the coefficients of the flux model, unless they were
+            already calculated for the current state. The Taylor model has
+            none, so nothing is done at all.
+        """
+        if len(self.computed_coefficients) == 0:
+            return
+        if self.cache.reuse('coefficients', self.state_variables(),
+                            (self.config.Gamma_c, self.config.q_c)):
+            return
+        if self.config.fused_coeffs is True:
+            calculate_coeffs_fused(self)
+        else:
+            calculate_coeffs(self)
+
+    def update_diffusivity(self):
+        """ Sets the Diffusivity from the current Z, if Z changed. """
+        if self.cache.reuse('diffusivity', (self.Z,)):
+            return
+        self.Diffusivity.setValue(self.D_choice_local)
+
+    def state_variables(self):
+        """ The variables that are solved for. """
+        return (self.density, self.temperature, self.Z)
+
+    def update_old(self):
+        for variable in self.state_variables():
+            variable.updateOld()
+        self.refresh_constraints()
+
+    def refresh_constraints(self):
+        """
+            The Robin conditions constrain faceGrad with faceValue, which
+            FiPy does not always mark as stale; evaluate it, so the equations
+            use the current values (and a restart matches a run).
+        """
+        for variable in self.state_variables():
+            variable.faceGrad.value
+
+    def set_boundary_values(self, Gamma_c, q_c):
+        set_boundary_values(self, Gamma_c, q_c)
+
+
+def build_model(config):
+    """
+        Builds the model of the configuration: checks the inputs, declares the
+        mesh and variables, sets the initial and boundary conditions, and the
+        equation system.
+    """
+    check_config(config)
+
+    model = Model(config)
+    declare_variables(model)
+    set_initial_conditions(model)
+    model.set_boundary_values(config.Gamma_c, config.q_c)
+
+    # Initialize the coefficients, if the model has any
+    model.update_coeffs()
+
+    model.full_equation = set_equations(model)
+
+    # ----------------- Choose Solver -------------------------
+    # See src/solvers.py for the solvers and preconditioners
+    model.solver = make_solver(config, len(model.state_variables()))
+
+    return model
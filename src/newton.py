@@ -0,0 +1,161 @@
+"""
+    This file solves a time step of the coupled n-T-Z system with a
+    Jacobian-free Newton-Krylov (JFNK) method, instead of the Picard sweeps
+    of sweep_to_tolerance(). The sweeps freeze the Diffusivity and the
+    coefficients of the flux model (Gamma_an, Gamma_bulk, ...) for the whole
+    step, and the Diffusivity * density type coefficients within a sweep. In
+    the Newton iteration, all of them are evaluated at the current iterate,
+    so the step is fully implicit.
+
+    The nonlinear residual of the step is the residual vector of the FiPy
+    equations (L(u) u - b(u)), after the Diffusivity and the coefficients
+    are updated to u. scipy.optimize.newton_krylov solves it, with
+    finite-difference products of the Jacobian, preconditioned by an exact
+    factorization of the matrix of a Picard sweep at the current iterate.
+    The unknowns are scaled by the size of each field, and the rows by the
+    diagonal of that matrix, so the densities (~1e19 m^-3) and Z (~1) have
+    the same weight.
+"""
+
+import math
+import numpy
+import scipy.optimize
+from scipy.sparse import identity
+from scipy.sparse.linalg import LinearOperator, splu
+
+
+# Relative shift of the diagonal of a singular preconditioner matrix
+shift_factor = 1.0e-6
+
+
+class NewtonDiverged(Exception):
+    pass
+
+
+class PicardPreconditioner(LinearOperator):
+    """
+        Approximates the inverse Jacobian of the scaled residual by the
+        inverse of the Picard matrix, refactorized at every Newton iterate.
+    """
+    def __init__(self, newton):
+        self.newton = newton
+        self.factors = None
+        super(PicardPreconditioner, self).__init__(
+            float, (newton.size, newton.size))
+
+    def setup(self, x, f, func):
+        self.update(x, f)
+
+    def update(self, x, f):
+        self.newton.scaled_residual(x)
+        matrix = self.newton.matrix().tocsc()
+        try:
+            self.factors = splu(matrix)
+        except RuntimeError:
+            # The Robin conditions are explicit in the matrix, so without
+            # the transient terms (a steady-state solve) the matrix of the
+            # density is singular; shift its diagonal slightly
+            shift = shift_factor * numpy.max(numpy.abs(matrix.diagonal()))
+            self.factors = splu((matrix + shift * identity(
+                matrix.shape[0], format='csc')).tocsc())
+
+    def _matvec(self, vector):
+        newton = self.newton
+        return self.factors.solve(numpy.ravel(vector) / newton.row_scale)\
+            / newton.scale
+
+
+class NewtonIteration(object):
+    """
+        Solves the time steps of a model with Newton's method. It is called
+        like sweep_to_tolerance(), and returns the status ('converged',
+        'max_sweeps' or 'diverged'), the number of Newton iterations, and the
+        final (scaled) residual.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.variables = model.state_variables()
+        self.cells = model.mesh.numberOfCells
+        self.size = len(self.variables) * self.cells
+
+        model.full_equation.cacheMatrix()
+
+    def set_state(self, u):
+        model = self.model
+        for k, variable in enumerate(self.variables):
+            variable.setValue(u[k * self.cells:(k + 1) * self.cells])
+        model.refresh_constraints()
+        model.update_diffusivity()
+        model.update_coeffs()
+
+    def residual(self, u):
+        """ The residual vector of the step at the (unscaled) state u. """
+        self.set_state(u)
+        residual = numpy.asarray(self.model.full_equation.justResidualVector(
+            dt=self.dt, solver=self.solver))
+        if not numpy.all(numpy.isfinite(residual)):
+            raise NewtonDiverged()
+        return residual
+
+    def matrix(self):
+        """ The matrix of the last residual, i.e. of a Picard sweep. """
+        return self.model.full_equation.matrix.matrix
+
+    def scaled_residual(self, v):
+        return self.residual(v * self.scale) * self.row_scale
+
+    def state(self):
+        """ The (unscaled) state of the variables, as one vector. """
+        return numpy.concatenate([numpy.array(variable.value)
+                                  for variable in self.variables])
+
+    def set_scales(self, u):
+        """
+            Sets the scales of the unknowns and the residuals at the state u.
+            Raises NewtonDiverged if the residual there is not finite.
+        """
+        self.scale = numpy.repeat(
+            [max(numpy.max(numpy.abs(u[k * self.cells:(k + 1) * self.cells])),
+                 1.0) for k in range(len(self.variables))], self.cells)
+        self.row_scale = numpy.ones(self.size)
+        self.residual(u)
+        diagonal = numpy.abs(self.matrix().diagonal()) * self.scale
+        diagonal[diagonal == 0.0] = 1.0
+        self.row_scale = 1.0 / diagonal
+
+    def __call__(self, equation, dt, solver, config, elapsed=0.0):
+        self.dt, self.solver = dt, solver
+        u = self.state()
+        try:
+            self.set_scales(u)
+        except NewtonDiverged:
+            return 'diverged', 0, math.inf
+
+        history = []
+
+        def record(x, f):
+            history.append(numpy.max(numpy.abs(f)))
+            if config.verbose_sweeps is True:
+                print("time = {:.6e}, dt = {:.3e}, Newton residual = {:.6e}"
+                      .format(elapsed, dt, history[-1]))
+
+        status = 'converged'
+        try:
+            v = scipy.optimize.newton_krylov(
+                self.scaled_residual, u / self.scale, method='lgmres',
+                inner_M=PicardPreconditioner(self),
+                f_tol=config.newton_tol, maxiter=config.max_sweeps,
+                line_search='armijo', callback=record)
+        except scipy.optimize.NoConvergence:
+            status = 'max_sweeps'
+        except (NewtonDiverged, ValueError, ArithmeticError,
+                numpy.linalg.LinAlgError, RuntimeError):
+            status = 'diverged'
+
+        if status != 'converged':
+            last = history[-1] if len(history) > 0 else math.inf
+            return status, len(history), last
+
+        # Leave the variables and coefficients at the solution
+        final = numpy.max(numpy.abs(self.scaled_residual(v)))
+        return status, max(len(history), 1), final
@@ -0,0 +1,173 @@
+"""
+    This file writes the time series of the variables into one binary file
+    per variable, in place of a TSV file per time step. Each file is a
+    standard .npy array of shape (number of saved steps, number of cells),
+    which is appended to as the run goes on. Its header is rewritten with the
+    number of saved steps at every flush, so a killed run still leaves
+    readable files up to the last flush.
+
+    The files are read lazily, as memory maps, by load_time_series():
+
+        series = load_time_series("SAVE_DIRECTORY/time_series")
+        series['density'][-1]      # The last saved density profile
+
+    In a parallel run, the values are gathered from all processes
+    (globalValue, on every process) and written by process 0 only.
+"""
+
+import os
+import json
+import struct
+import numpy
+
+from src.parallel import is_root
+
+
+# Size of the .npy headers, which leaves room for any number of steps
+header_size = 128
+
+
+def npy_header(shape, dtype):
+    """ The .npy (version 1.0) header of an array of the given shape. """
+    header = "{'descr': " + repr(numpy.lib.format.dtype_to_descr(dtype)) \
+        + ", 'fortran_order': False, 'shape': " + repr(tuple(shape)) + ", }"
+    # Magic string, version, and length, followed by the padded header
+    padding = header_size - 10 - len(header) - 1
+    return b'\x93NUMPY\x01\x00' \
+        + struct.pack('<H', header_size - 10) \
+        + (header + " " * padding + "\n").encode('latin1')
+
+
+class AppendableArray(object):
+    """
+        A .npy file of rows of a fixed length, appended to one at a time. If
+        'keep_rows' is given, the existing file is continued after its first
+        'keep_rows' rows instead, e.g. when a run is restarted.
+    """
+    def __init__(self, filename, row_shape, dtype=numpy.float64,
+                 keep_rows=None):
+        self.row_shape = tuple(row_shape)
+        self.dtype = numpy.dtype(dtype)
+
+        if keep_rows is None or not os.path.isfile(filename):
+            self.rows = 0
+            self.file = open(filename, 'wb')
+            self.file.write(npy_header((0,) + self.row_shape, self.dtype))
+        else:
+            self.rows = keep_rows
+            self.file = open(filename, 'r+b')
+            self.file.truncate(header_size + keep_rows * self.dtype.itemsize
+                               * int(numpy.prod(self.row_shape)))
+            self.flush()
+
+    def append(self, row):
+        self.file.write(numpy.ascontiguousarray(row, dtype=self.dtype)
+                        .tobytes())
+        self.rows += 1
+
+    def flush(self):
+        """ Updates the number of rows in the header. """
+        self.file.seek(0)
+        self.file.write(npy_header((self.rows,) + self.row_shape, self.dtype))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TimeSeriesWriter(object):
+    """
+        Writes the chosen variables of a model, plus the time and step
+        number, every 'every' steps into 'directory'. The header of every
+        file is updated every 'flush_every' saved steps. A run restarted at
+        step 'resume_step' continues the existing files after that step.
+        Only process 0 has files; the others only gather the values.
+    """
+    def __init__(self, directory, variables, every=1, flush_every=10,
+                 resume_step=None):
+        self.directory = directory
+        self.variables = variables
+        self.every = every
+        self.flush_every = flush_every
+
+        # Gathered on every process, so that all of them take part
+        shapes = dict((name, numpy.shape(variable.globalValue))
+                      for name, variable in variables.items())
+        self.root = is_root()
+        if self.root is False:
+            self.arrays, self.time, self.step = {}, None, None
+            return
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Number of rows up to, and including, the step of the restart
+        keep_rows = None
+        if (resume_step is not None and
+                os.path.isfile(os.path.join(directory, "step.npy"))):
+            saved_steps = numpy.load(os.path.join(directory, "step.npy"))
+            keep_rows = int(numpy.sum(saved_steps <= resume_step))
+
+        self.arrays = dict(
+            (name, AppendableArray(os.path.join(directory, name + ".npy"),
+                                   shape, keep_rows=keep_rows))
+            for name, shape in shapes.items())
+        self.time = AppendableArray(os.path.join(directory, "time.npy"), (),
+                                    keep_rows=keep_rows)
+        self.step = AppendableArray(os.path.join(directory, "step.npy"), (),
+                                    numpy.int64, keep_rows)
+
+        with open(os.path.join(directory, "variables.json"), 'w') as names:
+            json.dump(sorted(variables.keys()), names)
+
+    def save_cell_centers(self, x):
+        centers = numpy.asarray(x.globalValue)
+        if self.root is True:
+            numpy.save(os.path.join(self.directory, "x.npy"), centers)
+
+    def append(self, step, time):
+        """ Saves the current values, if 'step' is on the stride. """
+        if step % self.every != 0:
+            return
+
+        values = dict((name, variable.globalValue)
+                      for name, variable in self.variables.items())
+        if self.root is False:
+            return
+        for name, value in values.items():
+            self.arrays[name].append(value)
+        self.time.append(time)
+        self.step.append(step)
+
+        if self.time.rows % self.flush_every == 0:
+            self.flush()
+
+    def files(self):
+        if self.root is False:
+            return []
+        return list(self.arrays.values()) + [self.time, self.step]
+
+    def flush(self):
+        for array in self.files():
+            array.flush()
+
+    def close(self):
+        for array in self.files():
+            array.close()
+
+
+def load_time_series(directory):
+    """
+        Returns the saved time series in 'directory' as a dictionary of
+        read-only memory maps, including 'time', 'step', and 'x'.
+    """
+    with open(os.path.join(directory, "variables.json")) as names:
+        names = json.load(names) + ['time', 'step']
+    if os.path.isfile(os.path.join(directory, "x.npy")):
+        names.append('x')
+
+    return dict((name, numpy.load(os.path.join(directory, name + ".npy"),
+                                  mmap_mode='r'))
+                for name in names)
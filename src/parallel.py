@@ -0,0 +1,133 @@
+"""
+    This file has the helpers of the parallel (MPI) runs, which are
+    experimental: only runs of the Taylor model with PETSc have been compared
+    with serial runs (tests/test_parallel.py). With the PETSc or Trilinos
+    solvers of FiPy, a run started by mpirun is split over the processes:
+
+        mpirun -np 4 python solving_flux.py CONFIG_FILE.py --petsc
+
+      mesh          FiPy partitions the Grid1D mesh (uniform or graded) over
+                    the processes; every process holds its own cells, and a
+                    few ghost cells of its neighbours.
+      coefficients  The Diffusivity and the coefficients are evaluated with
+                    numpy on the local and ghost cells of every process, as
+                    in serial; nothing there communicates.
+      solve         The matrix and the vectors are distributed, and solved
+                    with an iterative solver of the suite; the residuals of
+                    the sweeps are global norms.
+      decisions     Everything that steers the run is the same on every
+                    process: the stopping criteria use global maxima and edge
+                    values, and the decisions on the wall-clock time (which
+                    differs between the processes) are those of process 0.
+      output        The time series, the checkpoints, the TSV files and the
+                    summary are gathered (globalValue) and written by process
+                    0 only, and only process 0 prints.
+
+    Newton's method, the steady-state mode and remeshing work on the global
+    arrays with scipy, and ensembles on a 2D mesh, so they only run in
+    serial. The plots are turned off, and the banded and LU solvers and the
+    block Jacobi preconditioner are replaced (see check_config()). In serial,
+    all of the helpers return what the serial code always used.
+
+    FiPy loads the suite of --petsc or --trilinos when it is imported; when
+    the suite (petsc4py, PyTrilinos or mpi4py) is missing, the run exits with
+    status 2 and says so. A run started on several processes with the scipy
+    suite would solve the whole model on every process, so it is an invalid
+    configuration too.
+"""
+
+import os
+import sys
+import numpy
+
+
+# The suites of FiPy which split a run over the processes
+parallel_suites = ['petsc', 'trilinos']
+
+
+def requested_suite():
+    """
+        The parallel suite asked for with --petsc or --trilinos, or with
+        FIPY_SOLVERS, if any.
+    """
+    for suite in parallel_suites:
+        if '--' + suite in sys.argv:
+            return suite
+    if os.environ.get('FIPY_SOLVERS') in parallel_suites:
+        return os.environ['FIPY_SOLVERS']
+    return None
+
+
+try:
+    from fipy.tools import parallelComm
+except ImportError as error:
+    if requested_suite() is None:
+        raise
+    print("The parallel mode (experimental) needs the " + requested_suite()
+          + " solvers of FiPy, which are not installed (" + str(error)
+          + "); see the README.", file=sys.stderr)
+    sys.exit(2)
+
+
+def processes():
+    """ The number of processes of the run. """
+    return parallelComm.Nproc
+
+
+def launched_processes():
+    """
+        The number of processes mpirun started (Open MPI or MPICH), which
+        is 1 without mpirun.
+    """
+    for variable in ['OMPI_COMM_WORLD_SIZE', 'PMI_SIZE']:
+        if variable in os.environ:
+            return int(os.environ[variable])
+    return 1
+
+
+def is_root():
+    """ Is this process 0, which writes the output? """
+    return parallelComm.procID == 0
+
+
+def quiet_other_processes():
+    """ Only process 0 prints; the others write their output to nowhere. """
+    if not is_root():
+        sys.stdout = open(os.devnull, 'w')
+
+
+def root_decision(flag):
+    """
+        The flag of process 0, on every process, e.g. for a decision on the
+        wall-clock time, which every process measures on its own.
+    """
+    if processes() == 1:
+        return flag
+    return parallelComm.bcast(flag, root=0)
+
+
+def global_max(value):
+    """ The largest of the values of all processes. """
+    if processes() == 1:
+        return value
+    return max(parallelComm.allgather(value))
+
+
+def cell_value(variable, index):
+    """
+        The value of the variable in a cell of the whole mesh, e.g. at the
+        edge (0) or the core (-1), on every process.
+    """
+    if processes() == 1:
+        return variable.value[index]
+    return variable.globalValue[index]
+
+
+def local_values(mesh, values):
+    """
+        The part of the values on all cells of the mesh (e.g. of a
+        checkpoint) on the local and ghost cells of this process.
+    """
+    if processes() == 1:
+        return values
+    return numpy.asarray(values)[mesh._globalOverlappingCellIDs]
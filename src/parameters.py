@@ -2,9 +2,11 @@
     This file contains the simple constant delcarations for use in the PDE
     system. This includes machine parameters, length scales, and global
     physical/math constants. The units are usually in base SI.
+
+    The parameters that depend on the choice of model are returned by
+    model_parameters(config).
 """
 
-from src.input_handling import *
 from scipy import constants
 
 
@@ -44,16 +46,42 @@ q = aspect * B_phi / B_theta                   # q value
 
 # PRESET parameters for quick calculation, many of which are chosen by Staps
 # and Paquay
-if config.taylor_model is True:
-    L = 4.0                                    # in AU
-    lambda_n = 5.0 / 4.0                       # Decay length scales at edge
-    lambda_T = 3.0 / 2.0
-    lambda_Z = 5.0 / 4.0
-elif config.taylor_model is False:
-    L = 0.05                                   # in m
-    lambda_n = 0.01
-    lambda_T = 0.0125
-    lambda_Z = 0.01
+def model_parameters(config):
+    """
+        Returns the domain size, the decay lengths at the edge, and the
+        numerical parameters of the Taylor-expanded Z-equation, as chosen in
+        the configuration.
+    """
+    parameters = {}
+
+    if config.taylor_model is True:
+        parameters['L'] = 4.0                  # in AU
+        parameters['lambda_n'] = 5.0 / 4.0     # Decay length scales at edge
+        parameters['lambda_T'] = 3.0 / 2.0
+        parameters['lambda_Z'] = 5.0 / 4.0
+        parameters['pedestal_location'] = 1.75  # Of the H--mode profiles
+        parameters['pedestal_width'] = 0.5
+    elif config.taylor_model is False:
+        parameters['L'] = 0.05                 # in m
+        parameters['lambda_n'] = 0.01
+        parameters['lambda_T'] = 0.0125
+        parameters['lambda_Z'] = 0.01
+        parameters['pedestal_location'] = 0.0125
+        parameters['pedestal_width'] = 0.005
+
+    # Choose set of parameters in the Taylor-expanded model
+    # It gets defaulted to Staps' numbers.
+    if config.numerical_choice.lower() == "paquay":
+        # Paquay's numbers
+        parameters.update(c_n=1.1, c_T=0.9, a=-1.5, b=1.0, c=-1.0, Z_S=1.4)
+
+    # Stap's numbers
+    elif config.numerical_choice.lower() == "staps":
+        parameters.update(c_n=-1.1, c_T=-0.9, a=3.0 / 2.0, b=2.0, c=-1.0,
+                          Z_S=-3.0 / 2.0)
+
+    return parameters
+
 
 # Dynamic viscosity value
 mu = 1.0 / 20.0
@@ -68,27 +96,6 @@ epsilon = 1.0 / 25.0
 # Coefficient of the particle-heat coupling
 zeta = 0.5
 
-# Choose set of parameters in the Taylor-expanded model
-# It gets defaulted to Staps' numbers.
-if config.numerical_choice.lower() == "paquay":
-    # Paquay's numbers
-    c_n = 1.1
-    c_T = 0.9
-    a = -1.5
-    b = 1.0
-    c = -1.0
-    Z_S = 1.4
-
-# Stap's numbers
-elif config.numerical_choice.lower() == "staps":
-    c_n = -1.1
-    c_T = -0.9
-    a = 3.0 / 2.0
-    b = 2.0
-    c = -1.0
-    Z_S = -3.0 / 2.0
-
-
 # For use in full flux model
 alpha_an = 1.5                                 # Anomalous e loss coefficient
 alpha_cx = 1.5                                 # CX Friction coefficient
@@ -0,0 +1,172 @@
+"""
+    This file does the plotting of a run off the time loop. The time loop
+    only takes a snapshot of the plotted arrays (every plot_every steps) and
+    puts it in a short queue; a separate process renders the snapshots with
+    matplotlib, and shows them or saves them as PNG files. If the renderer is
+    still busy when the queue is full, the snapshot is dropped, so the time
+    loop never waits on the plotting.
+
+    A plot is described by a dictionary of plain values (so it can be sent to
+    the rendering process): the 'prefix' of its file names, the 'labels' of
+    its lines, 'xmin', 'xmax', 'datamin', 'datamax' and 'title'. The values of
+    its lines are the snapshots of the matching 'variables' of the model.
+"""
+
+import queue
+import multiprocessing
+import numpy
+
+
+def plot_descriptions(model):
+    """
+        Returns the plots of the model, as pairs of the description of the
+        plot and the variables (or expressions) of its lines.
+    """
+    config, L = model.config, model.L
+
+    if config.taylor_model is True:
+        plots = [(dict(prefix="", labels=[r"$n$", r"$T$", r"$-Z$", r"$D$"],
+                       xmin=0.0, xmax=L, datamin=-0.2,
+                       datamax=config.ploty_max, title=config.plot_title),
+                  [model.density, model.temperature, -model.Z,
+                   model.Diffusivity])]
+    else:
+        plots = [
+            (dict(prefix="n", labels=[model.density.name], xmin=0.0,
+                  xmax=L, datamin=0.0, datamax=None, title=None),
+             [model.density]),
+            (dict(prefix="T", labels=[model.temperature.name], xmin=0.0,
+                  xmax=L, datamin=0.0, datamax=None, title=None),
+             [model.temperature]),
+            (dict(prefix="Z", labels=[model.Z.name, model.Diffusivity.name],
+                  xmin=0.0, xmax=L, datamin=0.0, datamax=None, title=None),
+             [model.Z, model.Diffusivity])]
+
+    # Auxiliary plots
+    if config.aux_plots is True:
+        for k in range(len(config.aux_vars)):
+            variable = model.variable_dictionary[config.aux_vars[k]]
+            plots.append((dict(prefix="aux" + str(k) + "_",
+                               labels=[variable.name], xmin=0.0, xmax=L,
+                               datamin=config.aux_ymin[k],
+                               datamax=config.aux_ymax[k],
+                               title=config.aux_titles[k]), [variable]))
+
+    return plots
+
+
+def render_plots(frames, descriptions, x, save_directory):
+    """
+        The rendering process: draws every snapshot taken from the 'frames'
+        queue, until it gets None. A snapshot is the step (None for the
+        initial conditions, which are not saved), the cell centers (which
+        move if the mesh is adapted), and the values of the lines of every
+        plot. The plots are saved to save_directory if it is given,
+        and shown otherwise.
+    """
+    import matplotlib
+    if save_directory is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    if save_directory is None:
+        plt.ion()
+
+    figures = []
+    for description in descriptions:
+        figure, axes = plt.subplots()
+        lines = [axes.plot(x, numpy.zeros_like(x), label=label)[0]
+                 for label in description['labels']]
+        axes.set_xlim(description['xmin'], description['xmax'])
+        if description['title'] is not None:
+            axes.set_title(description['title'])
+        axes.legend(loc='best')
+        figures.append((figure, axes, lines))
+
+    while True:
+        try:
+            frame = frames.get(timeout=0.05)
+        except queue.Empty:
+            # Keep the shown windows responsive while waiting
+            if save_directory is None:
+                plt.pause(0.05)
+            continue
+        if frame is None:
+            break
+        step, x, snapshot = frame
+
+        for description, (figure, axes, lines), values in \
+                zip(descriptions, figures, snapshot):
+            for line, value in zip(lines, values):
+                line.set_data(x, value)
+
+            # Limits that are not set follow the data
+            datamin, datamax = description['datamin'], description['datamax']
+            if datamin is None:
+                datamin = min(numpy.min(value) for value in values)
+            if datamax is None:
+                datamax = max(numpy.max(value) for value in values)
+            axes.set_ylim(datamin, datamax)
+
+            if save_directory is None:
+                figure.canvas.draw_idle()
+            elif step is not None:
+                figure.savefig(save_directory + "/" + description['prefix']
+                               + str(step).zfill(4) + ".png")
+
+        if save_directory is None:
+            plt.pause(1.0e-3)
+
+    plt.close('all')
+
+
+class AsyncPlotter(object):
+    """
+        Plots the model in a separate process. submit(step) takes a snapshot
+        every 'plot_every' steps, and drops it if 'queue_size' snapshots are
+        still waiting to be rendered.
+    """
+    def __init__(self, model, plot_every=1, queue_size=2,
+                 save_directory=None):
+        plots = plot_descriptions(model)
+        self.descriptions = [description for description, _ in plots]
+        self.variables = [variables for _, variables in plots]
+        self.x = numpy.array(model.x.globalValue)
+        self.plot_every = plot_every
+        self.dropped = 0
+
+        self.frames = multiprocessing.Queue(maxsize=queue_size)
+        self.renderer = multiprocessing.Process(
+            target=render_plots, daemon=True,
+            args=(self.frames, self.descriptions, self.x, save_directory))
+        self.renderer.start()
+
+    def remeshed(self, model):
+        """ Plots the variables of the model on its new mesh from now on. """
+        self.variables = [variables for _, variables in
+                          plot_descriptions(model)]
+        self.x = numpy.array(model.x.globalValue)
+
+    def snapshot(self):
+        return [[numpy.array(variable.globalValue) for variable in variables]
+                for variables in self.variables]
+
+    def submit(self, step):
+        """ Hands the current values to the renderer, if step is plotted. """
+        if step is not None and step % self.plot_every != 0:
+            return
+        try:
+            self.frames.put_nowait((step, self.x, self.snapshot()))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+            Waits for the renderer to draw the queued snapshots, and closes
+            the plots.
+        """
+        self.frames.put(None)
+        self.renderer.join()
+        if self.dropped > 0:
+            print(str(self.dropped) + " plot frames were dropped, as the "
+                  "plotting did not keep up with the time loop.")
@@ -0,0 +1,172 @@
+"""
+    This file times the phases of the time loop, to see where the time of a
+    step goes. A Profiler sums the time spent in each phase during a step
+    (updating the old values, the Diffusivity, the coefficients and each of
+    their groups, solving, plotting and output), and keeps these sums for
+    every step, together with the sweeps and linear solver iterations of the
+    step. At the end of the run it reports the total, mean and 95th
+    percentile of every phase over the steps, and can write them as JSON.
+
+    The time of the linear solves is measured inside the sweeps, by wrapping
+    the solver; the rest of the 'solve' phase is mostly the assembly of the
+    matrices and the residuals. The updates of the Diffusivity and the
+    coefficients that were computed, and skipped for an unchanged state (see
+    src/caching.py), are counted per step, and per sweep, as well.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+import numpy
+
+
+@contextmanager
+def unprofiled():
+    """ The phase of a model that is not profiled; times nothing. """
+    yield
+
+
+def phase(model, name):
+    """ Times a phase of the model, if it is profiled. """
+    if getattr(model, 'profiler', None) is None:
+        return unprofiled()
+    return model.profiler.phase(name)
+
+
+def lap_timer(model):
+    """
+        Returns a function lap(name), which times the code since the last
+        lap as the phase 'name', if the model is profiled. Used for the
+        groups of the coefficients, without indenting them.
+    """
+    if getattr(model, 'profiler', None) is None:
+        return lambda name: None
+    model.profiler.start_laps()
+    return model.profiler.lap
+
+
+class Profiler(object):
+    def __init__(self):
+        self.phases = []            # Names, in the order they first ran
+        self.timings = {}           # Phase -> its time in every step
+        self.counts = {'sweeps': [], 'retries': [], 'solver_iterations': []}
+        self.step_timings = {}
+        self.step_iterations = 0
+        self.lap_start = time.perf_counter()
+        self.cache = None
+        self.cache_counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        if name not in self.timings:
+            self.phases.append(name)
+            self.timings[name] = []
+        self.step_timings[name] = self.step_timings.get(name, 0.0) + seconds
+
+    def start_laps(self):
+        self.lap_start = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.add(name, now - self.lap_start)
+        self.lap_start = now
+
+    def instrument_solver(self, solver):
+        """ Times the linear solves of the solver, and counts iterations. """
+        solve = solver._solve
+
+        def timed_solve(*args, **kwargs):
+            with self.phase('linear solve'):
+                result = solve(*args, **kwargs)
+            convergence = getattr(solver, 'convergence', None)
+            self.step_iterations += getattr(convergence, 'iterations', 0)
+            return result
+
+        solver._solve = timed_solve
+
+    def watch_cache(self, cache):
+        """ Counts the updates the StateCache computed and skipped. """
+        self.cache = cache
+        self.cache_counts = self.cache_totals()
+
+    def cache_totals(self):
+        totals = {}
+        for name, count in self.cache.computed.items():
+            totals[name + ' computed'] = count
+        for name, count in self.cache.reused.items():
+            totals[name + ' reused'] = count
+        return totals
+
+    def end_step(self, record=None):
+        """ Stores the timings of the step, with its convergence record. """
+        for name, seconds in self.step_timings.items():
+            self.timings[name].append(seconds)
+        if record is not None:
+            self.counts['sweeps'].append(record['sweeps'])
+            self.counts['retries'].append(record['retries'])
+        self.counts['solver_iterations'].append(self.step_iterations)
+        self.step_timings = {}
+        self.step_iterations = 0
+
+        if self.cache is not None:
+            totals = self.cache_totals()
+            steps = len(self.counts['solver_iterations'])
+            for name in sorted(totals):
+                self.counts.setdefault(name, [0] * (steps - 1)).append(
+                    totals[name] - self.cache_counts.get(name, 0))
+            self.cache_counts = totals
+
+    def summary(self):
+        """
+            The statistics of every phase over the steps it ran in, and the
+            totals and means of the counts per step.
+        """
+        phases = {}
+        for name in self.phases:
+            times = numpy.array(self.timings[name])
+            if len(times) == 0:
+                continue
+            phases[name] = {'total': float(times.sum()),
+                            'mean': float(times.mean()),
+                            'p95': float(numpy.percentile(times, 95)),
+                            'steps': len(times)}
+
+        # The updates computed and skipped are also counted per sweep (or
+        # Newton iteration) of the run
+        sweeps = int(numpy.sum(self.counts['sweeps']))
+        counts = {}
+        for name, values in self.counts.items():
+            counts[name] = {'total': int(numpy.sum(values)),
+                            'mean': float(numpy.mean(values))
+                            if len(values) > 0 else 0.0}
+            if name.endswith((' computed', ' reused')) and sweeps > 0:
+                counts[name]['per_sweep'] = counts[name]['total'] / sweeps
+
+        return {'phases': phases, 'counts': counts}
+
+    def report(self):
+        summary = self.summary()
+        print("{:<32s}{:>12s}{:>12s}{:>12s}{:>7s}".format(
+            "Phase", "total [s]", "mean [s]", "p95 [s]", "steps"))
+        for name, stats in summary['phases'].items():
+            print("{:<32s}{:>12.4e}{:>12.4e}{:>12.4e}{:>7d}".format(
+                name, stats['total'], stats['mean'], stats['p95'],
+                stats['steps']))
+        for name, stats in summary['counts'].items():
+            line = "{:<32s}{:>12d} in total, {:.2f} per step".format(
+                name, stats['total'], stats['mean'])
+            if 'per_sweep' in stats:
+                line += ", {:.2f} per sweep".format(stats['per_sweep'])
+            print(line)
+
+    def write(self, filename):
+        with open(filename, 'w') as profile_file:
+            json.dump(self.summary(), profile_file, indent=2)
+            profile_file.write("\n")
@@ -0,0 +1,209 @@
+"""
+    This file moves the cells of the mesh to where the profiles are steep,
+    during a run. The pedestal forms and moves during an L--H transition, so
+    a fixed graded mesh (see graded_spacing()) is only refined at the right
+    place for part of the run. Every remesh_every steps, the cells are
+    redistributed with the same number of cells, so the cost of a step
+    stays the same:
+
+      monitor      M = 1 + (mesh_ratio - 1) * max(|Z'| / max|Z'|,
+                   |n'| / max|n'|)^(1/2), smoothed over a few neighbouring
+                   cells, so the cells are up to mesh_ratio times smaller
+                   where the gradients of Z or the density are largest. With
+                   refine_edge, the cells at the edge are kept small as well,
+                   where the boundary conditions make a thin layer.
+      new mesh     The faces equidistribute the integral of M. If no cell
+                   changes its width by more than remesh_threshold, the mesh
+                   is kept, as every remesh rebuilds the equations.
+      transfer     density, Z and the Diffusivity, and their old values, are
+                   remapped conservatively: reconstructed as piecewise linear
+                   (with minmod-limited slopes, so no new extrema) and
+                   integrated exactly over the new cells. The
+                   temperature is remapped through the energy n T, which is
+                   then conserved (where the density is not zero).
+
+    The variables, the boundary conditions and the equations are declared
+    again on the new mesh, on the same model. Everything that holds on to
+    the old variables (the Newton iteration, the plots, the time series) has
+    to be refreshed after a remesh, see run_model().
+"""
+
+import numpy
+from fipy import Grid1D
+
+from src.variable_decl import declare_variables
+from src.boundary_init_cond import diffusivity_model
+from src.equations import set_equations
+
+
+# Passes of the [1, 2, 1] / 4 filter over the monitor function, which
+# limit how fast the cells grow from one to the next
+smoothing_passes = 4
+
+# Power of the scaled gradients in the monitor function; below 1, layers of
+# moderate gradients (e.g. at the edge) also get smaller cells
+monitor_exponent = 0.5
+
+# The variables carried over to the new mesh; the coefficients of the flux
+# model are computed again from them
+remeshed_variables = ['density', 'temperature', 'Z', 'Diffusivity']
+
+
+def cell_faces(mesh):
+    """ The positions of the faces of a 1D mesh, from left to right. """
+    return numpy.sort(numpy.array(mesh.faceCenters[0].value))
+
+
+def faces_from_centers(x):
+    """
+        The faces of the 1D mesh starting at 0 with cell centers x, e.g.
+        of the mesh of a checkpoint.
+    """
+    faces = numpy.zeros(len(x) + 1)
+    for k in range(len(x)):
+        faces[k + 1] = 2.0 * x[k] - faces[k]
+    return faces
+
+
+def conservative_remap(faces, values, new_faces):
+    """
+        The averages over the cells between new_faces of the piecewise
+        linear reconstruction of the cell averages 'values' between 'faces'.
+        Both meshes span the same interval, so the integral is kept.
+    """
+    centers = 0.5 * (faces[1:] + faces[:-1])
+    widths = numpy.diff(faces)
+
+    # Minmod-limited slopes, one-sided in the boundary cells, where they
+    # are limited so that the reconstruction at the wall stays within the
+    # range of the values, and does not change sign
+    differences = numpy.diff(values) / numpy.diff(centers)
+    slopes = numpy.zeros_like(values)
+    left, right = differences[:-1], differences[1:]
+    slopes[1:-1] = numpy.where(left * right > 0.0,
+                               numpy.sign(left) * numpy.minimum(
+                                   numpy.abs(left), numpy.abs(right)), 0.0)
+    low, high = numpy.min(values), numpy.max(values)
+    for cell, side in ((0, -1.0), (-1, 1.0)):
+        value, half_width = values[cell], 0.5 * widths[cell]
+        if value > 0.0:
+            wall_low, wall_high = max(low, 0.0), high
+        elif value < 0.0:
+            wall_low, wall_high = low, min(high, 0.0)
+        else:
+            wall_low, wall_high = 0.0, 0.0
+        # The change from the average to the value at the wall
+        change = numpy.clip(side * differences[cell] * half_width,
+                            wall_low - value, wall_high - value)
+        slopes[cell] = side * change / half_width
+
+    integrals = numpy.concatenate([[0.0], numpy.cumsum(values * widths)])
+    cells = numpy.clip(numpy.searchsorted(faces, new_faces, side='right') - 1,
+                       0, len(values) - 1)
+    start = faces[cells]
+    cumulative = (integrals[cells] + values[cells] * (new_faces - start)
+                  + 0.5 * slopes[cells] * ((new_faces - centers[cells])**2
+                                           - (start - centers[cells])**2))
+    return numpy.diff(cumulative) / numpy.diff(new_faces)
+
+
+def adapted_spacing(model, ratio, edge_width=None):
+    """
+        The widths of the cells of the mesh adapted to the current gradients
+        of Z and the density, with as many cells as the current mesh. If
+        edge_width is given, the cells are also refined over about that
+        width at the edge, as in graded_spacing().
+    """
+    faces = cell_faces(model.mesh)
+    monitor = numpy.zeros(len(faces) - 1)
+    for variable in (model.Z, model.density):
+        gradient = numpy.abs(numpy.array(variable.grad[0].value))
+        if numpy.max(gradient) > 0.0:
+            monitor = numpy.maximum(monitor, (gradient / numpy.max(
+                gradient))**monitor_exponent)
+    if edge_width is not None:
+        monitor = numpy.maximum(monitor, numpy.cosh(
+            numpy.array(model.x.value) / (0.5 * edge_width))**-2)
+    monitor = 1.0 + (ratio - 1.0) * monitor
+
+    for smoothing_pass in range(smoothing_passes):
+        monitor[1:-1] = 0.25 * (monitor[:-2] + 2.0 * monitor[1:-1]
+                                + monitor[2:])
+
+    integral = numpy.concatenate([[0.0],
+                                  numpy.cumsum(monitor * numpy.diff(faces))])
+    new_faces = numpy.interp(numpy.linspace(0.0, integral[-1], len(faces)),
+                             integral, faces)
+    new_faces[0], new_faces[-1] = faces[0], faces[-1]
+    return numpy.diff(new_faces)
+
+
+def remesh(model, widths):
+    """
+        Declares the model again on the 1D mesh with the given cell widths,
+        with the state carried over conservatively.
+    """
+    faces = cell_faces(model.mesh)
+    values = dict((name, numpy.array(model.variable_dictionary[name].value))
+                  for name in remeshed_variables)
+    old_values = dict((name, numpy.array(
+        model.variable_dictionary[name].old.value))
+        for name in remeshed_variables)
+
+    declare_variables(model, Grid1D(dx=widths))
+    new_faces = cell_faces(model.mesh)
+
+    for state in (values, old_values):
+        energy = conservative_remap(faces, state['density']
+                                    * state['temperature'], new_faces)
+        for name in remeshed_variables:
+            state[name] = conservative_remap(faces, state[name], new_faces)
+        # The old values are zero before the first step
+        nonzero = state['density'] != 0.0
+        state['temperature'][nonzero] = energy[nonzero] \
+            / state['density'][nonzero]
+
+    for name in remeshed_variables:
+        variable = model.variable_dictionary[name]
+        variable.setValue(values[name])
+        variable.old.setValue(old_values[name])
+
+    model.D_choice_local = diffusivity_model(model)
+    model.set_boundary_values(model.config.Gamma_c, model.config.q_c)
+    model.cache.clear()
+    model.refresh_constraints()
+    model.update_coeffs()
+    model.full_equation = set_equations(model)
+
+
+class Remesher(object):
+    """
+        Decides when to remesh the model: every 'every' steps (0 is never),
+        if the adapted mesh differs enough from the current one.
+    """
+    def __init__(self, config):
+        self.every = config.remesh_every
+        self.threshold = config.remesh_threshold
+        self.ratio = config.mesh_ratio
+        self.remeshes = 0
+
+    def due(self, step):
+        return self.every > 0 and step % self.every == 0
+
+    def adapt(self, model):
+        """ Remeshes the model if its mesh moved enough; True if it did. """
+        edge_width = None
+        if model.config.refine_edge is True:
+            edge_width = model.config.pedestal_width
+            if edge_width is None:
+                edge_width = model.pedestal_width
+
+        widths = adapted_spacing(model, self.ratio, edge_width)
+        change = numpy.max(numpy.abs(widths / numpy.diff(
+            cell_faces(model.mesh)) - 1.0))
+        if change < self.threshold:
+            return False
+
+        remesh(model, widths)
+        self.remeshes += 1
+        return True
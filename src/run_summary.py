@@ -0,0 +1,32 @@
+"""
+    This file collects the summary of a finished run, which is written as a
+    JSON file for the parameter sweeps. The pedestal height is taken as the
+    density and temperature at the core side of the domain (x = L), and the
+    edge value of Z marks whether the run ended in L-- or H--mode. The stop
+    reason says why the time loop ended (see src/stopping.py).
+"""
+
+import json
+
+from src.parallel import cell_value
+
+
+def run_summary(stepper, failure, wall_time, density, temperature, Z,
+                stop_reason=None):
+    return {
+        'converged': failure is None,
+        'failure': failure,
+        'stop_reason': stop_reason,
+        'steps': stepper.step,
+        'time': stepper.elapsed,
+        'wall_time': wall_time,
+        'pedestal_density': float(cell_value(density, -1)),
+        'pedestal_temperature': float(cell_value(temperature, -1)),
+        'Z_edge': float(cell_value(Z, 0)),
+        'steady_norm': getattr(stepper, 'steady_norm', None)
+    }
+
+
+def write_summary(filename, summary):
+    with open(filename, 'w') as summary_file:
+        json.dump(summary, summary_file, indent=4)
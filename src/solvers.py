@@ -0,0 +1,174 @@
+"""
+    This file sets the linear solver of the coupled equation from the
+    configuration: one of FiPy's solvers, with a preconditioner, tolerance and
+    iteration cap, or the direct banded solver below.
+
+    On a Grid1D mesh, every cell only couples to its neighbours, so with the
+    unknowns of each cell next to each other (interleaved, instead of FiPy's
+    ordering of one variable after another) the matrix of the coupled n-T-Z
+    system is block-tridiagonal: a band of width 2 * 3 - 1 around the
+    diagonal. LinearBandedSolver reorders the system so, and solves it
+    directly with LAPACK's banded LU (scipy.linalg.solve_banded), in O(nx)
+    operations.
+"""
+
+import numpy
+import scipy.linalg
+from scipy.sparse.linalg import LinearOperator, splu
+
+import fipy
+from fipy.solvers.scipy.scipySolver import ScipySolver
+from fipy.solvers.scipy.preconditioners.scipyPreconditioner import \
+    ScipyPreconditioner
+
+from src.parallel import processes
+
+
+# The iterative solvers of FiPy, by the names used in the configuration; the
+# PETSc suite has no BiCGSTAB
+iterative_solvers = dict(
+    (name, getattr(fipy, solver)) for name, solver in [
+        ('gmres', 'LinearGMRESSolver'), ('pcg', 'LinearPCGSolver'),
+        ('bicgstab', 'LinearBicgstabSolver'), ('cgs', 'LinearCGSSolver')]
+    if hasattr(fipy, solver))
+
+
+class LinearBandedSolver(ScipySolver):
+    """
+        Direct solver of the coupled equations on a 1D mesh: the system is
+        reordered cell by cell, and solved as a banded matrix. The solution
+        is refined with the residual while it is above the tolerance, at most
+        'iterations' times.
+    """
+    def __init__(self, tolerance=1.0e-10, iterations=3):
+        super(LinearBandedSolver, self).__init__(
+            tolerance=tolerance, iterations=iterations, precon=None)
+        self.orderings = {}
+
+    def _adaptLegacyTolerance(self, L, x, b):
+        return self._adaptInitialTolerance(L, x, b)
+
+    def _adaptUnscaledTolerance(self, L, x, b):
+        return (1., None)
+
+    def _adaptRHSTolerance(self, L, x, b):
+        return (self._rhsNorm(L, x, b), None)
+
+    def _adaptMatrixTolerance(self, L, x, b):
+        return (self._matrixNorm(L, x, b), None)
+
+    def _adaptInitialTolerance(self, L, x, b):
+        return (self._residualNorm(L, x, b), None)
+
+    def interleaving(self, size):
+        """
+            The permutation that puts the unknowns of every cell next to each
+            other: entry i of the reordered system is entry order[i] of
+            FiPy's.
+        """
+        if size not in self.orderings:
+            cells = self.var.mesh.numberOfCells
+            fields = size // cells
+            self.orderings[size] = numpy.arange(size).reshape(
+                fields, cells).T.ravel()
+        return self.orderings[size]
+
+    def banded_matrix(self, L, order):
+        """ The reordered matrix, in the banded storage of LAPACK. """
+        inverse = numpy.empty_like(order)
+        inverse[order] = numpy.arange(len(order))
+
+        # Only the nonzero entries count; e.g. the matrix of an ensemble
+        # (see ensemble.py) holds zeros between the members
+        coo = L.tocoo()
+        nonzero = coo.data != 0.0
+        rows, columns = inverse[coo.row[nonzero]], inverse[coo.col[nonzero]]
+        lower = max(int(numpy.max(rows - columns, initial=0)), 0)
+        upper = max(int(numpy.max(columns - rows, initial=0)), 0)
+
+        bands = numpy.zeros((lower + upper + 1, len(order)))
+        numpy.add.at(bands, (upper + rows - columns, columns),
+                     coo.data[nonzero])
+        return (lower, upper), bands
+
+    def _solve_(self, L, x, b):
+        tolerance_scale, _ = self._adaptTolerance(L, x, b)
+        order = self.interleaving(len(b))
+        widths, bands = self.banded_matrix(L, order)
+
+        for iteration in range(max(self.iterations, 1)):
+            residual_vector, residual = self._residualVectorAndNorm(L, x, b)
+            if residual <= self.tolerance * tolerance_scale:
+                break
+
+            correction = scipy.linalg.solve_banded(
+                widths, bands, residual_vector[order], overwrite_b=True,
+                check_finite=False)
+            x[order] -= correction
+
+        self._setConvergence(suite="scipy", code=0, iterations=iteration + 1,
+                             residual=residual)
+        self.convergence.warn()
+
+        return x
+
+
+class BlockJacobiPreconditioner(ScipyPreconditioner):
+    """
+        Preconditions with the diagonal block of every field (e.g. the
+        density rows and columns), each factorized exactly. The couplings
+        between the fields are left to the iterative solver.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+
+    def _applyToMatrix(self, matrix):
+        matrix = matrix.tocsr()
+        size = matrix.shape[0] // self.fields
+        blocks = [splu(matrix[k * size:(k + 1) * size,
+                              k * size:(k + 1) * size].tocsc())
+                  for k in range(self.fields)]
+
+        def solve(vector):
+            vector = numpy.ravel(vector)
+            return numpy.concatenate([
+                block.solve(vector[k * size:(k + 1) * size])
+                for k, block in enumerate(blocks)])
+
+        return LinearOperator(matrix.shape, solve), matrix
+
+
+def make_solver(config, fields=3):
+    """
+        The linear solver chosen in the configuration, for a coupled system
+        of 'fields' variables.
+    """
+    if config.solver == 'banded':
+        return LinearBandedSolver(tolerance=config.solver_tolerance)
+    if config.solver == 'lu':
+        return fipy.LinearLUSolver(tolerance=config.solver_tolerance)
+    if config.solver not in iterative_solvers:
+        print("The " + config.solver + " solver is not in the "
+              + fipy.solvers.solver_suite + " suite of FiPy; solving with "
+              "gmres.")
+        config.solver = 'gmres'
+
+    if config.preconditioner == 'ilu' and processes() > 1 \
+            and fipy.solvers.solver_suite == 'petsc':
+        # PETSc's ILU needs the whole matrix; its default is ILU on the
+        # block of every process (block Jacobi)
+        from fipy.solvers.petsc.preconditioners.defaultPreconditioner \
+            import DefaultPreconditioner
+        preconditioner = DefaultPreconditioner()
+    elif config.preconditioner == 'ilu':
+        preconditioner = fipy.ILUPreconditioner()
+    elif config.preconditioner == 'jacobi':
+        preconditioner = fipy.JacobiPreconditioner()
+    elif config.preconditioner == 'block_jacobi':
+        preconditioner = BlockJacobiPreconditioner(fields)
+    else:
+        preconditioner = None
+
+    return iterative_solvers[config.solver](
+        tolerance=config.solver_tolerance,
+        iterations=config.solver_iterations, precon=preconditioner)
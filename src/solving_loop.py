@@ -0,0 +1,285 @@
+"""
+    This file does the solving and viewing of a built model: the plotting,
+    the saving of files, and the time loop. It is shared by both models,
+    which differ in their plots and the variables saved in the TSV files.
+"""
+
+import os  # For saving files to a specified directory
+import time
+from shutil import copyfile
+
+from fipy import TSVViewer
+
+from src.input_handling import pause
+from src.time_stepping import TimeStepper, TimeStepError, solve_time_step,\
+    sweep_to_tolerance, write_convergence_history
+from src.newton import NewtonIteration
+from src.steady_state import SteadyStepper
+from src.stopping import StoppingCriteria
+from src.remeshing import Remesher
+from src.run_summary import run_summary, write_summary
+from src.output import TimeSeriesWriter
+from src.plotting import AsyncPlotter
+from src.profiling import Profiler, phase
+from src.calculate_coeffs import tsv_coefficients
+from src.checkpoint import CheckpointSchedule, write_checkpoint, \
+    read_checkpoint, restore_checkpoint
+from src.parallel import is_root
+
+
+def saving_files(config):
+    """ Are any files (plots, TSVs, ...) saved during the run? """
+    return (hasattr(config, 'save_directory') and
+            (getattr(config, 'save_plots', False) is True or
+             getattr(config, 'save_TSVs', False) is True or
+             getattr(config, 'save_output', False) is True or
+             checkpointing(config)))
+
+
+def checkpointing(config):
+    """ Are checkpoints written during the run? """
+    return (getattr(config, 'checkpoint_every', 0) > 0 or
+            getattr(config, 'checkpoint_wall', 0.0) > 0.0)
+
+
+def start_plotting(model):
+    """
+        Starts the plotting of the model in its own process, with the
+        initial conditions. The plots are saved if the configuration says so.
+    """
+    config = model.config
+    save_directory = None
+    if config.save_plots is True:
+        save_directory = config.save_directory
+
+    plotter = AsyncPlotter(model, config.plot_every,
+                           save_directory=save_directory)
+    plotter.submit(None)
+    pause("Pause for Viewing Initial Conditions", config.batch_mode)
+    if config.aux_plots is True:
+        pause("Pause for Viewing Initial Auxiliary Plots", config.batch_mode)
+
+    return plotter
+
+
+def tsv_variables(model):
+    """ The variables saved in the TSV file of every step. """
+    if model.config.taylor_model is True:
+        return (model.density, model.temperature, model.Z, model.Diffusivity)
+
+    return (model.density, model.temperature, model.Z, model.Diffusivity) \
+        + tuple(model.variable_dictionary[name] for name in tsv_coefficients)
+
+
+def output_variables(model):
+    """
+        The variables of the time series; the cell centers are one of them
+        if the mesh is adapted during the run.
+    """
+    variables = dict((name, model.variable_dictionary[name])
+                     for name in model.config.output_vars)
+    if model.config.remesh_every > 0:
+        variables['x'] = model.x
+    return variables
+
+
+def run_model(model, restart=None):
+    """
+        Runs the time loop of the model, with the plotting and saving chosen
+        in its configuration. If 'restart' is the file name of a checkpoint,
+        the run continues from there. Returns the exit status: 0 if the run
+        completed, 1 if a time step failed.
+    """
+    config = model.config
+
+    if config.profile is True:
+        model.profiler = Profiler()
+        model.profiler.instrument_solver(model.solver)
+        model.profiler.watch_cache(model.cache)
+
+    if config.steady_state is True:
+        stepper = SteadyStepper(config, model)
+    else:
+        stepper = TimeStepper(config)
+    # The convergence records of all steps, including those before a restart
+    convergence_history = []
+    if restart is not None:
+        convergence_history = restore_checkpoint(model, stepper,
+                                                 read_checkpoint(restart))
+        print("Restarted from " + str(restart) + " at step "
+              + str(stepper.step) + ", time " + str(stepper.elapsed))
+
+    # Start on a mesh adapted to the initial conditions
+    remesher = Remesher(config)
+    if restart is None and remesher.every > 0:
+        remesher.adapt(model)
+
+    # File writing
+    # (by process 0 only, in a parallel run)
+    if saving_files(config) and is_root():
+        if not os.path.exists(os.path.join(os.getcwd(),
+                                           config.save_directory)):
+            os.makedirs(os.path.join(os.getcwd(), config.save_directory))
+            print("Directory created: " + str(config.save_directory))
+        if hasattr(config, '__file__'):
+            copyfile(config.__file__, config.save_directory + "/"
+                     + os.path.basename(config.__file__))
+        pause("Pause set for writing to file...", config.batch_mode)
+
+    # Plotting, off the time loop
+    if config.generate_plots is True:
+        plotter = start_plotting(model)
+
+    # Binary time series, starting with the initial values
+    if config.save_output is True:
+        writer = TimeSeriesWriter(
+            config.save_directory + "/time_series", output_variables(model),
+            config.output_every,
+            resume_step=None if restart is None else stepper.step)
+        if config.remesh_every == 0:
+            writer.save_cell_centers(model.x)
+        if restart is None:
+            writer.append(0, 0.0)
+
+    if checkpointing(config):
+        checkpoint_file = config.save_directory + "/checkpoint.dump"
+        schedule = CheckpointSchedule(config.checkpoint_every,
+                                      config.checkpoint_wall)
+
+    # Picard sweeps, or Newton's method
+    if config.nonlinear_solver == "newton":
+        iterate = NewtonIteration(model)
+    else:
+        iterate = sweep_to_tolerance
+
+    # ----------------- Time Loop -------------------------
+    wall_start = time.time()
+    stopping = StoppingCriteria(config, model)
+    failure = None
+    stop_reason = None
+    while stepper.running():
+        t = stepper.step
+
+        # Update values
+        with phase(model, "update old"):
+            model.update_old()
+        with phase(model, "diffusivity"):
+            model.update_diffusivity()
+        with phase(model, "coefficients"):
+            model.update_coeffs()
+
+        # --------------- Solving Loop --------------------
+        try:
+            with phase(model, "solve"):
+                convergence_history.append(solve_time_step(
+                    model.full_equation, model.state_variables(), stepper,
+                    model.solver, config, iterate))
+        except TimeStepError as error:
+            failure = str(error)
+            break
+
+        # "Turn on" NBI
+#        if t == 50:
+#            config.Gamma_c = 1.0e1*config.Gamma_c
+#            config.q_c = 5.0e2*config.Gamma_c
+#            model.set_boundary_values(config.Gamma_c, config.q_c)
+
+        # Plot solution and save, if option is True
+        if config.generate_plots is True:
+            with phase(model, "plotting"):
+                plotter.submit(t)
+
+        # Save TSV's (FiPy's TSVViewer gathers the values on every process,
+        # and only process 0 writes the file)
+        if config.save_TSVs is True:
+            with phase(model, "output"):
+                TSVViewer(vars=tsv_variables(model))\
+                    .plot(filename=config.save_directory + "/"
+                          + str(t).zfill(4) + ".tsv")
+
+        # Save the time series
+        if config.save_output is True:
+            with phase(model, "output"):
+                writer.append(stepper.step, stepper.elapsed)
+
+        # Move the cells to the steep gradients; what holds on to the
+        # variables of the old mesh is set up again
+        if remesher.due(stepper.step):
+            with phase(model, "remesh"):
+                if remesher.adapt(model):
+                    if config.nonlinear_solver == "newton":
+                        iterate = NewtonIteration(model)
+                    if config.generate_plots is True:
+                        plotter.remeshed(model)
+                    if config.save_output is True:
+                        writer.variables = output_variables(model)
+
+        # Write a checkpoint
+        if checkpointing(config) and schedule.due(stepper.step):
+            with phase(model, "checkpoint"):
+                write_checkpoint(model, stepper, checkpoint_file,
+                                 convergence_history)
+            schedule.written()
+
+        if model.profiler is not None:
+            model.profiler.end_step(convergence_history[-1])
+
+        # Stop early, e.g. once the profiles stopped changing
+        stop_reason = stopping.check(convergence_history[-1]['dt'])
+        if stop_reason is not None:
+            print("Stopping after step " + str(t) + ": " + stop_reason)
+            break
+
+    if config.save_output is True:
+        writer.close()
+
+    if remesher.remeshes > 0:
+        print("The mesh was adapted " + str(remesher.remeshes) + " times.")
+
+    if (config.steady_state is True and failure is None and
+            stop_reason is None and not stepper.steady()):
+        failure = ("No steady state was reached: the steady-state residual "
+                   "is {:.6e}".format(stepper.steady_norm))
+
+    if failure is not None:
+        stop_reason = 'failed'
+    elif stop_reason is None and config.steady_state is True:
+        stop_reason = 'steady_state'
+    elif stop_reason is None:
+        stop_reason = 'completed'
+
+    # The final state, e.g. to branch other runs off
+    if checkpointing(config) and failure is None:
+        write_checkpoint(model, stepper, checkpoint_file,
+                         convergence_history)
+
+    # Per-step convergence record
+    if saving_files(config) and is_root():
+        write_convergence_history(convergence_history, config.save_directory
+                                  + "/convergence.tsv")
+
+    # Summary of the run, e.g. for parameter sweeps
+    # (gathered on every process, as the values at the edge are global)
+    if config.summary_file is not None:
+        summary = run_summary(stepper, failure, time.time() - wall_start,
+                              model.density, model.temperature, model.Z,
+                              stop_reason)
+        if is_root():
+            write_summary(config.summary_file, summary)
+
+    # Where the time of the steps went
+    if model.profiler is not None:
+        model.profiler.report()
+        if config.profile_file is not None and is_root():
+            model.profiler.write(config.profile_file)
+
+    if failure is not None:
+        print(failure)
+    else:
+        pause(" <=============== End of Program. Press any key to continue. "
+              "===============> ", config.batch_mode)
+
+    if config.generate_plots is True:
+        plotter.close()
+
+    return 0 if failure is None else 1
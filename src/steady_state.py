@@ -0,0 +1,167 @@
+"""
+    This file finds the steady state of a model directly, instead of
+    marching total_timeSteps and hoping it settled. A SteadyStepper takes the
+    place of the TimeStepper in the time loop, and goes through up to three
+    modes:
+
+      'direct'     Steps with a huge time step, i.e. solves of the
+                   time-independent equations (Newton's method is needed for
+                   this to converge, except on easy problems). The time does
+                   not advance in these steps.
+      'pseudo'     If that fails: pseudo-transient continuation from the
+                   initial state. Starting from timeStep, the time step
+                   follows the steady-state residual (switched evolution
+                   relaxation, dt ~ 1 / residual): it grows as the residual
+                   falls (by at least dt_grow after a step of at most
+                   grow_sweeps iterations), until the steps are large
+                   enough to converge like the direct solve, and shrinks
+                   when it rises, e.g. through the L--H transition. A step
+                   that raises the residual by more than max_pseudo_rise is
+                   rolled back, and retried with a smaller time step.
+      'transient'  If the pseudo-transient steps fail at dt_min, or the
+                   steady state is not reached in steady_max_steps steps: real
+                   time stepping with timeStep, for total_timeSteps steps (or
+                   total_time), from the last state.
+
+    In every mode the run stops as soon as the steady-state residual is below
+    steady_tol. The residual is that of the equations without the transient
+    terms, with every row scaled by its diagonal and by the size of its
+    variable, so it is the relative correction of one Jacobi sweep of the
+    steady equations.
+"""
+
+import numpy
+
+from src.time_stepping import TimeStepper
+
+
+# The time step that makes the transient terms vanish
+steady_dt = 1.0e100
+
+# The largest growth (and cut) of the pseudo time step per step
+max_pseudo_growth = 10.0
+
+# The largest rise of the steady-state residual in an accepted pseudo step
+max_pseudo_rise = 2.0
+
+
+def steady_residual(model):
+    """ The scaled residual of the time-independent equations. """
+    model.refresh_constraints()
+    model.update_diffusivity()
+    model.update_coeffs()
+
+    equation = model.full_equation
+    equation.cacheMatrix()
+    residual = numpy.asarray(equation.justResidualVector(dt=steady_dt,
+                                                         solver=model.solver))
+
+    diagonal = numpy.abs(equation.matrix.matrix.diagonal())
+    diagonal[diagonal == 0.0] = 1.0
+    scale = numpy.concatenate([
+        numpy.full(model.mesh.numberOfCells,
+                   max(numpy.max(numpy.abs(variable.value)), 1.0))
+        for variable in model.state_variables()])
+
+    return float(numpy.max(numpy.abs(residual / (diagonal * scale))))
+
+
+class SteadyStepper(TimeStepper):
+    def __init__(self, config, model):
+        super(SteadyStepper, self).__init__(config)
+        self.model = model
+        self.steady_tol = config.steady_tol
+        self.steady_max_steps = config.steady_max_steps
+
+        self.mode = 'direct'
+        self.dt = steady_dt
+        self.steady_norm = numpy.inf
+        self.step_norm = numpy.inf      # Of the last converged attempt
+        self.pseudo_steps = 0
+        self.transient_time = 0.0       # Time at the switch to real time
+                                        # stepping
+
+    def steady(self):
+        return self.steady_norm < self.steady_tol
+
+    def running(self):
+        if self.steady():
+            return False
+        if self.mode != 'transient':
+            return True
+        if self.adaptive is True:
+            return (self.elapsed - self.transient_time
+                    < self.total_time * (1.0 - 1.0e-12))
+        return super(SteadyStepper, self).running()
+
+    def next_dt(self):
+        if self.mode == 'transient' and self.adaptive is True:
+            # Do not step past the end of the real time stepping
+            return min(self.dt, self.total_time
+                       - (self.elapsed - self.transient_time))
+        if self.mode == 'transient':
+            return super(SteadyStepper, self).next_dt()
+        return self.dt
+
+    def switch_mode(self, mode):
+        print("Steady state: switching from the " + self.mode
+              + " solve to " + {'pseudo': "pseudo-transient continuation",
+                                'transient': "real time stepping"}[mode])
+        self.mode = mode
+        self.dt = min(max(self.timeStep, self.dt_min), self.dt_max)
+        if mode == 'transient':
+            self.transient_time = self.elapsed
+            self.covered = 0.0
+
+    def verify(self, dt):
+        """ Rejects a pseudo step that raised the residual too much. """
+        self.step_norm = steady_residual(self.model)
+        if (self.mode == 'pseudo' and self.dt > self.dt_min and
+                not self.step_norm <= max_pseudo_rise * self.steady_norm):
+            print("Steady-state residual: {:.6e} (rejected)"
+                  .format(self.step_norm))
+            return 'residual_rose'
+        return 'converged'
+
+    def accept(self, dt, sweeps):
+        previous_norm = self.steady_norm
+        self.steady_norm = self.step_norm
+        print("Steady-state residual: {:.6e} ({:s})"
+              .format(self.steady_norm, self.mode))
+
+        if self.mode == 'transient':
+            super(SteadyStepper, self).accept(dt, sweeps)
+            return
+
+        self.step += 1
+        self.pseudo_steps += 1
+        if self.mode == 'pseudo':
+            self.elapsed += dt
+            # Switched evolution relaxation, which also cuts the time step
+            # when the residual rose; while it falls, an easy step grows
+            # the time step by at least dt_grow
+            growth = previous_norm / max(self.steady_norm, 1.0e-300)
+            if growth > 1.0 and sweeps <= self.grow_sweeps:
+                growth = max(growth, self.dt_grow)
+            if numpy.isfinite(growth):
+                self.dt = max(self.dt * min(max(
+                    growth, 1.0 / max_pseudo_growth), max_pseudo_growth),
+                    self.dt_min)
+
+        if self.pseudo_steps >= self.steady_max_steps and not self.steady():
+            self.switch_mode('transient')
+
+    def reject(self):
+        # The steady-state residual of the rejected attempt updated the
+        # Diffusivity and coefficients; back to the ones of the old values
+        self.model.update_diffusivity()
+        self.model.update_coeffs()
+
+        if self.mode == 'direct':
+            self.switch_mode('pseudo')
+        elif self.mode == 'pseudo' and self.dt <= self.dt_min:
+            self.switch_mode('transient')
+        elif self.mode == 'pseudo':
+            self.dt = max(self.dt * self.dt_shrink, self.dt_min)
+        else:
+            super(SteadyStepper, self).reject()
@@ -0,0 +1,69 @@
+"""
+    This file decides when a run can stop before its total_timeSteps (or
+    total_time). After every step, the criteria of the configuration are
+    checked, and the first one that holds ends the run:
+
+      'steady'      The relative change of density, temperature and Z per
+                    unit time, max|u - u_old| / (max|u| * dt), is below
+                    stop_change_rate for all three: the profiles stopped
+                    changing. Not used in the steady-state mode, which has
+                    its own criterion.
+      'Z_threshold' Z at the edge crossed stop_Z_edge, from the side it
+                    started on, e.g. the L--H transition happened.
+      'wall_time'   The run took stop_wall_time seconds of wall-clock time.
+
+    The reason the run stopped is kept in the summary of the run: one of
+    these, 'completed' if it ran to the end, 'steady_state' if the
+    steady-state mode converged, or 'failed'.
+"""
+
+import time
+import numpy
+
+from src.parallel import root_decision, global_max, cell_value
+
+
+class StoppingCriteria(object):
+    def __init__(self, config, model):
+        self.model = model
+        self.change_rate = config.stop_change_rate
+        if config.steady_state is True:
+            self.change_rate = 0.0
+        self.Z_edge = config.stop_Z_edge
+        self.wall_time = config.stop_wall_time
+        self.wall_start = time.time()
+
+        # The side of the threshold Z starts on
+        self.Z_side = None
+        if self.Z_edge is not None:
+            self.Z_side = numpy.sign(cell_value(model.Z, 0) - self.Z_edge)
+
+    def relative_change(self, dt):
+        """
+            The largest relative change per unit time of the state variables
+            over the last step, of size dt.
+        """
+        changes = []
+        for variable in self.model.state_variables():
+            value = numpy.asarray(variable.value)
+            scale = max(global_max(numpy.max(numpy.abs(value))), 1.0e-300)
+            changes.append(global_max(numpy.max(numpy.abs(
+                value - numpy.asarray(variable.old.value)))) / (scale * dt))
+        return max(changes)
+
+    def check(self, dt):
+        """ The reason to stop after a step of size dt, or None. """
+        if self.change_rate > 0.0 and \
+                self.relative_change(dt) < self.change_rate:
+            return 'steady'
+
+        if self.Z_side is not None and self.Z_side != 0.0 and \
+                numpy.sign(cell_value(self.model.Z, 0) - self.Z_edge) \
+                != self.Z_side:
+            return 'Z_threshold'
+
+        if self.wall_time > 0.0 and root_decision(
+                time.time() - self.wall_start >= self.wall_time):
+            return 'wall_time'
+
+        return None
@@ -0,0 +1,202 @@
+"""
+    This file contains the control of the time step for the solving loops.
+
+    With a fixed time step, the loop runs 'total_timeSteps' steps of size
+    'timeStep', i.e. up to the time total_timeSteps * timeStep: a step that
+    had to be retried with a smaller time step covers less than one step, so
+    the run takes more steps. With 'adaptive_timeStep' set, it runs until the
+    physical time 'total_time' is reached instead. The time step then grows
+    by 'dt_grow' after a step that converged within 'grow_sweeps' sweeps. It
+    is always kept inside of the interval [dt_min, dt_max].
+
+    The sweeps of every step are bounded: a step fails if it does not
+    converge within 'max_sweeps' sweeps, if the residual is not finite or
+    grows by more than 'divergence_factor' over the smallest one so far, or
+    if the last 'stall_sweeps' sweeps did not reduce it below 'stall_factor'
+    times the smallest residual before them, or if the linear solver fails.
+    A failed step is rolled back to the old values and retried with the time
+    step cut by 'dt_shrink', in both fixed and adaptive stepping.
+"""
+
+import math
+from numpy.linalg import LinAlgError
+
+
+class TimeStepError(RuntimeError):
+    """
+        Raised when a step cannot be completed with the smallest allowed
+        time step.
+    """
+    pass
+
+
+class TimeStepper(object):
+    def __init__(self, config):
+        self.adaptive = config.adaptive_timeStep
+        self.total_timeSteps = config.total_timeSteps
+        self.total_time = config.total_time
+        self.timeStep = config.timeStep
+
+        self.dt_min = config.dt_min
+        self.dt_max = config.dt_max
+        self.dt_grow = config.dt_grow
+        self.dt_shrink = config.dt_shrink
+        self.grow_sweeps = config.grow_sweeps
+        self.max_sweeps = config.max_sweeps
+
+        if self.adaptive is True:
+            self.dt = min(max(config.timeStep, self.dt_min), self.dt_max)
+        else:
+            self.dt = config.timeStep
+
+        self.step = 0           # Number of completed time steps
+        self.elapsed = 0.0      # Physical time reached
+        self.covered = 0.0      # Time reached in steps of timeStep (fixed)
+
+    def running(self):
+        """ Should another time step be taken? """
+        if self.adaptive is True:
+            return self.elapsed < self.total_time * (1.0 - 1.0e-12)
+        return self.covered < self.total_timeSteps - 1.0e-9
+
+    def next_dt(self):
+        """ The time step size of the next attempt. """
+        if self.adaptive is True:
+            # Do not step past the end time
+            return min(self.dt, self.total_time - self.elapsed)
+        # ... nor past the last fixed step, after retried steps
+        return min(self.dt, (self.total_timeSteps - self.covered)
+                   * self.timeStep)
+
+    def restore(self, step, elapsed, dt):
+        """ Continues from the step and time of a checkpoint. """
+        self.step = step
+        self.elapsed = elapsed
+        self.dt = dt
+        # Whole steps, up to the round-off of the sum of the steps
+        self.covered = elapsed / self.timeStep
+        if abs(self.covered - round(self.covered)) < 1.0e-6:
+            self.covered = float(round(self.covered))
+
+    def verify(self, dt):
+        """
+            The status of a step of size dt whose iteration converged; a
+            stepper can still reject it (see SteadyStepper).
+        """
+        return 'converged'
+
+    def accept(self, dt, sweeps):
+        """ Records a completed step of size dt that took 'sweeps' sweeps. """
+        self.step += 1
+        self.elapsed += dt
+
+        if self.adaptive is True:
+            if sweeps <= self.grow_sweeps:
+                self.dt = min(self.dt * self.dt_grow, self.dt_max)
+        else:
+            # Go back to the fixed step after a retried one
+            self.covered += dt / self.timeStep
+            self.dt = self.timeStep
+
+    def reject(self):
+        """ Cuts the time step after a failed attempt. """
+        if self.dt <= self.dt_min:
+            raise TimeStepError("The sweeps did not converge at time "
+                                + str(self.elapsed) + " with the smallest "
+                                "time step " + str(self.dt_min))
+        self.dt = max(self.dt * self.dt_shrink, self.dt_min)
+
+
+def sweep_to_tolerance(equation, dt, solver, config, elapsed=0.0):
+    """
+        Sweeps the (coupled) equation until the residual drops below
+        config.res_tol. Returns the status of the sweeps ('converged',
+        'max_sweeps', 'diverged', 'stalled' or 'solver_failed'), the number
+        of sweeps, and the final residual.
+    """
+    residuals = []
+
+    while len(residuals) == 0 or residuals[-1] > config.res_tol:
+        if len(residuals) >= config.max_sweeps:
+            return 'max_sweeps', len(residuals), residuals[-1]
+
+        # E.g. an ILU preconditioner of a (nearly) singular matrix
+        try:
+            current_residual = equation.sweep(dt=dt, solver=solver)
+        except (RuntimeError, ArithmeticError, LinAlgError):
+            return 'solver_failed', len(residuals) + 1, math.inf
+        residuals.append(float(current_residual))
+
+        if config.verbose_sweeps is True:
+            print("time = {:.6e}, dt = {:.3e}, residual = {:.6e}"
+                  .format(elapsed, dt, current_residual))
+
+        # Divergence: a residual that is not finite, or has grown too much
+        if (not math.isfinite(residuals[-1]) or residuals[-1] >
+                config.divergence_factor * min(residuals)):
+            return 'diverged', len(residuals), residuals[-1]
+
+        # Stagnation: the last sweeps did not reduce the residual enough
+        if (len(residuals) > config.stall_sweeps and
+                residuals[-1] > config.res_tol and
+                min(residuals[-config.stall_sweeps:]) >
+                config.stall_factor * min(residuals[:-config.stall_sweeps])):
+            return 'stalled', len(residuals), residuals[-1]
+
+    return 'converged', len(residuals), residuals[-1]
+
+
+def restore_old(*variables):
+    """ Resets the variables to the values of the last updateOld(). """
+    for variable in variables:
+        variable.setValue(variable.old)
+
+
+def solve_time_step(equation, variables, stepper, solver, config,
+                    iterate=sweep_to_tolerance):
+    """
+        Takes one time step of the (coupled) equation, starting from the
+        values after the last updateOld() of the variables. The nonlinear
+        iteration is 'iterate': the Picard sweeps of sweep_to_tolerance(), or
+        e.g. a Newton iteration with the same call and return values. A
+        failed attempt is rolled back and retried with a smaller time step,
+        until the stepper gives up with a TimeStepError. Returns the
+        convergence record of the step.
+    """
+    retries = 0
+    status = None
+
+    while status != 'converged':
+        dt = stepper.next_dt()
+        status, sweeps, current_residual = iterate(
+            equation, dt, solver, config, stepper.elapsed)
+        if status == 'converged':
+            status = stepper.verify(dt)
+
+        if status != 'converged':
+            print("Step " + str(stepper.step) + " " + status + " after "
+                  + str(sweeps) + " sweeps with dt = " + str(dt)
+                  + "; retrying.")
+            restore_old(*variables)
+            stepper.reject()
+            retries += 1
+
+    stepper.accept(dt, sweeps)
+
+    record = {'step': stepper.step - 1, 'time': stepper.elapsed, 'dt': dt,
+              'sweeps': sweeps, 'residual': current_residual,
+              'retries': retries}
+    print("Step {step}: time = {time:.6e}, dt = {dt:.3e}, sweeps = {sweeps}, "
+          "residual = {residual:.6e}".format(**record))
+
+    return record
+
+
+def write_convergence_history(records, filename):
+    """ Writes the convergence records of all steps as a TSV file. """
+    keys = ['step', 'time', 'dt', 'sweeps', 'residual', 'retries']
+    with open(filename, 'w') as history_file:
+        history_file.write("\t".join(keys) + "\n")
+        for record in records:
+            history_file.write("\t".join(str(record[key]) for key in keys)
+                               + "\n")
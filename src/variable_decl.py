@@ -1,122 +1,164 @@
 """
     This file generates the 1D mesh and the 4 cell state variables needed for
-    the model (including Diffusivity).
+    the model (including Diffusivity), as attributes of the model, and the
+    coefficients of the flux model the run uses (see declared_coefficients()
+    in calculate_coeffs.py). The mesh is uniform, or graded (mesh_grading =
+    "tanh") with its smallest cells at the pedestal and the edge, which needs
+    far fewer cells for the same resolution there.
 
     **It may be that Diffusivity should be declared as a FaceVariable.  It
     must be adjusted to the correct size when using it to calculate different
     values.**
 """
 
+import numpy
 from fipy import Grid1D, CellVariable
-from fipy.tools import numerix, dump
-from src.parameters import *
-
-
-# ----------------- Mesh Generation -----------------------
-mesh = Grid1D(nx=config.nx, Lx=L)
-
-x = mesh.cellCenters[0]  # Cell position
-X = mesh.faceCenters[0]  # Face position, if needed
-
-
-# -------------- State Variable Declarations --------------
-density = CellVariable(name=r"$n$", mesh=mesh, hasOld=True)
-
-temperature = CellVariable(name=r"$T$", mesh=mesh, hasOld=True)
-
-U = CellVariable(name=r"$U$", mesh=mesh, hasOld=True)
-
-Z = CellVariable(name=r"$Z$", mesh=mesh, hasOld=True)
-
-Diffusivity = CellVariable(name=r"$D$", mesh=mesh, hasOld=True)
-
-U.setValue(density * temperature / (gamma - 1.0))
-
-
-# -------------- Other Variable Declarations --------------
-# Thermal velocities (most probable)
-v_Ti = CellVariable(name=r"$v_{th,i}$", mesh=mesh)
-v_Te = CellVariable(name=r"$v_{th,e}$", mesh=mesh)
-
-# Neutrals density in use for CX friction
-n_0 = CellVariable(name=r"$n_0$", mesh=mesh)
-
-# Poloidal gyro-(Larmor) radii
-rho_pi = CellVariable(name=r"$\rho_{\theta i}$", mesh=mesh)
-rho_pe = CellVariable(name=r"$\rho_{\theta e}$", mesh=mesh)
-
-# Banana orbit bounce frequencies
-omega_bi = CellVariable(name=r"$\omega_{bi}$", mesh=mesh)
-omega_be = CellVariable(name=r"$\omega_{be}$", mesh=mesh)
-
-# Banana width
-w_bi = CellVariable(name=r"$w_{bi}$", mesh=mesh)
-
-# Transit frequency
-omega_t = CellVariable(name=r"$\omega_t$", mesh=mesh)
-
-# Collision Frequencies
-nu_ei = CellVariable(name=r"$\nu_{ei}$", mesh=mesh)
-nu_ii = CellVariable(name=r"$\nu_{ii}$", mesh=mesh)
-
-# Collisionalities
-nu_ai = CellVariable(name=r"$\nu_{*i}$", mesh=mesh)
-nu_ae = CellVariable(name=r"$\nu_{*e}$", mesh=mesh)
-
-# Electron Anomalous Diffusion
-D_an = CellVariable(name=r"$D_{an}$", mesh=mesh)
-g_n_an = CellVariable(name=r"$g_n^{an}$", mesh=mesh)
-g_T_an = CellVariable(name=r"$g_T^{an}$", mesh=mesh)
-g_Z_an = CellVariable(name=r"$g_Z^{an}$", mesh=mesh)
-Gamma_an = CellVariable(name=r"$\Gamma_e^{an}$", mesh=mesh)
-
-# Charge Exchange Friction
-ionization_rate = CellVariable(name=r"$\langle\sigma_{ion} v\rangle$",
-                               mesh=mesh)
-cx_rate = CellVariable(name=r"$\langle\sigma_{cx} v\rangle$",
-                       mesh=mesh)
-g_n_cx = CellVariable(name=r"$g_n^{cx}$", mesh=mesh)
-g_T_cx = CellVariable(name=r"$g_T^{cx}$", mesh=mesh)
-g_Z_cx = CellVariable(name=r"$g_Z^{cx}$", mesh=mesh)
-Gamma_cx = CellVariable(name=r"$\Gamma_i^{cx}$", mesh=mesh)
-
-# Ion Bulk (Parallel) Viscosity
-plasma_disp = CellVariable(name=r"$X$", mesh=mesh)
-D_bulk = CellVariable(name=r"$D_{\pi\parallel}$", mesh=mesh)
-Gamma_bulk = CellVariable(name=r"$\Gamma_i^{\pi\parallel}$", mesh=mesh)
-
-# Ion Orbit Loss
-g_ol = CellVariable(name=r"$g^{ol}$", mesh=mesh)
-Gamma_ol = CellVariable(name=r"$\Gamma_i^{ol}$", mesh=mesh)
-
-
-variable_dictionary = {
-    'x': x, 'density': density, 'temperature': temperature, 'Z': Z,
-    'Diffusivity': Diffusivity, 'n_0': n_0, 'v_Ti': v_Ti, 'v_Te': v_Te,
-    'rho_pi': rho_pi, 'rho_pe': rho_pe, 'omega_bi': omega_bi,
-    'omega_be': omega_be, 'w_bi': w_bi, 'omega_t': omega_t, 'nu_ei': nu_ei,
-    'nu_ii': nu_ii, 'nu_ai': nu_ai, 'nu_ae': nu_ae,
-    'ionization_rate': ionization_rate, 'cx_rate': cx_rate,
-    'D_an': D_an, 'g_n_an': g_n_an, 'g_T_an': g_T_an, 'g_Z_an': g_Z_an,
-    'Gamma_an': Gamma_an, 'g_n_cx': g_n_cx, 'g_T_cx': g_T_cx,
-    'g_Z_cx': g_Z_cx, 'Gamma_cx': Gamma_cx, 'g_ol': g_ol,
-    'Gamma_ol': Gamma_ol, 'D_bulk': D_bulk, 'Gamma_bulk': Gamma_bulk,
-    'plasma_disp': plasma_disp
+from src.parameters import gamma
+from src.calculate_coeffs import requested_coefficients, \
+    coefficient_closure, declared_coefficients
+
+
+# ----------------- Graded Mesh ---------------------------
+def graded_spacing(nx, L, center, width, ratio, refine_edge):
+    """
+        Returns the widths of nx cells over [0, L], clustered around the
+        pedestal at 'center' (and around the edge at x = 0, if refine_edge):
+        the cells are 'ratio' times smaller there than far from it, and grow
+        smoothly over about 'width'. The density of the cells is
+        1 + (ratio - 1) / cosh^2((x - center) / (width / 2)), plus the same
+        term at x = 0, and its integral (in terms of tanh) is inverted at nx
+        equal parts.
+    """
+    half_width = 0.5 * width
+    centers = [center, 0.0] if refine_edge is True else [center]
+
+    def cumulative(x):
+        return x + sum((ratio - 1.0) * half_width * (
+            numpy.tanh((x - c) / half_width) - numpy.tanh(-c / half_width))
+            for c in centers)
+
+    x_fine = numpy.linspace(0.0, L, 64 * nx + 1)
+    faces = numpy.interp(numpy.linspace(0.0, cumulative(L), nx + 1),
+                         cumulative(x_fine), x_fine)
+    faces[0], faces[-1] = 0.0, L
+    return numpy.diff(faces)
+
+
+def declare_variables(model, mesh=None):
+    """
+        Declares the mesh and the variables of the model. If 'mesh' is
+        given, the variables are declared on it instead of the mesh of the
+        configuration, e.g. when the model is remeshed.
+    """
+    config = model.config
+
+    # ----------------- Mesh Generation -----------------------
+    if mesh is not None:
+        model.mesh = mesh
+    elif config.mesh_grading == "tanh":
+        center, width = config.pedestal_location, config.pedestal_width
+        if center is None:
+            center = model.pedestal_location
+        if width is None:
+            width = model.pedestal_width
+        model.mesh = mesh = Grid1D(dx=graded_spacing(
+            config.nx, model.L, center, width, config.mesh_ratio,
+            config.refine_edge))
+    else:
+        model.mesh = mesh = Grid1D(nx=config.nx, Lx=model.L)
+
+    model.x = mesh.cellCenters[0]  # Cell position
+    model.X = mesh.faceCenters[0]  # Face position, if needed
+
+    # -------------- State Variable Declarations --------------
+    model.density = CellVariable(name=r"$n$", mesh=mesh, hasOld=True)
+
+    model.temperature = CellVariable(name=r"$T$", mesh=mesh, hasOld=True)
+
+    model.U = CellVariable(name=r"$U$", mesh=mesh, hasOld=True)
+
+    model.Z = CellVariable(name=r"$Z$", mesh=mesh, hasOld=True)
+
+    model.Diffusivity = CellVariable(name=r"$D$", mesh=mesh, hasOld=True)
+
+    model.U.setValue(model.density * model.temperature / (gamma - 1.0))
+
+    # -------------- Other Variable Declarations --------------
+    # Only the coefficients the run uses, see requested_coefficients()
+    model.computed_coefficients = set(coefficient_closure(
+        requested_coefficients(config)))
+    for name in declared_coefficients(config):
+        setattr(model, name, CellVariable(name=coefficient_labels[name],
+                                          mesh=mesh))
+
+    model.variable_dictionary = dict(
+        (name, getattr(model, name)) for name in variable_names
+        if hasattr(model, name))
+
+    # Remove entire entry in aux plot details arrays if aux_vars is not a
+    # string
+    k = 0
+    while k < len(config.aux_vars) and config.aux_plots is True:
+        if config.aux_vars[k] in model.variable_dictionary:
+            k = k + 1
+        elif config.aux_vars[k] not in model.variable_dictionary:
+            if config.aux_vars[k] in coefficient_labels:
+                print("The auxiliary variable " + config.aux_vars[k]
+                      + " is a coefficient of the flux model, which the "
+                      "Taylor model does not have; it is not plotted.")
+            del config.aux_vars[k]
+            del config.aux_titles[k]
+            del config.aux_ymin[k]
+            del config.aux_ymax[k]
+
+    # Only variables of the model can be saved; the cell centers are saved
+    # once, not as a time series
+    for name in list(config.output_vars):
+        if name not in model.variable_dictionary or name == 'x':
+            config.output_vars.remove(name)
+
+
+# Labels of the coefficients of the flux model, see calculate_coeffs.py
+coefficient_labels = {
+    # Thermal velocities (most probable)
+    'v_Ti': r"$v_{th,i}$", 'v_Te': r"$v_{th,e}$",
+    # Neutrals density in use for CX friction
+    'n_0': r"$n_0$",
+    # Poloidal gyro-(Larmor) radii
+    'rho_pi': r"$\rho_{\theta i}$", 'rho_pe': r"$\rho_{\theta e}$",
+    # Banana orbit bounce frequencies
+    'omega_bi': r"$\omega_{bi}$", 'omega_be': r"$\omega_{be}$",
+    # Banana width
+    'w_bi': r"$w_{bi}$",
+    # Transit frequency
+    'omega_t': r"$\omega_t$",
+    # Collision Frequencies
+    'nu_ei': r"$\nu_{ei}$", 'nu_ii': r"$\nu_{ii}$",
+    # Collisionalities
+    'nu_ai': r"$\nu_{*i}$", 'nu_ae': r"$\nu_{*e}$",
+    # Electron Anomalous Diffusion
+    'D_an': r"$D_{an}$", 'g_n_an': r"$g_n^{an}$", 'g_T_an': r"$g_T^{an}$",
+    'g_Z_an': r"$g_Z^{an}$", 'Gamma_an': r"$\Gamma_e^{an}$",
+    # Charge Exchange Friction
+    'ionization_rate': r"$\langle\sigma_{ion} v\rangle$",
+    'cx_rate': r"$\langle\sigma_{cx} v\rangle$",
+    'g_n_cx': r"$g_n^{cx}$", 'g_T_cx': r"$g_T^{cx}$",
+    'g_Z_cx': r"$g_Z^{cx}$", 'Gamma_cx': r"$\Gamma_i^{cx}$",
+    # Ion Bulk (Parallel) Viscosity
+    'plasma_disp': r"$X$", 'D_bulk': r"$D_{\pi\parallel}$",
+    'Gamma_bulk': r"$\Gamma_i^{\pi\parallel}$",
+    # Ion Orbit Loss
+    'g_ol': r"$g^{ol}$", 'Gamma_ol': r"$\Gamma_i^{ol}$"
 }
 
-
-# Remove entire entry in aux plot details arrays if aux_vars is not a string
-k = 0
-while k < len(config.aux_vars) and config.aux_plots is True:
-    if config.aux_vars[k] in variable_dictionary:
-        k = k + 1
-    elif config.aux_vars[k] not in variable_dictionary:
-        del config.aux_vars[k]
-        del config.aux_titles[k]
-        del config.aux_ymin[k]
-        del config.aux_ymax[k]
-
-del k  # Cleanup
+# Names of the variables that can be plotted or saved
+variable_names = [
+    'x', 'density', 'temperature', 'Z', 'Diffusivity', 'n_0', 'v_Ti', 'v_Te',
+    'rho_pi', 'rho_pe', 'omega_bi', 'omega_be', 'w_bi', 'omega_t', 'nu_ei',
+    'nu_ii', 'nu_ai', 'nu_ae', 'ionization_rate', 'cx_rate', 'D_an',
+    'g_n_an', 'g_T_an', 'g_Z_an', 'Gamma_an', 'g_n_cx', 'g_T_cx', 'g_Z_cx',
+    'Gamma_cx', 'g_ol', 'Gamma_ol', 'D_bulk', 'Gamma_bulk', 'plasma_disp'
+]
 
 
 # Auxiliary function to print out any variable
@@ -0,0 +1,36 @@
+"""
+    This is an example configuration file of a parameter sweep, run with
+    'python parameter_sweep.py sweep_config.py'. Every combination of the
+    values in 'parameters' is one run of the base configuration file.
+"""
+
+# The configuration file every run starts from
+base_config = "flux_config.py"
+
+# Directory of the sweep, with one subdirectory per run and the summary table
+sweep_directory = "Sweep"
+
+# Values of each parameter; all combinations are run
+parameters = {
+    'Gamma_c': [-0.5e22, -1.0e22, -2.0e22],
+    'D_choice': ["D_Zohm", "D_Staps", "D_Flow_Shear"]
+}
+
+# Values that depend on the swept ones, as Python expressions
+derived = {
+    'q_c': "5.0e2 * Gamma_c"
+}
+
+# Checkpoint all runs continue from, e.g. the final state of an earlier run
+# (written with checkpoint_every or checkpoint_wall). Their total_timeSteps
+# (or total_time) counts from the start of that run, not from the checkpoint.
+# restart_from = "Output/checkpoint.dump"
+
+# Number of parallel runs; defaults to the number of cores
+# workers = 4
+
+# Number of points run together as one ensemble (see src/ensemble.py); the
+# points that only differ in Gamma_c, q_c, alpha_sup, beta or the shear_a
+# parameters are solved K at a time as one system, which is much faster
+# than K runs. Not with steady_state or remeshing. Defaults to 1.
+# ensemble_size = 8
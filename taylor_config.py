@@ -10,6 +10,24 @@ q_c = 5.0 * Gamma_c
 # Number of cells
 nx = 200
 
+# Graded mesh: "uniform", or "tanh" to cluster the cells around the pedestal
+# at pedestal_location, over about pedestal_width (both in the units of the
+# model, AU or m; None is the pedestal of the initial H--mode), where they
+# are mesh_ratio times smaller than far from it; with refine_edge, also at
+# the edge (x = 0), where the boundary conditions make a thin layer
+mesh_grading = "uniform"
+pedestal_location = None
+pedestal_width = None
+mesh_ratio = 10.0
+refine_edge = True
+
+# Adapt the mesh to the moving pedestal: every remesh_every steps (0 is off),
+# the cells are moved to where Z and the density are steep, up to mesh_ratio
+# times smaller than elsewhere, if any cell changes its width by more than
+# remesh_threshold; the profiles are carried over conservatively
+remesh_every = 0
+remesh_threshold = 0.25
+
 # Boolean, to choose either the Taylor-expanded numerical model, or
 # the full flux model. Note that it sets the length of the domain
 # L to be 4.0 AU in Taylor-expanded, and 0.03 m in the flux model.
@@ -17,12 +35,87 @@ taylor_model = True
 
 res_tol = 1.0e-6
 
+# Boolean, to compute the flux-model coefficients with the fused numpy kernel
+# instead of the FiPy expressions (same results, less overhead per step)
+fused_coeffs = False
+
+# Boolean, to calculate (and keep) all of the flux-model coefficients; by
+# default only the ones of the Z-equation, aux_vars and output_vars are. The
+# Taylor model calculates none of them
+all_coefficients = False
+
+# The plasma dispersion function of the bulk viscosity: "wofz", or "table"
+# for a tabulated version, several times faster on large meshes, accurate to
+# plasma_disp_tol (check it with python -m src.plasma_dispersion)
+plasma_disp = "wofz"
+plasma_disp_tol = 1.0e-10
+
 # Total time steps; should be ~ L^2 / D
 total_timeSteps = 1000
 
 # Size of the time step
 timeStep = 1.0 / 375.0
 
+# Boolean, to adapt the time step to the number of sweeps each step takes.
+# The run then ends at the physical time total_time, which defaults to
+# total_timeSteps * timeStep. The time step grows by dt_grow when a step takes
+# at most grow_sweeps sweeps, and a step taking more than max_sweeps sweeps is
+# retried with the time step cut by dt_shrink. The time step is kept between
+# dt_min and dt_max.
+adaptive_timeStep = False
+# total_time = 1000.0 / 375.0
+# dt_min, dt_max = 1.0e-3 / 375.0, 1.0e2 / 375.0
+# dt_grow, dt_shrink = 1.5, 0.5
+# grow_sweeps, max_sweeps = 3, 20
+
+# Limits of the sweeps in every step, also with a fixed time step. A step that
+# takes more than max_sweeps sweeps, whose residual grows by more than
+# divergence_factor (or is NaN), or whose last stall_sweeps sweeps do not get
+# below stall_factor times the smallest residual before them, is rolled back
+# and retried with a smaller time step.
+# max_sweeps = 20
+# divergence_factor = 1.0e3
+# stall_sweeps, stall_factor = 5, 0.9
+# Boolean, to print the residual of every sweep
+verbose_sweeps = False
+
+# Solve for the steady state instead of marching total_timeSteps: a direct
+# solve of the time-independent equations, then pseudo-transient continuation
+# (with a time step that grows as the profiles settle), then real time
+# stepping. The run stops when the scaled steady-state residual is below
+# steady_tol; see src/steady_state.py. Works best with nonlinear_solver =
+# "newton".
+steady_state = False
+steady_tol = 1.0e-6
+steady_max_steps = 200
+
+# Stop the run early: when the relative change of n, T and Z per unit time
+# falls below stop_change_rate, when Z at the edge crosses stop_Z_edge (e.g.
+# the L--H transition), or after stop_wall_time seconds. 0 (None for
+# stop_Z_edge) turns a criterion off; the summary records which one fired.
+stop_change_rate = 0.0
+stop_Z_edge = None
+stop_wall_time = 0.0
+
+# The nonlinear iteration of a time step: "picard" sweeps, or "newton" for a
+# Jacobian-free Newton-Krylov solve, in which the Diffusivity and the
+# coefficients are also implicit. Newton's method stops when the residual,
+# scaled by the size of each variable, is below newton_tol, and fails after
+# max_sweeps iterations.
+nonlinear_solver = "picard"
+newton_tol = 1.0e-8
+
+# The linear solver of the coupled equations: 'banded' (a direct solver of the
+# block-tridiagonal system of a 1D mesh), 'lu', or the iterative 'gmres',
+# 'pcg', 'bicgstab' and 'cgs', with the preconditioner 'ilu', 'jacobi',
+# 'block_jacobi' (one block per variable) or None. Without a preconditioner,
+# GMRES does not reach solver_tolerance within solver_iterations here. Compare
+# them on a configuration with: python solver_benchmark.py CONFIG_FILE.py
+solver = "gmres"
+preconditioner = "ilu"
+solver_tolerance = 1.0e-10
+solver_iterations = 100
+
 # Choose the Diffusivity model, as a string (case does not matter)
 # D_Zohm, D_Staps, and D_Shear are the possibilities
 D_choice = "D_Flow_Shear"
@@ -58,15 +151,20 @@ plot_title = "$D \sim 1 / [1 + 0.1 (Z)^2 + 0.25 (Z^\prime)^{2}]$"\
 # Maximum x on the plots
 ploty_max = 5.2
 
+# Plot every this many steps. The plots are drawn in a separate process; if
+# it falls behind the time loop, frames are dropped instead of waiting.
+plot_every = 1
+
 aux_plots = False
 
 # Aux plots details
 # aux_vars MUST be an list of strings
-aux_vars = ['rho_pi', 1.2541, 'v_Ti']
+aux_vars = ['Diffusivity', 1.2541, 'rho_pi']
 # The second entry in all of the aux plot arrays will be deleted, due
-# to bad data type.
+# to bad data type. The third as well in the Taylor model, which has none of
+# the coefficients of the flux model (such as rho_pi).
 
-aux_titles = ["RHO", "1.2541", "v_Ti"]
+aux_titles = ["D", "1.2541", "RHO"]
 aux_ymin = [0.0, 5.0, 0.0]
 aux_ymax = []
 # The above are optional
@@ -75,4 +173,26 @@ aux_ymax = []
 save_plots = False
 save_TSVs = False
 
+# Should the variables be saved as a binary time series? It is written to the
+# subdirectory 'time_series' of the save directory, with one .npy file per
+# variable (rows are the saved steps), every output_every steps.
+save_output = False
+output_vars = ['density', 'temperature', 'Z', 'Diffusivity']
+output_every = 1
+
+# Checkpoints of the state are written to 'checkpoint.dump' in the save
+# directory every checkpoint_every steps and/or every checkpoint_wall seconds
+# of wall-clock time (0 turns either one off), and at the end of the run.
+# Continue a run with: python solving_taylor.py CONFIG_FILE.py --restart
+# SAVE_DIRECTORY/checkpoint.dump
+checkpoint_every = 0
+checkpoint_wall = 0.0
+
+# Time the phases of every step (updating the variables, the coefficients,
+# the sweeps and linear solves, plotting and output), and report the total,
+# mean and 95th percentile of each at the end; also as JSON if profile_file
+# is set.
+profile = False
+# profile_file = "profile.json"
+
 save_directory = "SAVE_DIRECTORY"
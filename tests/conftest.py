@@ -0,0 +1,38 @@
+"""
+    Shared setup of the tests: the source files are imported as in the
+    solving files (from src...), from the root of the repository, and the
+    models are built from the example configuration files.
+
+    Run them from the root of the repository with: python -m pytest tests
+"""
+
+import os
+import sys
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if repository not in sys.path:
+    sys.path.insert(0, repository)
+
+# The tests run with the scipy solvers of FiPy (the banded solver and the
+# preconditioners of src/solvers.py are written for its matrices), also when
+# petsc4py, which FiPy would pick first, is installed for the parallel runs
+os.environ.setdefault('FIPY_SOLVERS', 'scipy')
+
+from src.input_handling import load_config
+
+
+def example_config(name, **inputs):
+    """
+        The example configuration file 'name' of the repository, headless
+        (batch mode, no plots or files), with the given inputs changed.
+    """
+    config = load_config(os.path.join(repository, name))
+    config.batch_mode = True
+    config.generate_plots = False
+    config.save_plots, config.save_TSVs, config.save_output = \
+        False, False, False
+    config.checkpoint_every, config.checkpoint_wall = 0, 0.0
+    config.summary_file, config.profile_file = None, None
+    for input_name, value in inputs.items():
+        setattr(config, input_name, value)
+    return config
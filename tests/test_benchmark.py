@@ -0,0 +1,60 @@
+"""
+    The benchmark suite of benchmark.py: a case is run and measured, and the
+    comparison with a baseline reports what got slower or larger than the
+    tolerance allows, or now fails, and nothing else.
+"""
+
+import os
+
+import pytest
+
+from conftest import repository
+from benchmark import run_case, compare, versions
+
+
+def case(nx, **measurements):
+    result = {'config': os.path.join(repository, 'taylor_config.py'),
+              'nx': nx, 'D_choice': "D_Zohm", 'dt_factor': 1.0,
+              'solver': None, 'converged': True, 'step_time': 1.0,
+              'coefficients': 0.2, 'solve': 0.5, 'io': 0.1,
+              'peak_memory': 100.0, 'sweeps': 3.0}
+    result.update(measurements)
+    return result
+
+
+def test_run_case():
+    result = run_case(case(20), 2)
+    assert 'error' not in result, result.get('log')
+    assert result['converged'] is True
+    assert result['steps'] == 2
+    for metric in ['step_time', 'sweeps', 'coefficients', 'solve', 'io']:
+        assert result[metric] > 0.0, metric
+    assert result['solve'] < result['step_time']
+
+
+def test_compare_with_the_baseline():
+    baseline = {'versions': versions(),
+                'cases': [case(100), case(1000), case(10000)]}
+    results = [
+        # Slower by more than the tolerance; more sweeps are not a regression
+        case(100, step_time=1.5, sweeps=6.0),
+        # Within the tolerance, and faster
+        case(1000, solve=0.6, io=0.01),
+        # Now fails
+        case(10000, converged=False, step_time=None),
+        # Not in the baseline
+        case(100000, step_time=100.0)]
+
+    regressions = compare(results, baseline, 0.25)
+    found = [(result['nx'], metric, old, new)
+             for result, metric, old, new in regressions]
+    assert found == [(100, 'step_time', 1.0, 1.5),
+                     (10000, 'converged', True, False)]
+
+
+@pytest.mark.parametrize('tolerance, regressed', [(0.1, True), (1.0, False)])
+def test_tolerance(tolerance, regressed):
+    baseline = {'versions': versions(), 'cases': [case(100)]}
+    regressions = compare([case(100, peak_memory=150.0)], baseline, tolerance)
+    assert [metric for result, metric, old, new in regressions] == \
+        (['peak_memory'] if regressed else [])
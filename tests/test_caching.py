@@ -0,0 +1,72 @@
+"""
+    The skipped updates of src/caching.py: an update repeated for the same
+    state (and parameters) is skipped and counted, and one for a changed
+    state is computed again; the profiler reports the counts per sweep.
+"""
+
+import numpy
+from fipy import Grid1D, CellVariable
+
+from conftest import example_config
+from src.caching import StateCache
+from src.model import build_model
+from src.profiling import Profiler
+
+
+def test_same_state_is_reused():
+    Z = CellVariable(mesh=Grid1D(nx=4), value=numpy.arange(4.0))
+    cache = StateCache()
+    assert cache.reuse('diffusivity', (Z,), (1.0,)) is False
+    assert cache.reuse('diffusivity', (Z,), (1.0,)) is True
+    assert cache.reuse('diffusivity', (Z,), (1.0,)) is True
+    assert (cache.computed, cache.reused) == ({'diffusivity': 1},
+                                              {'diffusivity': 2})
+
+    # A changed cell, or parameter, is computed again
+    Z.setValue(1.5, where=Z.mesh.cellCenters[0] > 3.0)
+    assert cache.reuse('diffusivity', (Z,), (1.0,)) is False
+    assert cache.reuse('diffusivity', (Z,), (2.0,)) is False
+    assert cache.reuse('diffusivity', (Z,), (2.0,)) is True
+    assert (cache.computed, cache.reused) == ({'diffusivity': 3},
+                                              {'diffusivity': 3})
+
+    cache.clear()
+    assert cache.reuse('diffusivity', (Z,), (2.0,)) is False
+
+
+def test_repeated_model_update_is_skipped():
+    model = build_model(example_config('flux_config.py', nx=20))
+    model.update_diffusivity()
+    model.update_coeffs()
+    computed, reused = dict(model.cache.computed), dict(model.cache.reused)
+    for update in range(3):
+        model.update_diffusivity()
+        model.update_coeffs()
+    assert model.cache.computed == computed
+    for name in ['diffusivity', 'coefficients']:
+        assert model.cache.reused[name] == reused.get(name, 0) + 3
+
+    # Z changed: the Diffusivity is computed again, from the new Z
+    model.Z.setValue(model.Z.value + 0.1)
+    diffusivity = numpy.array(model.D_choice_local.value)
+    model.update_diffusivity()
+    model.update_coeffs()
+    for name in ['diffusivity', 'coefficients']:
+        assert model.cache.computed[name] == computed[name] + 1
+    numpy.testing.assert_array_equal(model.Diffusivity.value, diffusivity)
+
+
+def test_counts_per_sweep():
+    model = build_model(example_config('taylor_config.py', nx=20))
+    profiler = Profiler()
+    profiler.watch_cache(model.cache)
+    model.update_diffusivity()
+    for sweeps in [2, 4]:
+        model.update_diffusivity()
+        model.update_diffusivity()
+        profiler.end_step({'sweeps': sweeps, 'retries': 0})
+
+    counts = profiler.summary()['counts']
+    assert counts['diffusivity reused']['total'] == 4
+    assert counts['diffusivity reused']['per_sweep'] == 4 / 6
+    assert 'per_sweep' not in counts['sweeps']
@@ -0,0 +1,144 @@
+"""
+    The fused coefficient kernel against the FiPy expressions of
+    calculate_coeffs(), on states where none of the terms are degenerate: at
+    the initial state the profiles are smooth and Z is zero at the edge, so
+    e.g. the Z**4 of the orbit loss and the real part of the plasma
+    dispersion function are hardly tested there.
+
+    Also: the constants of the kernel are built once per mesh, a coefficient
+    calculated alone gets all of the ones it depends on, and the Taylor
+    model calculates none.
+"""
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.solving_loop import run_model
+from src.calculate_coeffs import compare_coeffs, coefficient_names, \
+    coefficient_constants, coefficient_closure, coefficient_dependencies, \
+    requested_coefficients
+from src.remeshing import remesh, cell_faces
+
+
+# Largest relative difference of any coefficient between the two kernels
+fused_tolerance = 1.0e-10
+
+
+def flux_model(**inputs):
+    config = example_config('flux_config.py', nx=100, all_coefficients=True,
+                            **inputs)
+    return build_model(config)
+
+
+def assert_kernels_agree(model):
+    differences = compare_coeffs(model)
+    assert sorted(differences) == sorted(coefficient_names)
+    worst = max(differences, key=differences.get)
+    assert differences[worst] < fused_tolerance, worst
+
+
+@pytest.mark.parametrize('plasma_disp', ["wofz", "table"])
+def test_initial_state(plasma_disp):
+    assert_kernels_agree(flux_model(plasma_disp=plasma_disp))
+
+
+def test_after_time_steps():
+    model = flux_model(total_timeSteps=5)
+    assert run_model(model) == 0
+    assert_kernels_agree(model)
+
+
+@pytest.mark.parametrize('plasma_disp', ["wofz", "table"])
+def test_perturbed_state(plasma_disp):
+    """ Rough profiles, and Z of both signs and well away from zero. """
+    model = flux_model(plasma_disp=plasma_disp)
+    random = numpy.random.default_rng(2018)
+    cells = model.mesh.numberOfCells
+    for variable in (model.density, model.temperature):
+        variable.setValue(variable.value
+                          * (1.0 + 0.2 * random.uniform(-1.0, 1.0, cells)))
+    model.Z.setValue(1.5 * numpy.sin(numpy.linspace(0.0, 3.0 * numpy.pi,
+                                                    cells))
+                     + 0.1 * random.standard_normal(cells))
+    model.cache.clear()
+    assert_kernels_agree(model)
+
+
+def test_constants_are_built_once_per_mesh():
+    model = flux_model()
+    constants = coefficient_constants(model)
+    assert coefficient_constants(model) is constants
+
+    # A new mesh gets its own, e.g. the 'x' of the neutrals and D_bulk
+    faces = cell_faces(model.mesh)
+    widths = numpy.linspace(0.5, 1.5, len(faces) - 1)
+    remesh(model, widths * (faces[-1] - faces[0]) / numpy.sum(widths))
+    remeshed = coefficient_constants(model)
+    assert remeshed is not constants
+    assert remeshed['mesh'] is model.mesh
+    numpy.testing.assert_array_equal(remeshed['x'], model.x.value)
+
+    # The coefficients from the kept constants are those from new ones
+    values = {name: numpy.array(model.variable_dictionary[name].value)
+              for name in coefficient_names}
+    model.coefficient_constants = None
+    model.cache.clear()
+    model.update_coeffs()
+    assert model.coefficient_constants is not remeshed
+    for name in coefficient_names:
+        numpy.testing.assert_array_equal(
+            model.variable_dictionary[name].value, values[name],
+            err_msg=name)
+
+
+def test_closure_has_every_dependency():
+    for name in coefficient_names:
+        closure = coefficient_closure([name])
+        assert name in closure
+        assert closure == [other for other in coefficient_names
+                           if other in closure]
+        for needed in closure:
+            assert set(coefficient_dependencies[needed]) <= set(closure)
+    assert coefficient_closure(['Gamma_bulk']) == [
+        'v_Ti', 'rho_pi', 'omega_t', 'nu_ei', 'nu_ii', 'plasma_disp',
+        'D_bulk', 'Gamma_bulk']
+
+
+@pytest.fixture(scope='module')
+def calculated_model():
+    """ The flux model, with all of the coefficients calculated. """
+    return flux_model(fused_coeffs=False)
+
+
+@pytest.mark.parametrize('name', coefficient_names)
+def test_requested_coefficient(calculated_model, name):
+    """
+        A coefficient calculated with only the ones it depends on (besides
+        those of the equations) is the one of a run that calculates all;
+        a missing dependency would be None, or stale.
+    """
+    model = build_model(example_config(
+        'flux_config.py', nx=100, fused_coeffs=False, save_output=True,
+        output_vars=['Z', name]))
+    assert name in model.computed_coefficients
+    numpy.testing.assert_array_equal(
+        model.variable_dictionary[name].value,
+        calculated_model.variable_dictionary[name].value)
+
+
+def test_taylor_model_has_no_coefficients():
+    """ Also when all of them, or some in the output, are asked for. """
+    config = example_config('taylor_config.py', nx=20,
+                            all_coefficients=True, save_output=True,
+                            output_vars=['Z', 'Gamma_an'])
+    assert requested_coefficients(config) == []
+    model = build_model(config)
+    assert model.computed_coefficients == set()
+    assert not any(name in model.variable_dictionary
+                   for name in coefficient_names)
+
+    model.update_coeffs()
+    assert 'coefficients' not in model.cache.computed
+    assert model.coefficient_constants is None
@@ -0,0 +1,78 @@
+"""
+    The checkpoints of src/checkpoint.py: a run restarted from the checkpoint
+    of a step ends in the same state, at the same time, as a run that was
+    not interrupted, also when a checkpoint was left half written.
+"""
+
+import os
+import json
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.solving_loop import run_model
+from src.checkpoint import read_checkpoint, checkpoint_variables
+
+
+def taylor_run(directory, total_timeSteps, restart=None, **inputs):
+    """ Runs the Taylor model; returns it, and the summary of the run. """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    summary_file = os.path.join(directory, "summary.json")
+    config = example_config('taylor_config.py', nx=50,
+                            total_timeSteps=total_timeSteps,
+                            save_directory=directory,
+                            summary_file=summary_file, **inputs)
+    model = build_model(config)
+    assert run_model(model, restart) == 0
+    with open(summary_file) as summary_json:
+        return model, json.load(summary_json)
+
+
+def assert_same_state(model, reference):
+    for name in checkpoint_variables:
+        numpy.testing.assert_allclose(
+            model.variable_dictionary[name].value,
+            reference.variable_dictionary[name].value, rtol=1.0e-12,
+            atol=0.0, err_msg=name)
+
+
+def test_restart_continues_the_run(tmp_path):
+    reference, reference_summary = taylor_run(str(tmp_path / "reference"), 6)
+
+    directory = str(tmp_path / "interrupted")
+    taylor_run(directory, 3, checkpoint_every=3)
+    checkpoint = os.path.join(directory, "checkpoint.dump")
+    data = read_checkpoint(checkpoint)
+    assert data['step'] == 3
+    assert len(data['history']) == 3
+
+    model, summary = taylor_run(directory, 6, restart=checkpoint)
+    assert summary['steps'] == reference_summary['steps'] == 6
+    assert summary['time'] == pytest.approx(reference_summary['time'],
+                                            rel=1.0e-12)
+    assert_same_state(model, reference)
+
+
+def test_half_written_checkpoint(tmp_path):
+    """
+        A run killed while writing leaves a .tmp file next to the last
+        complete checkpoint: a restart uses the complete one, and the next
+        checkpoint replaces both.
+    """
+    directory = str(tmp_path)
+    taylor_run(directory, 2, checkpoint_every=2)
+    checkpoint = os.path.join(directory, "checkpoint.dump")
+    with open(checkpoint + ".tmp", 'wb') as half_written:
+        half_written.write(b"\x80\x04 truncated")
+
+    model, summary = taylor_run(directory, 4, restart=checkpoint,
+                                checkpoint_every=2)
+    assert summary['steps'] == 4
+    assert not os.path.exists(checkpoint + ".tmp")
+    data = read_checkpoint(checkpoint)
+    assert data['step'] == 4
+    numpy.testing.assert_array_equal(data['values']['density'],
+                                     model.density.value)
@@ -0,0 +1,62 @@
+"""
+    The continuation of src/continuation.py: the derived inputs follow the
+    parameter, and pseudo-arclength continuation of the Taylor model finds a
+    fold of its S-curve, and goes around it onto the other branch.
+"""
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.continuation import Continuation, set_parameter
+
+
+def first_branch_state(continuation, Gamma_c):
+    """ The profiles of the first branch at Gamma_c, interpolated. """
+    branch = [(point['Gamma_c'], state) for point, state in
+              zip(continuation.points, continuation.states)
+              if point['branch'] == 0]
+    for (Gamma_a, state_a), (Gamma_b, state_b) in zip(branch, branch[1:]):
+        if min(Gamma_a, Gamma_b) <= Gamma_c <= max(Gamma_a, Gamma_b):
+            weight = (Gamma_c - Gamma_a) / (Gamma_b - Gamma_a)
+            return state_a + weight * (state_b - state_a)
+    raise ValueError("Gamma_c is not on the first branch")
+
+
+def test_derived_inputs_follow_the_parameter():
+    model = build_model(example_config('taylor_config.py', nx=20))
+    set_parameter(model, 'Gamma_c', -1.2,
+                  {'q_c': lambda Gamma_c: 5.0 * Gamma_c})
+    assert model.config.Gamma_c == -1.2
+    assert model.config.q_c == pytest.approx(-6.0)
+
+
+def test_fold_of_the_taylor_model():
+    """
+        On a coarse mesh, the S-curve folds where a cell of Z near the
+        pedestal crosses the middle branch of its local S-curve, near
+        Gamma_c = -1.78; this takes a few minutes.
+    """
+    config = example_config('taylor_config.py', nx=20, initial_H_mode=True,
+                            nonlinear_solver="newton")
+    model = build_model(config)
+    continuation = Continuation(model, 'Gamma_c',
+                                {'q_c': lambda Gamma_c: 5.0 * Gamma_c},
+                                'arclength', max_points=8)
+    continuation.run(-1.5, -8.0, 0.1)
+
+    assert len(continuation.turning_points) == 1
+    fold = continuation.turning_points[0]
+    assert -1.8 < fold['Gamma_c'] < -1.75
+    assert min(point['Gamma_c'] for point in continuation.points) == \
+        pytest.approx(fold['Gamma_c'], abs=0.01)
+
+    # The curve turns back onto the other branch, instead of retracing the
+    # first one: at the same Gamma_c, Z differs at the pedestal
+    last = continuation.points[-1]
+    assert last['branch'] == 1 and last['Gamma_c'] > fold['Gamma_c']
+    change = (continuation.states[-1]
+              - first_branch_state(continuation, last['Gamma_c']))
+    Z_change = change[2 * model.mesh.numberOfCells:]
+    assert numpy.max(numpy.abs(Z_change)) > 0.1
@@ -0,0 +1,70 @@
+"""
+    The ensembles of src/ensemble.py: K members solved together end where K
+    separate runs of their configurations end, also when one of them
+    converges in fewer sweeps than the other, and is kept at its values
+    while the other is swept on.
+"""
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.solving_loop import run_model
+from src.ensemble import build_ensemble, run_ensemble, EnsembleSweeps
+
+
+# Two members, far enough apart that their steps take different sweeps
+scan = [-0.4, -1.6]
+
+
+def member_config(Gamma_c, **inputs):
+    return example_config('taylor_config.py', nx=30, total_timeSteps=6,
+                          solver='lu', Gamma_c=Gamma_c, q_c=5.0 * Gamma_c,
+                          **inputs)
+
+
+def separate_run(config):
+    """ The final state variables of a run of the configuration. """
+    model = build_model(config)
+    assert run_model(model) == 0
+    return [numpy.array(variable.value)
+            for variable in model.state_variables()]
+
+
+def assert_same_as_separate_runs(ensemble, configs):
+    for member, config in enumerate(configs):
+        for rows, values in zip(ensemble.state(), separate_run(config)):
+            numpy.testing.assert_allclose(rows[member], values,
+                                          rtol=1.0e-10, atol=1.0e-12)
+
+
+@pytest.fixture
+def member_sweeps(monkeypatch):
+    """ The sweeps every member took in each step of the ensemble. """
+    sweeps = []
+    call = EnsembleSweeps.__call__
+
+    def recorded_call(self, equation, pending, solver, config):
+        status, member_sweeps, residual = call(self, equation, pending,
+                                               solver, config)
+        sweeps.append(member_sweeps[pending])
+        return status, member_sweeps, residual
+
+    monkeypatch.setattr(EnsembleSweeps, '__call__', recorded_call)
+    return sweeps
+
+
+def test_members_against_separate_runs(member_sweeps):
+    configs = [member_config(Gamma_c) for Gamma_c in scan]
+    ensemble = build_ensemble(configs)
+    summaries = run_ensemble(ensemble)
+    assert [summary['steps'] for summary in summaries] == [6, 6]
+    assert [summary['stop_reason'] for summary in summaries] == \
+        ['completed', 'completed']
+
+    # In some step, one member converged and was kept at its values while
+    # the other one was swept on
+    assert any(len(set(sweeps)) > 1 for sweeps in member_sweeps)
+    assert_same_as_separate_runs(ensemble, configs)
+
@@ -0,0 +1,36 @@
+"""
+    The checks of the configuration in src/input_handling.py: valid inputs
+    pass in batch mode, and invalid ones exit with status 2 instead of
+    asking for a replacement.
+"""
+
+import pytest
+
+from conftest import example_config
+from src.input_handling import check_config
+
+
+def test_integer_fluxes_are_valid():
+    config = example_config('taylor_config.py', Gamma_c=-1, q_c=5)
+    check_config(config)
+    assert (config.Gamma_c, config.q_c) == (-1, 5)
+
+
+@pytest.mark.parametrize('flux', ['Gamma_c', 'q_c'])
+def test_invalid_flux_exits_in_batch_mode(flux):
+    config = example_config('taylor_config.py', **{flux: "-0.8"})
+    with pytest.raises(SystemExit) as error:
+        check_config(config)
+    assert error.value.code == 2
+
+
+@pytest.mark.parametrize('flux', ['Gamma_c', 'q_c'])
+def test_asked_flux_is_a_float(monkeypatch, flux):
+    config = example_config('taylor_config.py', **{flux: None})
+    config.batch_mode = False
+    monkeypatch.setattr('builtins.input', lambda message="": "-2.5")
+    check_config(config)
+    assert getattr(config, flux) == -2.5
+    # The other flux is kept
+    assert (config.Gamma_c, config.q_c) == {'Gamma_c': (-2.5, -4.0),
+                                            'q_c': (-0.8, -2.5)}[flux]
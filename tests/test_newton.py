@@ -0,0 +1,43 @@
+"""
+    The Jacobian-free Newton-Krylov solve of src/newton.py: a time step of
+    the Taylor model converges within a few Newton iterations, to a state
+    that is a fixed point of the Picard sweeps, i.e. a fully implicit step.
+"""
+
+import numpy
+
+from conftest import example_config
+from src.model import build_model
+from src.newton import NewtonIteration
+
+
+def start_step(model):
+    model.update_old()
+    model.update_diffusivity()
+    model.update_coeffs()
+
+
+def test_newton_step_converges():
+    config = example_config('taylor_config.py', nx=50,
+                            nonlinear_solver="newton")
+    model = build_model(config)
+    newton = NewtonIteration(model)
+    start_step(model)
+    old = newton.state()
+
+    status, iterations, residual = newton(model.full_equation,
+                                          config.timeStep, model.solver,
+                                          config)
+    assert status == 'converged'
+    assert residual <= config.newton_tol
+    assert 1 <= iterations <= 10
+    u = newton.state()
+    assert not numpy.allclose(u, old)
+
+    # The Diffusivity and the coefficients are left at the solution, so a
+    # Picard sweep from it does not move it
+    model.full_equation.sweep(dt=config.timeStep, solver=model.solver)
+    for k, variable in enumerate(newton.variables):
+        numpy.testing.assert_allclose(
+            variable.value, u[k * newton.cells:(k + 1) * newton.cells],
+            rtol=1.0e-6, atol=1.0e-6 * numpy.max(numpy.abs(variable.value)))
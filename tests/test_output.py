@@ -0,0 +1,105 @@
+"""
+    The binary time series of src/output.py: appended steps are read back
+    with their values, also before the files are closed, after a restart,
+    and after a remesh (same number of cells, new variables).
+"""
+
+import numpy
+from fipy import Grid1D, CellVariable
+
+from src.output import TimeSeriesWriter, load_time_series
+
+
+nx = 6
+
+
+def profiles(scale, mesh=None):
+    mesh = mesh or Grid1D(nx=nx, Lx=1.0)
+    return {'density': CellVariable(mesh=mesh,
+                                    value=scale * numpy.arange(nx)),
+            'Z': CellVariable(mesh=mesh, value=-scale)}
+
+
+def write_steps(writer, variables, steps):
+    """ Sets the variables to the values of each step, and appends them. """
+    for step in steps:
+        variables['density'].setValue(step * numpy.arange(nx))
+        variables['Z'].setValue(-step)
+        writer.append(step, 0.1 * step)
+
+
+def test_appended_steps(tmp_path):
+    directory = str(tmp_path / "time_series")
+    variables = profiles(0.0)
+    writer = TimeSeriesWriter(directory, variables)
+    writer.save_cell_centers(variables['density'].mesh.cellCenters[0])
+    write_steps(writer, variables, range(4))
+    writer.close()
+
+    series = load_time_series(directory)
+    assert sorted(series) == ['Z', 'density', 'step', 'time', 'x']
+    assert series['density'].shape == (4, nx)
+    assert series['Z'].shape == (4, nx)
+    assert numpy.array_equal(series['step'], [0, 1, 2, 3])
+    numpy.testing.assert_allclose(series['time'], [0.0, 0.1, 0.2, 0.3])
+    numpy.testing.assert_array_equal(series['density'][2],
+                                     2.0 * numpy.arange(nx))
+    numpy.testing.assert_array_equal(series['Z'][3], -3.0)
+    numpy.testing.assert_allclose(series['x'], (numpy.arange(nx) + 0.5) / nx)
+
+
+def test_every_and_flush(tmp_path):
+    """ Every second step; a run killed before close() keeps the flushed. """
+    directory = str(tmp_path / "time_series")
+    variables = profiles(0.0)
+    writer = TimeSeriesWriter(directory, variables, every=2, flush_every=3)
+    write_steps(writer, variables, range(7))
+
+    series = load_time_series(directory)
+    # Steps 0, 2, 4 and 6 are saved; the header was updated after step 4
+    assert numpy.array_equal(series['step'], [0, 2, 4])
+    del series
+    writer.flush()
+    series = load_time_series(directory)
+    assert numpy.array_equal(series['step'], [0, 2, 4, 6])
+    writer.close()
+
+
+def test_restart_continues_after_the_step(tmp_path):
+    directory = str(tmp_path / "time_series")
+    variables = profiles(0.0)
+    writer = TimeSeriesWriter(directory, variables)
+    write_steps(writer, variables, range(5))
+    writer.close()
+
+    # Restarted from a checkpoint of step 2: the later steps are written
+    # again, in place of the old ones
+    writer = TimeSeriesWriter(directory, variables, resume_step=2)
+    variables['density'].setValue(-1.0)
+    writer.append(3, 0.3)
+    writer.close()
+
+    series = load_time_series(directory)
+    assert numpy.array_equal(series['step'], [0, 1, 2, 3])
+    assert series['density'].shape == (4, nx)
+    numpy.testing.assert_array_equal(series['density'][2],
+                                     2.0 * numpy.arange(nx))
+    numpy.testing.assert_array_equal(series['density'][3], -1.0)
+
+
+def test_remesh_keeps_the_rows(tmp_path):
+    """ The variables of the new mesh are written to the same files. """
+    directory = str(tmp_path / "time_series")
+    variables = profiles(0.0)
+    writer = TimeSeriesWriter(directory, variables)
+    write_steps(writer, variables, range(2))
+
+    graded = Grid1D(dx=numpy.linspace(0.5, 1.5, nx) / nx)
+    writer.variables = profiles(1.0, graded)
+    writer.append(2, 0.2)
+    writer.close()
+
+    series = load_time_series(directory)
+    assert series['density'].shape == (3, nx)
+    numpy.testing.assert_array_equal(series['density'][2], numpy.arange(nx))
+    numpy.testing.assert_array_equal(series['Z'][2], -1.0)
@@ -0,0 +1,127 @@
+"""
+    The parallel mode of src/parallel.py: the Taylor model run by mpirun on
+    four processes with the PETSc solvers writes the time series, the TSV
+    files, the checkpoint and the summary of a serial run, also after a
+    restart from the checkpoint. Skipped without mpirun, mpi4py or petsc4py.
+"""
+
+import os
+import json
+import shutil
+import subprocess
+import sys
+
+import numpy
+import pytest
+
+from conftest import repository
+from src.output import load_time_series
+
+
+mpirun = shutil.which('mpirun') or shutil.which('mpiexec')
+pytestmark = pytest.mark.skipif(mpirun is None, reason="mpirun is missing")
+pytest.importorskip('mpi4py')
+pytest.importorskip('petsc4py')
+
+
+# The inputs of the runs, besides taylor_config.py
+run_inputs = """
+nx = 200
+total_timeSteps = {steps}
+generate_plots = False
+save_plots = False
+save_TSVs = True
+save_output = True
+checkpoint_every = 4
+save_directory = "{directory}"
+summary_file = "{directory}/summary.json"
+stop_change_rate = 1.0e-12
+stop_wall_time = 1.0e6
+"""
+
+
+def mpirun_options():
+    """ Open MPI does not run as root, or on more processes than cores. """
+    version = subprocess.run([mpirun, '--version'], capture_output=True,
+                             text=True).stdout
+    if 'Open MPI' not in version and 'OpenRTE' not in version:
+        return []
+    options = ['--oversubscribe']
+    if os.geteuid() == 0:
+        options.append('--allow-run-as-root')
+    return options
+
+
+def run(directory, steps, processes=1, restart=False):
+    """
+        Runs the Taylor model into directory, in serial (with the scipy
+        solvers) or on several processes (with PETSc), from the initial
+        conditions or its checkpoint.
+    """
+    config_file = str(directory) + "_config.py"
+    with open(os.path.join(repository, 'taylor_config.py')) as config:
+        inputs = config.read()
+    with open(config_file, 'w') as config:
+        config.write(inputs + run_inputs.format(steps=steps,
+                                                directory=directory))
+
+    command = [sys.executable, os.path.join(repository, 'solving_taylor.py'),
+               config_file, '--batch']
+    environment = dict(os.environ)
+    if processes > 1:
+        command = ([mpirun, '-np', str(processes)] + mpirun_options()
+                   + command + ['--petsc'])
+        environment.pop('FIPY_SOLVERS', None)
+    else:
+        environment['FIPY_SOLVERS'] = 'scipy'
+    if restart is True:
+        command += ['--restart', os.path.join(str(directory),
+                                              'checkpoint.dump')]
+
+    result = subprocess.run(command, cwd=str(directory.parent),
+                            env=environment, capture_output=True, text=True,
+                            timeout=1200)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+def assert_same_output(parallel, serial):
+    """ Equal within the tolerance of the sweeps. """
+    series = load_time_series(str(serial / "time_series"))
+    for name, values in load_time_series(
+            str(parallel / "time_series")).items():
+        numpy.testing.assert_allclose(values, series[name], rtol=1.0e-7,
+                                      atol=1.0e-7, err_msg=name)
+
+    tsv_files = sorted(name for name in os.listdir(str(serial))
+                       if name.endswith(".tsv") and name[0].isdigit())
+    assert sorted(name for name in os.listdir(str(parallel))
+                  if name.endswith(".tsv") and name[0].isdigit()) == \
+        tsv_files
+    numpy.testing.assert_allclose(
+        numpy.loadtxt(str(parallel / tsv_files[-1]), skiprows=1),
+        numpy.loadtxt(str(serial / tsv_files[-1]), skiprows=1),
+        rtol=1.0e-7, atol=1.0e-7)
+
+    with open(str(serial / "summary.json")) as summary_json:
+        summary = json.load(summary_json)
+    with open(str(parallel / "summary.json")) as summary_json:
+        parallel_summary = json.load(summary_json)
+    for key in ['steps', 'stop_reason', 'time']:
+        assert parallel_summary[key] == summary[key], key
+    for key in ['pedestal_density', 'pedestal_temperature', 'Z_edge']:
+        assert parallel_summary[key] == pytest.approx(summary[key],
+                                                      rel=1.0e-7), key
+
+
+def test_parallel_run_against_serial(tmp_path):
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    run(serial, 8)
+    output = run(parallel, 8, processes=4)
+    assert output.count("Step 7:") == 1        # Only process 0 prints
+    assert_same_output(parallel, serial)
+
+    # Restarted from the checkpoints of step 8
+    run(serial, 12, restart=True)
+    run(parallel, 12, processes=4, restart=True)
+    assert_same_output(parallel, serial)
@@ -0,0 +1,64 @@
+"""
+    The parameter sweep of parameter_sweep.py: the grid of points, the
+    summary table, and a run of one point in its own directory.
+"""
+
+import os
+
+from conftest import repository
+from parameter_sweep import parameter_grid, write_run_config, run_point, \
+    write_summary_table, summary_columns
+
+
+def test_parameter_grid():
+    points = parameter_grid({'b': [1, 2], 'a': [0.1, 0.2, 0.3]})
+    assert len(points) == 6
+    assert points[0] == {'a': 0.1, 'b': 1}
+    assert points[1] == {'a': 0.1, 'b': 2}
+    assert sorted((point['a'], point['b']) for point in points) == \
+        [(a, b) for a in [0.1, 0.2, 0.3] for b in [1, 2]]
+
+
+def test_summary_table(tmp_path):
+    points = parameter_grid({'Gamma_c': [-0.8, -1.6]})
+    summaries = [{'converged': True, 'steps': 10, 'exit_status': 0},
+                 {'converged': False, 'exit_status': 1}]
+    filename = str(tmp_path / "summary.tsv")
+    write_summary_table(filename, ['Gamma_c'], points, summaries)
+
+    with open(filename) as table_file:
+        rows = [line.rstrip("\n").split("\t") for line in table_file]
+    assert rows[0] == ['run', 'Gamma_c'] + summary_columns
+    table = [dict(zip(rows[0], row)) for row in rows[1:]]
+    assert [row['Gamma_c'] for row in table] == ['-0.8', '-1.6']
+    assert [row['converged'] for row in table] == ['True', 'False']
+    assert [row['steps'] for row in table] == ['10', 'None']
+
+
+def test_run_point(tmp_path):
+    """
+        A point runs in its own directory, without changing the one of the
+        worker, and a failed rerun does not report the old summary.
+    """
+    base_config = os.path.join(repository, 'taylor_config.py')
+    run_directory = str(tmp_path / "run_0000")
+    os.makedirs(run_directory)
+    working_directory = os.getcwd()
+
+    write_run_config(base_config, {'Gamma_c': -1.2}, {'q_c': "5.0 * Gamma_c"},
+                     run_directory)
+    with open(os.path.join(run_directory, "config.py"), 'a') as config_file:
+        config_file.write("nx = 20\ntotal_timeSteps = 3\n")
+    summary = run_point(run_directory)
+    assert os.getcwd() == working_directory
+    assert summary['exit_status'] == 0
+    assert summary['converged'] is True
+    assert summary['steps'] == 3
+    assert os.path.isfile(os.path.join(run_directory, "summary.json"))
+
+    write_run_config(base_config, {'Gamma_c': -1.2}, {'q_c': "undefined"},
+                     run_directory)
+    summary = run_point(run_directory)
+    assert summary['exit_status'] == 1
+    assert summary['converged'] is False
+    assert 'steps' not in summary
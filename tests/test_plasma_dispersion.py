@@ -0,0 +1,74 @@
+"""
+    The table of the plasma dispersion function of src/plasma_dispersion.py
+    against scipy.special.wofz: within the tolerance it is built for, over
+    the table, across the edge of the asymptotic region, far out and on the
+    real axis.
+"""
+
+import math
+
+import numpy
+import pytest
+import scipy.special
+
+from src.plasma_dispersion import DispersionTable
+
+
+def plasma_disp(x, y):
+    return math.sqrt(math.pi) * scipy.special.wofz(x + 1j * y).real
+
+
+def arguments(radius, size=20000):
+    """ Random (Re, Im) arguments of every region, as two arrays. """
+    random = numpy.random.default_rng(2018)
+    near = random.uniform(-1.0e-3, 1.0e-3, size)
+    regions = [
+        # The table
+        (random.uniform(-radius, radius, size),
+         random.uniform(0.0, radius, size)),
+        # Just inside and outside of the edges of the asymptotic region:
+        # |Re| = R, and Im = R
+        (numpy.sign(near) * radius + near, random.uniform(0.0, radius, size)),
+        (random.uniform(-radius, radius, size), radius + near),
+        # The corner
+        (radius + near, radius + near[::-1]),
+        # Far out, and very collisional
+        (random.uniform(-1.0e3, 1.0e3, size), random.uniform(0.0, 1.0, size)),
+        (random.uniform(-3.0, 3.0, size), 10.0**random.uniform(0.0, 4.0, size)),
+        # The real axis, and the nodes of the grid
+        (random.uniform(-2.0 * radius, 2.0 * radius, size), numpy.zeros(size)),
+        (numpy.arange(-radius, radius, 0.25), numpy.full(int(8 * radius),
+                                                         0.5 * radius)),
+    ]
+    return (numpy.concatenate([x for x, y in regions]),
+            numpy.concatenate([y for x, y in regions]))
+
+
+@pytest.mark.parametrize('tolerance', [1.0e-6, 1.0e-10, 1.0e-12])
+def test_table_against_wofz(tolerance):
+    table = DispersionTable(tolerance)
+    x, y = arguments(table.radius)
+    error = numpy.abs(table.evaluate(x, y) - plasma_disp(x, y))
+    assert numpy.max(error) <= tolerance, (x[numpy.argmax(error)],
+                                           y[numpy.argmax(error)])
+
+
+def test_shapes_and_lower_half_plane():
+    table = DispersionTable(1.0e-10)
+    x = numpy.linspace(-8.0, 8.0, 12).reshape(3, 4)
+    y = numpy.linspace(0.0, 2.0, 4)
+    out = numpy.empty((3, 4))
+    assert table.evaluate(x, y, out=out) is out
+    numpy.testing.assert_allclose(out, plasma_disp(x, y), rtol=0.0,
+                                  atol=1.0e-10)
+    assert table.evaluate(1.5, 0.3) == pytest.approx(plasma_disp(1.5, 0.3),
+                                                     abs=1.0e-10)
+
+    # Below the real axis, where the table does not hold, wofz is used
+    numpy.testing.assert_array_equal(table.evaluate(x, -y),
+                                     plasma_disp(x, -y))
+
+
+def test_unreachable_tolerance():
+    with pytest.raises(ValueError):
+        DispersionTable(1.0e-17)
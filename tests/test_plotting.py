@@ -0,0 +1,42 @@
+"""
+    The plotting of src/plotting.py, off the time loop: every plot_every-th
+    step is rendered, and a snapshot that finds the queue full is dropped
+    instead of making the time loop wait.
+"""
+
+import os
+
+from conftest import example_config
+from src.model import build_model
+from src.plotting import AsyncPlotter
+
+
+def saved_steps(directory):
+    return sorted(int(name[:-len(".png")]) for name in os.listdir(directory)
+                  if name.endswith(".png"))
+
+
+def test_every_plot_every_step_is_saved(tmp_path):
+    model = build_model(example_config('taylor_config.py', nx=20))
+    plotter = AsyncPlotter(model, plot_every=3, queue_size=20,
+                           save_directory=str(tmp_path))
+    plotter.submit(None)
+    for step in range(10):
+        plotter.submit(step)
+    plotter.close()
+
+    assert plotter.dropped == 0
+    assert saved_steps(str(tmp_path)) == [0, 3, 6, 9]
+
+
+def test_full_queue_drops_snapshots(tmp_path):
+    model = build_model(example_config('taylor_config.py', nx=20))
+    plotter = AsyncPlotter(model, plot_every=1, queue_size=1,
+                           save_directory=str(tmp_path))
+    for step in range(30):
+        plotter.submit(step)
+    plotter.close()
+
+    # Rendering takes much longer than taking a snapshot
+    assert plotter.dropped > 0
+    assert plotter.dropped + len(saved_steps(str(tmp_path))) == 30
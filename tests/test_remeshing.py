@@ -0,0 +1,65 @@
+"""
+    The remeshing of src/remeshing.py: the remap keeps the integral of a
+    profile and creates no new extrema, and an adapted mesh has as many
+    cells as the old one, over the same domain.
+"""
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.remeshing import conservative_remap, cell_faces, Remesher
+
+
+def random_faces(random, cells, length):
+    faces = numpy.concatenate([[0.0], numpy.cumsum(
+        random.uniform(0.1, 1.0, cells))])
+    faces *= length / faces[-1]
+    faces[-1] = length
+    return faces
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_remap_of_a_random_profile(seed):
+    random = numpy.random.default_rng(seed)
+    faces = random_faces(random, 40, 4.0)
+    new_faces = random_faces(random, int(random.integers(10, 80)), 4.0)
+    values = random.uniform(-1.0, 2.0, 40)
+
+    remapped = conservative_remap(faces, values, new_faces)
+    assert len(remapped) == len(new_faces) - 1
+    assert numpy.sum(remapped * numpy.diff(new_faces)) == pytest.approx(
+        numpy.sum(values * numpy.diff(faces)), rel=1.0e-12, abs=1.0e-12)
+    assert numpy.min(remapped) >= numpy.min(values) - 1.0e-12
+    assert numpy.max(remapped) <= numpy.max(values) + 1.0e-12
+
+
+def test_remap_keeps_the_sign():
+    random = numpy.random.default_rng(2018)
+    faces = random_faces(random, 40, 1.0)
+    values = numpy.exp(random.uniform(-10.0, 0.0, 40))
+    remapped = conservative_remap(faces, values,
+                                  random_faces(random, 40, 1.0))
+    assert numpy.all(remapped > 0.0)
+
+
+def test_adapt_keeps_the_cells():
+    config = example_config('taylor_config.py', nx=50, remesh_every=1)
+    model = build_model(config)
+    faces = cell_faces(model.mesh)
+    density = numpy.sum(model.density.value * numpy.diff(faces))
+
+    remesher = Remesher(config)
+    assert remesher.adapt(model) is True
+    assert remesher.remeshes == 1
+    new_faces = cell_faces(model.mesh)
+    assert model.mesh.numberOfCells == 50
+    assert len(model.Z.value) == len(model.density.value) == 50
+    assert (new_faces[0], new_faces[-1]) == (faces[0], faces[-1])
+    assert not numpy.allclose(new_faces, faces)
+    assert numpy.sum(model.density.value * numpy.diff(new_faces)) == \
+        pytest.approx(density, rel=1.0e-12)
+
+    # Adapted to the same profiles again, the mesh hardly moves
+    assert remesher.adapt(model) is False
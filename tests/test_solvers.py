@@ -0,0 +1,48 @@
+"""
+    The linear solvers of src/solvers.py: a few steps of the Taylor model
+    solved with the direct banded solver, or with GMRES and the block Jacobi
+    preconditioner, end in the same state as with FiPy's LU solver.
+"""
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.solving_loop import run_model
+from src.solvers import LinearBandedSolver, BlockJacobiPreconditioner
+from src.checkpoint import checkpoint_variables
+
+
+def taylor_steps(**inputs):
+    """ The Taylor model after a few steps with the given linear solver. """
+    model = build_model(example_config('taylor_config.py', nx=50,
+                                       total_timeSteps=4,
+                                       solver_tolerance=1.0e-12, **inputs))
+    assert run_model(model) == 0
+    return model
+
+
+@pytest.fixture(scope='module')
+def lu_model():
+    return taylor_steps(solver='lu')
+
+
+def assert_same_state(model, reference):
+    for name in checkpoint_variables:
+        numpy.testing.assert_allclose(
+            model.variable_dictionary[name].value,
+            reference.variable_dictionary[name].value, rtol=1.0e-8,
+            atol=1.0e-10, err_msg=name)
+
+
+def test_banded_solver(lu_model):
+    model = taylor_steps(solver='banded')
+    assert isinstance(model.solver, LinearBandedSolver)
+    assert_same_state(model, lu_model)
+
+
+def test_block_jacobi_preconditioner(lu_model):
+    model = taylor_steps(solver='gmres', preconditioner='block_jacobi')
+    assert isinstance(model.solver.preconditioner, BlockJacobiPreconditioner)
+    assert_same_state(model, lu_model)
@@ -0,0 +1,106 @@
+"""
+    The steady-state mode of src/steady_state.py: the pseudo time step
+    follows the steady-state residual, and the shipped Taylor configuration
+    reaches its steady state (through the L--H transition).
+"""
+
+import json
+import types
+
+import pytest
+
+import src.steady_state
+from conftest import example_config
+from src.steady_state import SteadyStepper, max_pseudo_rise
+from src.model import build_model
+from src.solving_loop import run_model
+
+
+class Unchanged(object):
+    """ A model whose updates do nothing, for the stepper alone. """
+    def update_diffusivity(self):
+        pass
+
+    def update_coeffs(self):
+        pass
+
+
+def pseudo_stepper(monkeypatch, residuals):
+    """
+        A SteadyStepper in the pseudo-transient mode, whose steady-state
+        residuals are the given ones, one per call.
+    """
+    residuals = iter(residuals)
+    monkeypatch.setattr(src.steady_state, 'steady_residual',
+                        lambda model: next(residuals))
+    config = types.SimpleNamespace(
+        adaptive_timeStep=False, total_timeSteps=10, total_time=1.0,
+        timeStep=0.1, dt_min=1.0e-6, dt_max=1.0, dt_grow=1.5, dt_shrink=0.5,
+        grow_sweeps=3, max_sweeps=20, steady_tol=1.0e-6,
+        steady_max_steps=200)
+    stepper = SteadyStepper(config, Unchanged())
+    stepper.reject()            # The direct solve failed
+    assert stepper.mode == 'pseudo'
+    return stepper
+
+
+def take_step(stepper, sweeps=3):
+    dt = stepper.next_dt()
+    if stepper.verify(dt) != 'converged':
+        stepper.reject()
+        return False
+    stepper.accept(dt, sweeps)
+    return True
+
+
+def test_time_step_grows_as_the_residual_falls(monkeypatch):
+    stepper = pseudo_stepper(monkeypatch, [1.0e-2, 5.0e-3, 1.0e-3])
+    dts = []
+    for step in range(3):
+        assert take_step(stepper)
+        dts.append(stepper.dt)
+    assert dts == pytest.approx([0.1, 0.2, 1.0])
+
+
+def test_easy_step_grows_the_time_step_by_dt_grow(monkeypatch):
+    stepper = pseudo_stepper(monkeypatch, [1.0e-3, 0.9e-3, 0.81e-3])
+    assert take_step(stepper)
+    assert take_step(stepper, sweeps=3)
+    assert stepper.dt == pytest.approx(0.1 * stepper.dt_grow)
+    assert take_step(stepper, sweeps=4)
+    assert stepper.dt == pytest.approx(0.1 * stepper.dt_grow / 0.9)
+
+
+def test_time_step_shrinks_as_the_residual_rises(monkeypatch):
+    stepper = pseudo_stepper(monkeypatch, [1.0e-3, 1.5e-3])
+    for step in range(2):
+        assert take_step(stepper)
+    assert stepper.dt == pytest.approx(0.1 / 1.5)
+
+
+def test_step_that_raises_the_residual_too_much_is_rejected(monkeypatch):
+    stepper = pseudo_stepper(
+        monkeypatch, [1.0e-3, 1.01 * max_pseudo_rise * 1.0e-3, 1.2e-3])
+    assert take_step(stepper)
+    assert not take_step(stepper)
+    assert stepper.steady_norm == 1.0e-3
+    assert stepper.dt == pytest.approx(0.1 * stepper.dt_shrink)
+    assert take_step(stepper)
+    assert stepper.steady_norm == 1.2e-3
+
+
+def test_taylor_config_reaches_steady_state(tmp_path):
+    """
+        With Newton's method, as taylor_config.py recommends, through the
+        L--H transition; this takes a few minutes.
+    """
+    summary_file = str(tmp_path / "summary.json")
+    config = example_config('taylor_config.py', nx=50, steady_state=True,
+                            nonlinear_solver="newton",
+                            summary_file=summary_file)
+    assert run_model(build_model(config)) == 0
+
+    with open(summary_file) as summary_json:
+        summary = json.load(summary_json)
+    assert summary['stop_reason'] == 'steady_state'
+    assert summary['steady_norm'] < config.steady_tol
@@ -0,0 +1,93 @@
+"""
+    The early stopping of src/stopping.py: each criterion fires once its
+    condition holds, and not before, and a run stopped by one records it in
+    its summary.
+"""
+
+import json
+import types
+
+import numpy
+import pytest
+from fipy import Grid1D, CellVariable
+
+from conftest import example_config
+from src.stopping import StoppingCriteria
+from src.model import build_model
+from src.solving_loop import run_model
+
+
+def stopping_config(**inputs):
+    config = types.SimpleNamespace(
+        stop_change_rate=0.0, steady_state=False, stop_Z_edge=None,
+        stop_wall_time=0.0)
+    for name, value in inputs.items():
+        setattr(config, name, value)
+    return config
+
+
+def profiles_model(Z_edge=1.0):
+    """ A model of a density and Z profile, with their old values. """
+    mesh = Grid1D(nx=5, Lx=1.0)
+    density = CellVariable(mesh=mesh, value=numpy.linspace(1.0, 2.0, 5),
+                           hasOld=True)
+    Z = CellVariable(mesh=mesh, value=Z_edge, hasOld=True)
+    return types.SimpleNamespace(density=density, Z=Z,
+                                 state_variables=lambda: [density, Z])
+
+
+def take_step(model, density_change=0.0, Z_edge=None):
+    """ Sets the new values of a step from the old ones. """
+    for variable in model.state_variables():
+        variable.updateOld()
+    model.density.setValue(model.density.value + density_change)
+    if Z_edge is not None:
+        model.Z.setValue(Z_edge, where=model.Z.mesh.cellCenters[0] < 0.2)
+
+
+def test_steady():
+    model = profiles_model()
+    criteria = StoppingCriteria(stopping_config(stop_change_rate=1.0e-3),
+                                model)
+    take_step(model, 2.0e-2)
+    assert criteria.relative_change(0.1) == pytest.approx(
+        2.0e-2 / (model.density.value.max() * 0.1))
+    assert criteria.check(0.1) is None
+    take_step(model, 1.0e-5)
+    assert criteria.check(0.1) == 'steady'
+
+
+def test_steady_state_mode_has_its_own_criterion():
+    model = profiles_model()
+    criteria = StoppingCriteria(stopping_config(
+        stop_change_rate=1.0e-3, steady_state=True), model)
+    take_step(model)
+    assert criteria.check(0.1) is None
+
+
+def test_Z_threshold():
+    model = profiles_model(Z_edge=-1.0)
+    criteria = StoppingCriteria(stopping_config(stop_Z_edge=0.5), model)
+    take_step(model, Z_edge=0.2)
+    assert criteria.check(0.1) is None
+    take_step(model, Z_edge=0.7)
+    assert criteria.check(0.1) == 'Z_threshold'
+
+
+def test_wall_time():
+    model = profiles_model()
+    criteria = StoppingCriteria(stopping_config(stop_wall_time=60.0), model)
+    assert criteria.check(0.1) is None
+    criteria.wall_start -= 61.0
+    assert criteria.check(0.1) == 'wall_time'
+
+
+def test_run_stops_on_steady_profiles(tmp_path):
+    summary_file = str(tmp_path / "summary.json")
+    config = example_config('taylor_config.py', nx=20, total_timeSteps=50,
+                            stop_change_rate=1.0e3, summary_file=summary_file)
+    assert run_model(build_model(config)) == 0
+    with open(summary_file) as summary_json:
+        summary = json.load(summary_json)
+    assert summary['stop_reason'] == 'steady'
+    assert summary['steps'] < 50
@@ -0,0 +1,154 @@
+"""
+    The time stepping of src/time_stepping.py: the end time of a fixed-step
+    run, also when steps are retried with a smaller time step, and the
+    status of the bounded sweeps of a step.
+"""
+
+import json
+import math
+import types
+
+import pytest
+from fipy import Grid1D, CellVariable
+
+from conftest import example_config
+from src.time_stepping import TimeStepper, sweep_to_tolerance, \
+    solve_time_step
+from src.model import build_model
+from src.solving_loop import run_model
+
+
+def stepper_config(**inputs):
+    config = types.SimpleNamespace(
+        adaptive_timeStep=False, total_timeSteps=10, total_time=1.0,
+        timeStep=0.1, dt_min=1.0e-6, dt_max=1.0, dt_grow=1.5, dt_shrink=0.5,
+        grow_sweeps=3, max_sweeps=20)
+    for name, value in inputs.items():
+        setattr(config, name, value)
+    return config
+
+
+def march(stepper, failing_steps=()):
+    """ Runs the stepper, rejecting the first attempt of failing_steps. """
+    failed = set()
+    while stepper.running():
+        dt = stepper.next_dt()
+        if stepper.step in failing_steps and stepper.step not in failed:
+            failed.add(stepper.step)
+            stepper.reject()
+            continue
+        stepper.accept(dt, 5)
+
+
+def test_fixed_steps():
+    stepper = TimeStepper(stepper_config())
+    march(stepper)
+    assert stepper.step == 10
+    assert stepper.elapsed == pytest.approx(1.0)
+
+
+def test_retried_steps_reach_the_end_time():
+    stepper = TimeStepper(stepper_config())
+    march(stepper, failing_steps=[2, 5])
+    # Two half steps, so one more step for the same time
+    assert stepper.step == 11
+    assert stepper.elapsed == pytest.approx(1.0, rel=1.0e-12)
+
+
+def test_last_step_is_shortened():
+    stepper = TimeStepper(stepper_config(dt_shrink=0.3))
+    march(stepper, failing_steps=[0])
+    assert stepper.elapsed == pytest.approx(1.0, rel=1.0e-12)
+    assert stepper.step == 11
+
+
+def test_restore_continues_to_the_end_time():
+    stepper = TimeStepper(stepper_config())
+    march(stepper, failing_steps=[1])
+    restarted = TimeStepper(stepper_config(total_timeSteps=20))
+    restarted.restore(stepper.step, stepper.elapsed, stepper.dt)
+    march(restarted)
+    assert restarted.elapsed == pytest.approx(2.0, rel=1.0e-12)
+
+
+def test_run_with_retries_reaches_the_end_time(tmp_path):
+    """ The Taylor model, with too few sweeps for some of the steps. """
+    summary_file = str(tmp_path / "summary.json")
+    config = example_config('taylor_config.py', nx=100, total_timeSteps=4,
+                            max_sweeps=12, summary_file=summary_file)
+    assert run_model(build_model(config)) == 0
+
+    with open(summary_file) as summary_json:
+        summary = json.load(summary_json)
+    assert summary['steps'] > config.total_timeSteps
+    assert summary['time'] == pytest.approx(
+        config.total_timeSteps * config.timeStep, rel=1.0e-12)
+
+
+class ScriptedEquation(object):
+    """
+        An equation whose sweeps return the given residuals, one per sweep;
+        an exception in the list is raised, as by a failed linear solve.
+        Every sweep records the value of the variable it starts from, and
+        sets it to the number of the sweep.
+    """
+    def __init__(self, residuals, variable=None):
+        self.residuals = list(residuals)
+        self.variable = variable
+        self.sweeps = 0
+        self.dts = []
+        self.start_values = []
+
+    def sweep(self, dt=None, solver=None):
+        self.sweeps += 1
+        self.dts.append(dt)
+        if self.variable is not None:
+            self.start_values.append(float(self.variable.value[0]))
+            self.variable.setValue(float(self.sweeps))
+        residual = self.residuals.pop(0)
+        if isinstance(residual, Exception):
+            raise residual
+        return residual
+
+
+def sweep_config(**inputs):
+    config = types.SimpleNamespace(
+        res_tol=1.0e-6, max_sweeps=8, divergence_factor=1.0e3,
+        stall_sweeps=3, stall_factor=0.9, verbose_sweeps=False)
+    for name, value in inputs.items():
+        setattr(config, name, value)
+    return config
+
+
+@pytest.mark.parametrize('residuals, status, sweeps', [
+    ([1.0, 1.0e-2, 1.0e-7], 'converged', 3),
+    ([1.0, 0.5, 0.25, 0.125, 0.0625, 0.03, 0.015, 0.008, 0.004],
+     'max_sweeps', 8),
+    ([1.0e-2, 1.0e-3, 2.0], 'diverged', 3),
+    ([1.0, float('nan')], 'diverged', 2),
+    ([1.0, 0.1, 0.099, 0.098, 0.097], 'stalled', 5),
+    ([1.0, RuntimeError("Factor is exactly singular")], 'solver_failed', 2),
+])
+def test_sweep_status(residuals, status, sweeps):
+    equation = ScriptedEquation(residuals)
+    result = sweep_to_tolerance(equation, 0.1, None, sweep_config())
+    assert result[:2] == (status, sweeps)
+    assert equation.sweeps == sweeps
+    if status == 'solver_failed':
+        assert result[2] == math.inf
+
+
+def test_failed_step_is_rolled_back_and_retried():
+    variable = CellVariable(mesh=Grid1D(nx=4), value=-1.0, hasOld=True)
+    variable.updateOld()
+    stepper = TimeStepper(stepper_config())
+    # Diverges in the second sweep, then converges with half the step
+    equation = ScriptedEquation([1.0e-2, 1.0e2, 1.0e-3, 1.0e-7], variable)
+    record = solve_time_step(equation, [variable], stepper, None,
+                             sweep_config())
+    assert record['retries'] == 1
+    assert equation.dts == [0.1, 0.1, 0.05, 0.05]
+    assert record['dt'] == 0.05
+    assert stepper.elapsed == pytest.approx(0.05)
+    # The retry started from the old values, not the diverged ones
+    assert equation.start_values == [-1.0, 1.0, -1.0, 3.0]
@@ -0,0 +1,48 @@
+"""
+    The graded mesh of src/variable_decl.py: nx positive cell widths over
+    [0, L], mesh_ratio times smaller at the pedestal (and the edge) than far
+    from it, and the mesh of a model built with mesh_grading = "tanh".
+"""
+
+import numpy
+import pytest
+
+from conftest import example_config
+from src.model import build_model
+from src.variable_decl import graded_spacing
+
+
+@pytest.mark.parametrize('refine_edge', [True, False])
+@pytest.mark.parametrize('nx', [10, 200, 1001])
+def test_graded_spacing(nx, refine_edge):
+    widths = graded_spacing(nx, 4.0, 1.5, 0.4, 10.0, refine_edge)
+    assert len(widths) == nx
+    assert numpy.all(widths > 0.0)
+    assert numpy.sum(widths) == pytest.approx(4.0, rel=1.0e-12)
+
+
+def test_cells_are_smaller_at_the_pedestal():
+    widths = graded_spacing(400, 4.0, 1.5, 0.4, 10.0, True)
+    centers = numpy.cumsum(widths) - 0.5 * widths
+    pedestal = widths[numpy.argmin(numpy.abs(centers - 1.5))]
+    far = widths[numpy.argmin(numpy.abs(centers - 3.5))]
+    assert far / pedestal == pytest.approx(10.0, rel=0.05)
+    assert widths[0] == pytest.approx(pedestal, rel=0.05)
+    # The cells grow smoothly away from the pedestal
+    assert numpy.max(widths[1:] / widths[:-1]) < 1.1
+    assert numpy.min(widths[1:] / widths[:-1]) > 1.0 / 1.1
+
+
+def test_uniform_without_grading():
+    widths = graded_spacing(50, 4.0, 1.5, 0.4, 1.0, True)
+    numpy.testing.assert_allclose(widths, 4.0 / 50, rtol=1.0e-12)
+
+
+def test_graded_model_mesh():
+    model = build_model(example_config('taylor_config.py', nx=60,
+                                       mesh_grading="tanh"))
+    faces = numpy.sort(numpy.array(model.mesh.faceCenters[0].value))
+    assert model.mesh.numberOfCells == 60
+    assert faces[0] == pytest.approx(0.0, abs=1.0e-12)
+    assert faces[-1] == pytest.approx(model.L, rel=1.0e-12)
+    assert numpy.ptp(numpy.diff(faces)) > 0.0